@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2026 Adam.Dybbroe
+
+# Author(s):
+
+#   Adam.Dybbroe <adam.dybbroe@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Catalogues of the PPS and NWCSAF/Geo input scenes.
+
+FileCatalogue is a persistent catalogue of the input files, an SQLite
+database with one record per file, keyed on the product, platform and
+timeslot. It is kept up to date incrementally: only files not yet in the
+catalogue have their names parsed, and files gone from disk are dropped. The
+scenes inside a time window are then found with an index lookup rather than
+by going through all the files.
+
+SceneCatalogue is an in-memory catalogue fed with the scenes announced in the
+posttroll messages the runner receives, with the same query interface. It is
+filled with the scenes on disk when the runner starts.
+"""
+
+import os
+import sqlite3
+import logging
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from glob import glob
+
+from mesan_compositer.composite_tools import (PPS_FILENAME,
+                                              PLATFORM_NAME,
+                                              METEOSAT,
+                                              METOPS,
+                                              MSGSATS,
+                                              PpsMetaData,
+                                              MsgMetaData)
+
+LOG = logging.getLogger(__name__)
+
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    dirname TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    product TEXT NOT NULL,
+    platform_name TEXT,
+    timeslot TEXT,
+    orbit TEXT,
+    areaid TEXT,
+    geofilename TEXT,
+    variant TEXT
+);
+CREATE INDEX IF NOT EXISTS files_by_time ON files (kind, product, timeslot);
+CREATE INDEX IF NOT EXISTS files_by_dir ON files (dirname, kind, product);
+"""
+
+
+def get_pps_record(filename, product, variant=None):
+    """Get the catalogue record of the PPS file *filename*, or None if it can't be parsed."""
+    from trollsift import Parser
+
+    try:
+        res = Parser(PPS_FILENAME).parse(os.path.basename(filename))
+    except ValueError:
+        LOG.warning('Probably wrong date time string in PPS file, skip it: %s', filename)
+        return None
+
+    if 'end_time' in res:
+        timeslot = res['start_time'] + (res['end_time'] - res['start_time']) / 2.
+    else:
+        timeslot = res['start_time']
+
+    sat = res['platform_name']
+    return {'path': filename,
+            'dirname': os.path.dirname(filename),
+            'kind': 'pps',
+            'product': product,
+            'platform_name': PLATFORM_NAME.get(sat, sat),
+            'timeslot': timeslot.strftime(TIME_FORMAT),
+            'orbit': '%05d' % res['orbit'],
+            'areaid': None,
+            'geofilename': filename.replace(res['product'], 'CMA'),
+            'variant': variant}
+
+
+def get_msg_record(filename, product):
+    """Get the catalogue record of the NWCSAF/Geo file *filename*, or None if it can't be parsed."""
+    bname = os.path.basename(filename)
+    sat = bname.split('_')[1]
+    if sat not in METEOSAT:
+        LOG.warning('Satellite %s not supported: %s', sat, filename)
+        return None
+
+    # Hardcoded the filenaming convention, as in get_msglist
+    bnsplit = bname[17:].split('_')
+    try:
+        timeslot = datetime.strptime(bnsplit[0], '%Y%m%d%H%M')
+        areaid = bnsplit[1].split('.')[0]
+    except (ValueError, IndexError):
+        LOG.error("Failure: Can't get the time of the msg scene! %s", bname)
+        return None
+
+    return {'path': filename,
+            'dirname': os.path.dirname(filename),
+            'kind': 'msg',
+            'product': product,
+            'platform_name': METEOSAT[sat],
+            'timeslot': timeslot.strftime(TIME_FORMAT),
+            'orbit': None,
+            'areaid': areaid,
+            'geofilename': None,
+            'variant': None}
+
+
+def get_scene_from_record(record):
+    """Get the scene metadata (PpsMetaData or MsgMetaData) of the catalogue *record*."""
+    timeslot = datetime.strptime(record['timeslot'], TIME_FORMAT)
+    if record['kind'] == 'msg':
+        return MsgMetaData(filename=record['path'],
+                           platform_name=record['platform_name'],
+                           areaid=record['areaid'],
+                           timeslot=timeslot)
+    return PpsMetaData(filename=record['path'],
+                       geofilename=record['geofilename'],
+                       platform_name=record['platform_name'],
+                       orbit=record['orbit'],
+                       timeslot=timeslot,
+                       variant=record['variant'])
+
+
+class FileCatalogue(object):
+    """The catalogue of input files, stored in the SQLite database *dbfile*.
+
+    The database can be shared between processes.
+    """
+
+    def __init__(self, dbfile):
+        """Open the catalogue, and create it if needed."""
+        self.dbfile = dbfile
+        self._con = sqlite3.connect(dbfile, timeout=60)
+        with self._con:
+            self._con.executescript(SCHEMA)
+
+    def close(self):
+        """Close the catalogue."""
+        self._con.close()
+
+    def _add_records(self, records):
+        with self._con:
+            self._con.executemany(
+                "INSERT OR REPLACE INTO files VALUES (:path, :dirname, :kind, :product, :platform_name, "
+                ":timeslot, :orbit, :areaid, :geofilename, :variant)", records)
+
+    def update(self, dirname, pattern, kind, product, variant=None):
+        """Bring the catalogue up to date with the *product* files in *dirname*.
+
+        The files matching the glob *pattern* are either PPS (*kind* 'pps')
+        or NWCSAF/Geo ('msg') files. Only the names of the files not in the
+        catalogue yet are parsed. Return the number of matching files in
+        the directory.
+        """
+        on_disk = set(glob(os.path.join(dirname, pattern)))
+        cursor = self._con.execute("SELECT path FROM files WHERE dirname = ? AND kind = ? AND product = ?",
+                                   (dirname, kind, product))
+        known = set(row[0] for row in cursor)
+
+        gone = known - on_disk
+        if gone:
+            with self._con:
+                self._con.executemany("DELETE FROM files WHERE path = ?", [(path, ) for path in gone])
+
+        records = []
+        for filename in sorted(on_disk - known):
+            if kind == 'pps':
+                record = get_pps_record(filename, product, variant)
+            else:
+                record = get_msg_record(filename, product)
+            if record is not None:
+                records.append(record)
+        self._add_records(records)
+
+        LOG.info("Catalogue update of %s (%s %s): %d files added, %d removed",
+                 dirname, kind, product, len(records), len(gone))
+        return len(on_disk)
+
+    def add(self, scene, product):
+        """Add the scene with the metadata *scene* (PpsMetaData or MsgMetaData) of *product*."""
+        record = {'path': scene.uri,
+                  'dirname': os.path.dirname(scene.uri),
+                  'product': product,
+                  'platform_name': scene.platform_name,
+                  'timeslot': scene.timeslot.strftime(TIME_FORMAT)}
+        if isinstance(scene, MsgMetaData):
+            record.update({'kind': 'msg', 'orbit': None, 'areaid': scene.areaid,
+                           'geofilename': None, 'variant': None})
+        else:
+            record.update({'kind': 'pps', 'orbit': scene.orbit, 'areaid': None,
+                           'geofilename': scene.geofilename, 'variant': scene.variant})
+        self._add_records([record])
+
+    def _query(self, kind, product, time_window, **conditions):
+        query = "SELECT * FROM files WHERE kind = ? AND product = ? AND timeslot > ? AND timeslot < ?"
+        args = [kind, product, time_window[0].strftime(TIME_FORMAT), time_window[1].strftime(TIME_FORMAT)]
+        for column, value in conditions.items():
+            query += " AND %s IS ?" % column
+            args.append(value)
+        cursor = self._con.execute(query + " ORDER BY timeslot", args)
+        names = [col[0] for col in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    def get_pps_scenes(self, product, time_window, satellites=None, variant=None):
+        """Get the PPS scenes of *product* inside the *time_window*.
+
+        Only the scenes of the platforms in *satellites* are returned if
+        given, as in get_ppslist.
+        """
+        scenes = []
+        for record in self._query('pps', product, time_window, variant=variant):
+            if satellites and record['platform_name'] not in satellites:
+                continue
+            if record['platform_name'] not in PLATFORM_NAME.values():
+                raise IOError("Error: satellite %s not supported!" % record['platform_name'])
+            scenes.append(get_scene_from_record(record))
+        return scenes
+
+    def get_msg_scenes(self, product, time_window, areaid):
+        """Get the NWCSAF/Geo scenes of *product* on the area *areaid* inside the *time_window*."""
+        return [get_scene_from_record(record)
+                for record in self._query('msg', product, time_window, areaid=areaid)]
+
+
+def get_scene_from_message(msg_data, filename, gds_dir=None):
+    """Get the scene metadata of the product file *filename* from the posttroll message data.
+
+    Return a PpsMetaData or a MsgMetaData for polar and geostationary
+    scenes respectively. The name of MSG files still gives the area. PPS
+    files in the Metop GDS directory *gds_dir* are of the 'global' variant.
+    """
+    platform_name = msg_data['platform_name']
+    if platform_name in MSGSATS:
+        record = get_msg_record(filename, None)
+        if record is None:
+            return None
+        return MsgMetaData(filename=filename, platform_name=platform_name,
+                           areaid=record['areaid'],
+                           timeslot=msg_data.get('nominal_time', msg_data.get('start_time')))
+
+    start_time = msg_data['start_time']
+    if msg_data.get('end_time'):
+        timeslot = start_time + (msg_data['end_time'] - start_time) / 2.
+    else:
+        timeslot = start_time
+    product = os.path.basename(filename).split('_')[2]
+    variant = None
+    if gds_dir and os.path.dirname(os.path.abspath(filename)) == os.path.abspath(gds_dir):
+        variant = 'global'
+    return PpsMetaData(filename=filename,
+                       geofilename=filename.replace(product, 'CMA'),
+                       platform_name=platform_name,
+                       orbit='%05d' % int(msg_data['orbit_number']),
+                       timeslot=timeslot, variant=variant)
+
+
+def get_catalogue_scenes(catalogue, product, time_window, polar_satellites, areaid):
+    """Get the scenes of *product* inside the *time_window* from the *catalogue*.
+
+    Return the PPS scenes, direct readout of the *polar_satellites* and Metop
+    GDS, and the NWCSAF/Geo scenes on the area *areaid*.
+    """
+    pps_scenes = (catalogue.get_pps_scenes(product, time_window, satellites=polar_satellites) +
+                  catalogue.get_pps_scenes(product, time_window, satellites=METOPS, variant='global'))
+    msg_scenes = catalogue.get_msg_scenes(product, time_window, areaid)
+    return pps_scenes, msg_scenes
+
+
+class SceneCatalogue(object):
+    """An in-memory catalogue of scenes, kept sorted in time per product.
+
+    The queries are the same as for FileCatalogue, so the compositors can
+    take either one. The PPS scenes in the Metop GDS directory *gds_dir* are
+    of the 'global' variant, see get_scene_from_message.
+    """
+
+    def __init__(self, gds_dir=None):
+        """Initialize an empty catalogue."""
+        self.gds_dir = gds_dir
+        self._times = {}
+        self._scenes = {}
+
+    def __len__(self):
+        """Get the number of scenes in the catalogue."""
+        return sum(len(scenes) for scenes in self._scenes.values())
+
+    def add(self, scene, product):
+        """Add the scene with the metadata *scene* (PpsMetaData or MsgMetaData) of *product*."""
+        key = ('msg' if isinstance(scene, MsgMetaData) else 'pps', product)
+        times = self._times.setdefault(key, [])
+        scenes = self._scenes.setdefault(key, [])
+        if any(other.uri == scene.uri for other in scenes[bisect_left(times, scene.timeslot):
+                                                          bisect_right(times, scene.timeslot)]):
+            return
+        idx = bisect_right(times, scene.timeslot)
+        times.insert(idx, scene.timeslot)
+        scenes.insert(idx, scene)
+
+    def scan(self, dirname, pattern, kind, product, oldest):
+        """Add the scenes of the *product* files in *dirname* not older than *oldest*.
+
+        The files matching the glob *pattern* are either PPS (*kind* 'pps')
+        or NWCSAF/Geo ('msg') files, as for FileCatalogue.update. This is
+        how the runner knows the scenes received before it was restarted.
+        Return the number of scenes added.
+        """
+        variant = None
+        if kind == 'pps' and self.gds_dir and os.path.abspath(dirname) == os.path.abspath(self.gds_dir):
+            variant = 'global'
+        nscenes = len(self)
+        for filename in glob(os.path.join(dirname, pattern)):
+            if kind == 'pps':
+                record = get_pps_record(filename, product, variant)
+            else:
+                record = get_msg_record(filename, product)
+            if record is None:
+                continue
+            scene = get_scene_from_record(record)
+            if scene.timeslot >= oldest:
+                self.add(scene, product)
+
+        LOG.info("Scene catalogue scan of %s (%s %s): %d scenes added",
+                 dirname, kind, product, len(self) - nscenes)
+        return len(self) - nscenes
+
+    def prune(self, oldest):
+        """Drop all scenes older than *oldest*."""
+        for key, times in self._times.items():
+            idx = bisect_left(times, oldest)
+            del times[:idx]
+            del self._scenes[key][:idx]
+
+    def _query(self, kind, product, time_window):
+        times = self._times.get((kind, product), [])
+        return self._scenes.get((kind, product), [])[bisect_right(times, time_window[0]):
+                                                     bisect_left(times, time_window[1])]
+
+    def get_pps_scenes(self, product, time_window, satellites=None, variant=None):
+        """Get the PPS scenes of *product* inside the *time_window*.
+
+        Only the scenes of the platforms in *satellites* are returned if
+        given.
+        """
+        return [scene for scene in self._query('pps', product, time_window)
+                if scene.variant == variant and (not satellites or scene.platform_name in satellites)]
+
+    def get_msg_scenes(self, product, time_window, areaid):
+        """Get the NWCSAF/Geo scenes of *product* on the area *areaid* inside the *time_window*."""
+        return [scene for scene in self._query('msg', product, time_window) if scene.areaid == areaid]
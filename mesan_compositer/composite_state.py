@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2026 Adam.Dybbroe
+
+# Author(s):
+
+#   Adam.Dybbroe <adam.dybbroe@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Keep the state of a composite between updates.
+
+A composite takes, pixel by pixel, the data of the scene with the highest
+weight, and of the first such scene in the scene order when several have the
+same weight. The fields of the composite, the scenes merged into it and the
+scene that won each pixel are stored per product, area and analysis time, so
+that a scene arriving later can be merged into the stored composite without
+reloading all the other scenes of the time window. The result is the same as
+when all the scenes are merged in one go. If scenes have left the time window,
+or the order of the scenes merged already has changed, the composite is made
+from scratch. Whenever a state is saved, the states of analysis times more
+than COMPOSITE_STATE_RETENTION older are removed.
+"""
+
+import os
+import tempfile
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+
+LOG = logging.getLogger(__name__)
+
+#: How long the states are kept, counted back from the analysis time of the latest state saved
+COMPOSITE_STATE_RETENTION = timedelta(hours=6)
+
+
+def get_scene_key(scene):
+    """Get the key identifying the PPS or MSG *scene* in the composite state."""
+    return str(scene)
+
+
+def get_composite_state_filename(state_dir, product, areaid, obstime):
+    """Get the name of the file in *state_dir* with the state of a composite."""
+    bname = '%s_%s_%s.npz' % (product, areaid, obstime.strftime('%Y%m%d%H%M'))
+    return os.path.join(state_dir, bname)
+
+
+def get_composite_state_time(filename):
+    """Get the analysis time of the composite state file *filename*, or None if not a state file."""
+    bname = os.path.basename(filename)
+    if not bname.endswith('.npz'):
+        return None
+    try:
+        return datetime.strptime(bname[:-4].split('_')[-1], '%Y%m%d%H%M')
+    except ValueError:
+        return None
+
+
+def prune_composite_states(state_dir, oldest):
+    """Remove the states of analysis times older than *oldest* from *state_dir*."""
+    for bname in os.listdir(state_dir):
+        obstime = get_composite_state_time(bname)
+        if obstime is not None and obstime < oldest:
+            LOG.debug("Remove old composite state %s", bname)
+            try:
+                os.remove(os.path.join(state_dir, bname))
+            except OSError as err:
+                LOG.warning("Failed removing %s: %s", bname, str(err))
+
+
+class CompositeState(object):
+    """The fields of a composite and the scenes merged into them.
+
+    *scenes* are all the scenes of the composite, in the order they would be
+    merged in when making the composite in one go.
+    """
+
+    def __init__(self, scenes):
+        """Initialize the state of a composite with no scenes merged yet."""
+        self.ranks = {}
+        for rank, scene in enumerate(scenes):
+            self.ranks.setdefault(get_scene_key(scene), rank)
+        self.fields = None
+        self.area = None
+        self.keys = []
+        self.source = None
+
+    def load(self, filename):
+        """Load the state from *filename*.
+
+        The stored state is only used if all the scenes merged into it are
+        among the scenes of the composite. Otherwise, if a scene has dropped
+        out of the time window or its file has gone, the composite has to be
+        made again from scratch. Return True if the state was loaded.
+        """
+        try:
+            with np.load(filename) as npz:
+                stored = dict(npz)
+        except IOError:
+            return False
+
+        keys = [str(key) for key in stored.pop('keys')]
+        if not all(key in self.ranks for key in keys):
+            LOG.info("Scenes have left the composite, it is made from scratch")
+            return False
+        ranks = [self.ranks[key] for key in keys]
+        if ranks != sorted(ranks):
+            LOG.info("The order of the scenes has changed, the composite is made from scratch")
+            return False
+
+        from pyresample.area_config import load_area_from_string
+        self.area = load_area_from_string(str(stored.pop('area')))
+        self.source = stored.pop('source')
+        self.keys = keys
+        self.fields = stored
+        LOG.debug("Composite state with %d scenes read from %s", len(keys), filename)
+
+        return True
+
+    def save(self, filename):
+        """Save the state to *filename*.
+
+        The scenes are stored in the scene order, so that it can be checked
+        on load whether the order of the scenes merged has changed since.
+        The old states in the same directory are removed.
+        """
+        order = np.argsort([self.ranks[key] for key in self.keys], kind='stable')
+        self.keys = [self.keys[idx] for idx in order]
+        self.source = np.argsort(order).astype(self.source.dtype)[self.source]
+
+        state_dir = os.path.dirname(filename)
+        if not os.path.isdir(state_dir):
+            os.makedirs(state_dir, exist_ok=True)
+        fd_, tmpfname = tempfile.mkstemp(suffix='.npz', dir=state_dir)
+        with os.fdopen(fd_, 'wb') as fpt:
+            np.savez(fpt, keys=np.array(self.keys), source=self.source,
+                     area=np.array(self.area.dump()), **self.fields)
+        os.rename(tmpfname, filename)
+        LOG.debug("Composite state stored in %s", filename)
+
+        obstime = get_composite_state_time(filename)
+        if obstime is not None:
+            prune_composite_states(state_dir, obstime - COMPOSITE_STATE_RETENTION)
+
+    def get_new_scenes(self, scenes):
+        """Get the *scenes* not merged into the composite yet."""
+        keys = set(self.keys)
+        return [scene for scene in scenes if get_scene_key(scene) not in keys]
+
+    def start(self, scene, fields, area):
+        """Start the composite with the *fields* of the first *scene*."""
+        self.fields = fields
+        self.area = area
+        self.keys = [get_scene_key(scene)]
+        self.source = np.zeros(fields['weight'].shape, dtype=np.int32)
+
+    def get_replace_mask(self, scene, weight):
+        """Get the pixels where the composite is to take the data of *scene*.
+
+        Those are the pixels where the *weight* of the scene is higher than
+        the weight of the composite, or the same but the scene comes before
+        the scene of the pixel in the scene order. The scene is recorded as
+        merged, and as the scene of the pixels returned.
+        """
+        key = get_scene_key(scene)
+        rank = self.ranks[key]
+        replace = weight > self.fields['weight']
+        ranks = np.array([self.ranks[merged] for merged in self.keys])
+        if ranks.max() > rank:
+            replace |= (weight == self.fields['weight']) & (ranks[self.source] > rank)
+        self.source[replace] = len(self.keys)
+        self.keys.append(key)
+
+        return replace
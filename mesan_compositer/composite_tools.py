@@ -23,9 +23,15 @@
 """Collection of minor helper tools for the generation of Mesan composites"""
 
 import os
+import shutil
+import tempfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from six.moves import configparser
 import six
+import numpy as np
 from mesan_compositer.pps_msg_conversions import get_bit_from_flags
 import logging
 
@@ -297,177 +303,436 @@ def get_nwcsaf_files(basedir, file_ext):
     return glob(os.path.join(basedir, '*' + file_ext))
 
 
+#  limits; linear lat dependence for MSG
+LATMIN_MSG = 52.0  # weight factor is 1 if lat < LATMIN_MSG
+LATMAX_MSG = 75.0  # weight factor is 0 if lat > LATMAX_MSG
+#
+# time diff in minutes when diff affects quality
+# weight factor is 0.5 if diff > TDIFF_THR
+TDIFF_THR = 30.0
+#
+# weight factors per ctype quality flag (MSG,PPS)
+# this is based on pps flags, msg flags are mapped to pps
+CTYPE_FLAG_WEIGHTS = np.array([
+    [1.0,  1.0],  # 00 Land
+    [0.9,  0.9],  # 01 Coast
+    [1.0,  1.0],  # 02 Night
+    [0.95, 0.95],  # 03 Twilight
+    [0.5,  0.5],  # 04 Sunglint
+    [0.95, 0.95],  # 05 High terrain
+    [0.5,  0.5],  # 06 Low level inversion present
+    [1.0,  1.0],  # 07 NWP data present
+    [1.0,  1.0],  # 08 AVHRR channel(s) missing
+    [0.5,  0.5],  # 09 Low quality
+    [0.0,  0.0],  # 10 Reclassified after spatial smoothing
+    [1.0,  1.0]   # 11 Stratiform-cumuliform distinction performed
+])
+#
+# weight factors per CTTH quality flag (MSG,PPS)
+# this is based on pps flags, msg flags are mapped to pps
+CTTH_FLAG_WEIGHTS = np.array([
+    [0.0,  0.0],  # 00 Not processed
+    [1.0,  1.0],  # 01 Cloudy
+    [1.0,  1.0],  # 02 Opaque cloud
+    [1.0,  1.0],  # 03 RTTOV IR simulations available
+    [0.5,  0.5],  # 04 Missing NWP data
+    [0.5,  0.5],  # 05 Thermal inversion available
+    [1.0,  1.0],  # 06 Missing AVHRR data
+    [1.0,  1.0],  # 07 RTTOV IR simulation applied
+    [0.5,  0.5],  # 08 Windowing technique applied
+    [1.0,  1.0],  # 09 ???
+    [1.0,  1.0],  # 10 ???
+    [1.0,  1.0],  # 11 ???
+    [1.0,  1.0],  # 12 ??? prev used for PPS/MSG
+    [1.0,  1.0],  # 13 ??? prev used for large time diff
+    [1.0,  1.0],  # 14 Quality estimation available
+    [0.5,  0.5]   # 15 Low confidence
+])
+#
+# weight factors per ctype class
+CTYPE_CLASS_WEIGHTS = np.zeros((256,))
+CTYPE_CLASS_WEIGHTS[:21] = [
+    0.0,  # 00 Not processed
+    0.95,  # 01 Cloud free land
+    1.0,  # 02 Cloud free sea
+    0.95,  # 03 Snow/ice contaminated land
+    0.95,  # 04 Snow/ice contaminated sea
+    1.0,  # 05 Very low cumiliform cloud
+    1.0,  # 06 Very low stratiform cloud
+    1.0,  # 07 Low cumiliform cloud
+    1.0,  # 08 Low stratiform cloud
+    1.0,  # 09 Medium level cumiliform cloud
+    1.0,  # 10 Medium level stratiform cloud
+    1.0,  # 11 High and opaque cumiliform cloud
+    1.0,  # 12 High and opaque stratiform cloud
+    1.0,  # 13 Very high and opaque cumiliform cloud
+    1.0,  # 14 Very high and opaque stratiform cloud
+    1.0,  # 15 Very thin cirrus cloud
+    1.0,  # 16 Thin cirrus cloud
+    1.0,  # 17 Thick cirrus cloud
+    1.0,  # 18 Cirrus above low or medium level cloud
+    0.95,  # 19 Fractional or sub-pixel cloud
+    0.0   # 20 Undefined
+]
+
+
+def resample_scene(scene, areaid, radius_of_influence, cache_dir=None):
+    """Resample the *scene* to the area *areaid* (nearest neighbour).
+
+    If *cache_dir* is given the kd-tree neighbour info is cached on disk
+    there, keyed on the source area, the target area and the radius, and
+    reused the next time. This only applies to fixed (geostationary) source
+    grids, swaths are never cached. New cache entries are written to a
+    private staging directory and moved into *cache_dir* once complete, so
+    the cache can be shared between processes.
+    """
+    if not cache_dir:
+        return scene.resample(areaid, radius_of_influence=radius_of_influence)
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix='.staging_', dir=cache_dir)
+    try:
+        for name in os.listdir(cache_dir):
+            if not name.startswith('.'):
+                os.symlink(os.path.join(cache_dir, name), os.path.join(staging_dir, name))
+
+        retv = scene.resample(areaid, radius_of_influence=radius_of_influence,
+                              cache_dir=staging_dir)
+
+        for name in os.listdir(staging_dir):
+            path = os.path.join(staging_dir, name)
+            if os.path.islink(path):
+                continue
+            try:
+                os.rename(path, os.path.join(cache_dir, name))
+                LOG.info("Resampling info cached in %s", os.path.join(cache_dir, name))
+            except OSError:
+                LOG.debug("Resampling info already cached by someone else: %s", name)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    return retv
+
+
+# longitudes and latitudes of the areas, computed once per process
+_AREA_LONLATS = {}
+
+
+def get_area_lonlats(area, cache_dir=None):
+    """Get the longitudes and latitudes (float32) of the *area*.
+
+    They are computed only once per process and area, and shared by all
+    composites and super observations on the area. If *cache_dir* is given
+    they are also stored in a file there, which is memory mapped rather than
+    computed again by the next process. Return read only arrays.
+    """
+    try:
+        return _AREA_LONLATS[area]
+    except KeyError:
+        pass
+
+    lonlats = None
+    if cache_dir:
+        filename = os.path.join(cache_dir, 'lonlats_%016x.npy' % (hash(area) & 0xffffffffffffffff))
+        try:
+            lonlats = np.load(filename, mmap_mode='r')
+            LOG.debug("Longitudes and latitudes read from %s", filename)
+        except IOError:
+            pass
+        if lonlats is not None and lonlats.shape[1:] != tuple(area.shape):
+            LOG.warning("Cached longitudes and latitudes don't fit the area: %s", filename)
+            lonlats = None
+
+    if lonlats is None:
+        lonlats = np.array(area.get_lonlats(), dtype=np.float32)
+        if cache_dir:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir, exist_ok=True)
+            fd_, tmpfname = tempfile.mkstemp(suffix='.npy', dir=cache_dir)
+            with os.fdopen(fd_, 'wb') as fpt:
+                np.save(fpt, lonlats)
+            os.rename(tmpfname, filename)
+            LOG.info("Longitudes and latitudes cached in %s", filename)
+        lonlats.setflags(write=False)
+
+    _AREA_LONLATS[area] = lonlats[0], lonlats[1]
+    return _AREA_LONLATS[area]
+
+
+def get_area_lonlats_tiles(area, chunks, cache_dir=None):
+    """Get the longitudes and latitudes (float32) of the *area* as dask arrays.
+
+    The arrays are in blocks of *chunks*. With a *cache_dir* the blocks are
+    read from the memory mapped file of get_area_lonlats, otherwise each
+    block is computed on its own, so the whole area is never held in memory.
+    """
+    import dask.array as da
+
+    if cache_dir:
+        return tuple(da.from_array(arr, chunks=chunks)
+                     for arr in get_area_lonlats(area, cache_dir=cache_dir))
+    return tuple(arr.astype(np.float32) for arr in area.get_lonlats(chunks=chunks))
+
+
+def imap_scenes(func, scenes, config_options):
+    """Apply *func* to all *scenes*, and yield the results in scene order.
+
+    The scenes are processed concurrently by a pool of 'scene_workers'
+    workers, threads or processes as given by 'scene_worker_pool' ('thread'
+    or 'process') in the configuration. By default, or with one worker only,
+    the scenes are processed one by one. Processes require *func* to be
+    picklable, and can't be started from the daemonic worker processes of
+    the runner, where threads are used instead. No more scenes than workers
+    are processed ahead of the one yielded, so that only that many results
+    are held in memory.
+    """
+    nworkers = int(config_options.get('scene_workers', 1))
+    if nworkers <= 1 or len(scenes) <= 1:
+        for scene in scenes:
+            yield func(scene)
+        return
+
+    pool_type = config_options.get('scene_worker_pool', 'thread')
+    if pool_type == 'process' and multiprocessing.current_process().daemon:
+        LOG.warning("No scene worker processes in a daemonic process, use threads")
+        pool_type = 'thread'
+    if pool_type == 'process':
+        executor = ProcessPoolExecutor(max_workers=nworkers)
+    elif pool_type == 'thread':
+        executor = ThreadPoolExecutor(max_workers=nworkers)
+    else:
+        raise ValueError("Unknown scene worker pool type: " + str(pool_type))
+
+    LOG.debug("Process %d scenes with %d %s workers", len(scenes), nworkers, pool_type)
+    with executor:
+        futures = deque()
+        for scene in scenes:
+            if len(futures) >= nworkers:
+                yield futures.popleft().result()
+            futures.append(executor.submit(func, scene))
+        while futures:
+            yield futures.popleft().result()
+
+
+def merge_scene_tiles(scenes_fields, names, dtypes):
+    """Merge the weighted fields of the scenes block by block.
+
+    *scenes_fields* holds the fields of each scene, in merge order, as dicts
+    of dask arrays chunked in the same row blocks. Pixel by pixel the data of
+    the first scene with the highest 'weight' is taken, as when the scenes are
+    merged one by one. All fields of all scenes in a block are merged in one
+    task. Return a dict with the merged fields *names*, of the *dtypes* given
+    per name.
+    """
+    import dask.array as da
+
+    blocks = [fields[name] for fields in scenes_fields for name in names]
+    merged = da.map_blocks(_merge_blocks, *blocks, nfields=len(names),
+                           weight_index=names.index('weight'), new_axis=0,
+                           chunks=((len(names),),) + blocks[0].chunks, dtype=np.float64)
+
+    return dict((name, merged[idx].astype(dtypes[name])) for idx, name in enumerate(names))
+
+
+def _merge_blocks(*blocks, **kwargs):
+    """Merge the fields of a block of all scenes, see merge_scene_tiles.
+
+    Return the merged fields stacked in one array.
+    """
+    nfields = kwargs['nfields']
+    weight_index = kwargs['weight_index']
+    comp = np.stack(blocks[:nfields]).astype(np.float64)
+    for idx in range(nfields, len(blocks), nfields):
+        weight = blocks[idx + weight_index]
+        ii = weight > comp[weight_index]
+        for field, block in enumerate(blocks[idx:idx + nfields]):
+            comp[field][ii] = block[ii]
+
+    return comp
+
+
+def get_flag_weight_table(flag_weights, dtype=np.float64):
+    """Get the flag weight factor for every possible combination of the flag bits.
+
+    *flag_weights* holds the weight factor of each flag bit, for PPS and MSG
+    in the two columns. Return an array of shape (2, 2**nbits) with the
+    product of the factors of all bits set, PPS in the first row and MSG in the
+    second. The factors are multiplied in bit order starting from 1.0.
+    """
+    nbits = len(flag_weights)
+    flags = np.arange(2 ** nbits)
+    table = np.ones((2, 2 ** nbits), dtype=dtype)
+    for bit in range(nbits):
+        bit_is_set = get_bit_from_flags(flags, bit) == 1
+        table[:, bit_is_set] *= flag_weights[bit][:, np.newaxis]
+
+    return table
+
+
+# weight factor for every combination of the 12 ctype flag bits (PPS, MSG)
+CTYPE_FLAG_WEIGHT_TABLE = get_flag_weight_table(CTYPE_FLAG_WEIGHTS)
+# weight factor for every combination of the 16 CTTH flag bits (PPS, MSG).
+# All factors are powers of two, so single precision is exact
+CTTH_FLAG_WEIGHT_TABLE = get_flag_weight_table(CTTH_FLAG_WEIGHTS, dtype=np.float32)
+
+
+def get_msg_latitude_factor(lat, is_msg, tdiff_factor=1.0):
+    """Get the latitude dependent weight factor (only MSG).
+
+    Linear lat dependence for MSG btw LATMIN_MSG and LATMAX_MSG.  The factor
+    is 1.0 for lat < LATMIN_MSG, 0.0 for lat > LATMAX_MSG, and 1.0 for PPS.
+    All of it is multiplied by the (scalar) time difference weight factor.
+    The factor is double precision also for single precision latitudes.
+    """
+    ramp = (np.float64(LATMAX_MSG) - lat) / (LATMAX_MSG - LATMIN_MSG)
+    return tdiff_factor * np.where(is_msg & (lat >= LATMIN_MSG),
+                                   np.clip(ramp, 0.0, 1.0), 1.0)
+
+
+def get_tdiff_factor(tdiff):
+    """Get the weight factor for the time difference to the analysis time.
+
+    Large time diff to analysis time - decrease weight. The factor is 0.5 if
+    the difference is larger than TDIFF_THR minutes.
+    """
+    if abs(tdiff).seconds / 60 > TDIFF_THR:
+        return 0.5
+    # else:
+    #     # Small time difference to analysis time, decrease wight slightly only:
+    #     return 1 - abs(tdiff).seconds/(TDIFF_THR * 60.)**2
+    return 1.0
+
+
 def get_weight_ctth(ctth_flag, lat, tdiff, is_msg):
     """Weights for given CTTH flag, time diff and latitude (only MSG).
+
+    The flag weight factor is looked up in CTTH_FLAG_WEIGHT_TABLE for all
+    pixels in one go, and multiplied by the time difference and latitude
+    factors.
     """
-    #
-    import numpy as np
-    #
-    #  limits; linear lat dependence for MSG
-    latmin_msg = 52.0  # weight factor is 1 if lat < LATMIN_MSG
-    latmax_msg = 75.0  # weight factor is 0 if lat > LATMAX_MSG
-    #
-    # time diff in minutes when diff affects quality
-    # weight factor is 0.5 if diff > TDIFF
-    tdiff_thr = 30.0
-    #
-    # weight factors per CT quality flag (MSG,PPS)
-    # this is based on pps flags, msg flags are mapped to pps
-    wCTTHflg = np.array([
-        [0.0,  0.0],  # 00 Not processed
-        [1.0,  1.0],  # 01 Cloudy
-        [1.0,  1.0],  # 02 Opaque cloud
-        [1.0,  1.0],  # 03 RTTOV IR simulations available
-        [0.5,  0.5],  # 04 Missing NWP data
-        [0.5,  0.5],  # 05 Thermal inversion available
-        [1.0,  1.0],  # 06 Missing AVHRR data
-        [1.0,  1.0],  # 07 RTTOV IR simulation applied
-        [0.5,  0.5],  # 08 Windowing technique applied
-        [1.0,  1.0],  # 09 ???
-        [1.0,  1.0],  # 10 ???
-        [1.0,  1.0],  # 11 ???
-        [1.0,  1.0],  # 12 ??? prev used for PPS/MSG
-        [1.0,  1.0],  # 13 ??? prev used for large time diff
-        [1.0,  1.0],  # 14 Quality estimation available
-        [0.5,  0.5]   # 15 Low confidence
-    ])
-    #
-    #
-    # default quality is 1.0
-    weight = np.ones(np.shape(ctth_flag))
-    #
+    # reduce quality according to CTTH flag, MSG = 0 / 1
+    flag_idx = np.bitwise_and(np.ma.filled(ctth_flag, 0), 65535)
+
     # large time diff to analysis time - decrease weight
-    if abs(tdiff).seconds / 60 > tdiff_thr:
-        weight *= 0.5
-    #
-    # reduce quality according to CT flag, MSG = 0 / 1
-    #
-    #
-    for bit in range(len(wCTTHflg)):
-        b = get_bit_from_flags(ctth_flag, bit)
-        # need integer for index to this array
-        weight[np.nonzero(b)] *= wCTTHflg[bit, 1 * is_msg[np.nonzero(b)]]
-    # linear lat dependence for MSG btw LATMIN_MSG and latmax_msg
-    # weight is 1.0 for lat < LATMIN and 0.0 for lat > LATMAX
+    # and linear lat dependence for MSG btw LATMIN_MSG and LATMAX_MSG
     if not np.all(is_msg == False):
-        ii = (lat >= latmin_msg) * (lat <= latmax_msg) * is_msg
-        weight[ii] *= (latmax_msg - lat[ii]) / (latmax_msg - latmin_msg)
-        ii = (lat > latmax_msg) * is_msg
-        weight[ii] = 0.0
+        factor = get_msg_latitude_factor(lat, is_msg, get_tdiff_factor(tdiff))
+    else:
+        factor = np.float64(get_tdiff_factor(tdiff))
 
-    return weight
+    return CTTH_FLAG_WEIGHT_TABLE[1 * is_msg, flag_idx] * factor
 
 
 def get_weight_cloudtype(ctype, ctype_flag, lat, tdiff, is_msg, fill_value=20):
     """Weights for given ctype, ctype flag, time diff and latitude (only MSG).
-    """
-    #
-    import numpy as np
 
-    #  limits; linear lat dependence for MSG
-    latmin_msg = 52.0  # weight factor is 1 if lat < latmin_msg
-    latmax_msg = 75.0  # weight factor is 0 if lat > latmax_msg
-    #
-    # time diff in minutes when diff affects quality
-    # weight factor is 0.5 if diff > tdiff_thr
-    tdiff_thr = 30.0
-    #
-    # weight factors per ctype quality flag (MSG,PPS)
-    # this is based on pps flags, msg flags are mapped to pps
-    wCTflg = np.array([
-        [1.0,  1.0],  # 00 Land
-        [0.9,  0.9],  # 01 Coast
-        [1.0,  1.0],  # 02 Night
-        [0.95, 0.95],  # 03 Twilight
-        [0.5,  0.5],  # 04 Sunglint
-        [0.95, 0.95],  # 05 High terrain
-        [0.5,  0.5],  # 06 Low level inversion present
-        [1.0,  1.0],  # 07 NWP data present
-        [1.0,  1.0],  # 08 AVHRR channel(s) missing
-        [0.5,  0.5],  # 09 Low quality
-        [0.0,  0.0],  # 10 Reclassified after spatial smoothing
-        [1.0,  1.0]   # 11 Stratiform-cumuliform distinction performed
-    ])
-    #
-    # weight factors per ctype class
-    weights_ctype_class = np.zeros((256,))
-    weights_ctype_class_values = np.array([
-        0.0,  # 00 Not processed
-        0.95,  # 01 Cloud free land
-        1.0,  # 02 Cloud free sea
-        0.95,  # 03 Snow/ice contaminated land
-        0.95,  # 04 Snow/ice contaminated sea
-        1.0,  # 05 Very low cumiliform cloud
-        1.0,  # 06 Very low stratiform cloud
-        1.0,  # 07 Low cumiliform cloud
-        1.0,  # 08 Low stratiform cloud
-        1.0,  # 09 Medium level cumiliform cloud
-        1.0,  # 10 Medium level stratiform cloud
-        1.0,  # 11 High and opaque cumiliform cloud
-        1.0,  # 12 High and opaque stratiform cloud
-        1.0,  # 13 Very high and opaque cumiliform cloud
-        1.0,  # 14 Very high and opaque stratiform cloud
-        1.0,  # 15 Very thin cirrus cloud
-        1.0,  # 16 Thin cirrus cloud
-        1.0,  # 17 Thick cirrus cloud
-        1.0,  # 18 Cirrus above low or medium level cloud
-        0.95,  # 19 Fractional or sub-pixel cloud
-        0.0   # 20 Undefined
-    ])
-    for idx in range(21):
-        weights_ctype_class[idx] = weights_ctype_class_values[idx]
-    #
+    The flag weight factor is looked up in CTYPE_FLAG_WEIGHT_TABLE for all
+    pixels in one go, using the 12 lowest flag bits.
+    """
+    # reduce quality according to ctype flag, is_msg = 0 / 1
+    flag_idx = np.bitwise_and(np.ma.filled(ctype_flag, 0), 4095)
+    weight = CTYPE_FLAG_WEIGHT_TABLE[1 * is_msg, flag_idx]
+    del flag_idx
 
-    #
-    # default quality is 1.0
-    weight = np.ones(np.shape(ctype_flag))
-    #
     # large time diff to analysis time - decrease weight
-    if abs(tdiff).seconds / 60 > tdiff_thr:
-        weight *= 0.5
-    # else:
-    #     # Small time difference to analysis time, decrease wight slightly only:
-    #     weight *= (1 - abs(tdiff).seconds/(tdiff_thr * 60.)**2)
-
-    #
-    # reduce quality according to ctype flag, is_msg = 0 / 1
-    for bit in range(len(wCTflg)):
-        bit_is_set = get_bit_from_flags(ctype_flag, bit)
-        # need integer for index to this array
-        weight[np.nonzero(bit_is_set)] *= wCTflg[bit,
-                                                 1 * is_msg[np.nonzero(bit_is_set)]]
-
-    # linear lat dependence for MSG btw latmin_msg and latmax_msg
-    # weight is 1.0 for lat < LATMIN and 0.0 for lat > LATMAX
+    # and linear lat dependence for MSG btw LATMIN_MSG and LATMAX_MSG
     if not np.all(is_msg == False):
-        ii = (lat >= latmin_msg) * (lat <= latmax_msg) * is_msg
-        weight[ii] *= (latmax_msg - lat[ii]) / (latmax_msg - latmin_msg)
-        ii = (lat > latmax_msg) * is_msg
-        weight[ii] = 0.0
+        weight *= get_msg_latitude_factor(lat, is_msg, get_tdiff_factor(tdiff))
+    else:
+        weight *= get_tdiff_factor(tdiff)
     #
     # special treatment of high clouds - medium to Cirrus
     # why? increase q to override ceilometers???
     #
     # if weight is very small: set to 0.0
-    ii = (ctype >= 9) * (ctype <= 18) * (weight < 1e-6)
-    weight[ii] = 0.0
     # if not low quality: set to 1.0
-    b = get_bit_from_flags(ctype_flag, 9)
-    ii = (ctype >= 9) * (ctype <= 18) * (b == 0)
-    weight[ii] = 1.0
+    is_high = (ctype >= 9) & (ctype <= 18)
+    weight[is_high & (weight < 1e-6)] = 0.0
+    weight[is_high & (get_bit_from_flags(ctype_flag, 9) == 0)] = 1.0
     #
     # all ctype above 20 are set to fill_value (undefined with weight 0)
     # howto index with x_ctype.astype('int') from masked array ?
     ctype[ctype > 20] = fill_value
     #
     # dependence on cloud type
-    weight *= weights_ctype_class[ctype.astype('int')]
-    #
-    # np.savez('input_output.npz',
-    #          CTYPE=ctype.data[1200:1210, 1000:1010],
-    #          CTYPE_FLAGS=ctype_flag.data[1200:1210, 1000:1010],
-    #          LAT=lat[1200:1210, 1000:1010],
-    #          IS_MSG=is_msg[1200:1210, 1000:1010],
-    #          WEIGHTS=weight[1200:1210, 1000:1010])
+    weight *= CTYPE_CLASS_WEIGHTS[ctype.astype('int')]
 
     return weight
+
+
+def get_superobs_midpoints(shape, dlen, dx, dy):
+    """Get the pixel indices of the super observation midpoints.
+
+    The columns are running left to right and the rows bottom to top of the
+    grid with the given *shape*.
+    """
+    ny, nx = shape
+    lx = np.arange(dlen, nx - dlen + 1, dx)
+    ly = np.arange(ny - dlen, dlen - 1, -dy)
+
+    return lx, ly
+
+
+# geometry of the super observations per area and cell size
+_SUPEROBS_GEOMETRY = {}
+
+
+def get_superobs_geometry(area, npix, dlenmin):
+    """Get the geometry of the super observations of *npix* x *npix* pixels on the *area*.
+
+    The cells are 2*dlen x 2*dlen pixels, spaced at least 2*dlenmin pixels.
+    Return a dict with the cell half size 'dlen', the spacing 'dx' and 'dy',
+    the midpoint indices 'lx' and 'ly' (see get_superobs_midpoints) and the
+    longitudes and latitudes 'lon' and 'lat' of the midpoints. Only the
+    midpoints are projected, and only once per process, area and cell size.
+    """
+    key = (area, npix, dlenmin)
+    try:
+        return _SUPEROBS_GEOMETRY[key]
+    except KeyError:
+        pass
+
+    dlen = int(np.ceil(float(npix) / 2.0))
+    dx = int(max(2 * dlenmin, 2 * dlen))
+    dy = dx
+    lx, ly = get_superobs_midpoints(area.shape, dlen, dx, dy)
+    if len(lx) == 0 or len(ly) == 0:
+        lon = lat = np.empty((len(ly), len(lx)))
+    else:
+        # The midpoints are every dy:th row upwards and every dx:th column:
+        data_slice = (slice(ly[0], ly[-1] - 1 if ly[-1] > 0 else None, -dy),
+                      slice(lx[0], lx[-1] + 1, dx))
+        lon, lat = area.get_lonlats(data_slice=data_slice)
+    for arr in (lx, ly, lon, lat):
+        arr.setflags(write=False)
+
+    _SUPEROBS_GEOMETRY[key] = {'dlen': dlen, 'dx': dx, 'dy': dy,
+                               'lx': lx, 'ly': ly, 'lon': lon, 'lat': lat}
+    return _SUPEROBS_GEOMETRY[key]
+
+
+def get_superobs_blocks(arr, dlen, dx, dy):
+    """Get a strided view of the super observation cells of *arr*.
+
+    Each cell is 2*dlen x 2*dlen pixels centered on the midpoints given by
+    get_superobs_midpoints. The returned (read only) array has the shape
+    (len(ly), len(lx), 2*dlen, 2*dlen) and the cells are ordered as the
+    midpoints. No data are copied.
+    """
+    from numpy.lib.stride_tricks import as_strided
+
+    arr = np.asarray(arr)
+    lx, ly = get_superobs_midpoints(arr.shape, dlen, dx, dy)
+    ncell = 2 * dlen
+    if len(lx) == 0 or len(ly) == 0:
+        return np.empty((len(ly), len(lx), ncell, ncell), dtype=arr.dtype)
+
+    # Start in the lower left cell and flip the rows afterwards:
+    sub = arr[ly[-1] - dlen:, lx[0] - dlen:]
+    rstride, cstride = sub.strides
+    blocks = as_strided(sub, shape=(len(ly), len(lx), ncell, ncell),
+                        strides=(dy * rstride, dx * cstride, rstride, cstride),
+                        writeable=False)
+
+    return blocks[::-1]
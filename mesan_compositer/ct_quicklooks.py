@@ -165,6 +165,6 @@ if __name__ == "__main__":
         sys.exit(-1)
 
     comp = ncCloudTypeComposite()
-    comp.load(FILENAME)
+    comp.load(FILENAME, var_names=['cloudtype', 'id', 'weight'])
 
     make_quicklooks(FILENAME, comp.cloudtype, comp.id, comp.weight)
@@ -125,7 +125,7 @@ if __name__ == "__main__":
         sys.exit(-1)
 
     comp = ncCTTHComposite()
-    comp.load(filename)
+    comp.load(filename, var_names=['height'])
 
     palette = ctth_height()
 
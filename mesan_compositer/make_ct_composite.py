@@ -24,15 +24,26 @@
 
 import argparse
 from datetime import datetime, timedelta
+from functools import partial
 from glob import glob
+import dask.array as da
 import numpy as np
+import time
 import tempfile
-import shutil
-from mesan_compositer.pps_msg_conversions import ctype_procflags2pps
+from mesan_compositer.pps_msg_conversions import ctype_procflags2pps, CTYPE_PROCFLAGS2PPS
 from mesan_compositer import (ProjectException, LoadException)
-from mesan_compositer.composite_tools import (get_msglist,
+from mesan_compositer.composite_tools import (get_area_lonlats,
+                                              get_area_lonlats_tiles,
+                                              get_msglist,
                                               get_ppslist,
-                                              get_weight_cloudtype)
+                                              get_weight_cloudtype,
+                                              imap_scenes,
+                                              merge_scene_tiles,
+                                              resample_scene)
+from mesan_compositer.msg_store import load_msg_slot
+from mesan_compositer.catalogue import FileCatalogue, get_catalogue_scenes
+from mesan_compositer.composite_state import CompositeState, get_composite_state_filename
+from mesan_compositer.utils import link_or_copy
 from mesan_compositer.netcdf_io import ncCloudTypeComposite
 from nwcsaf_formats.pps_conversions import (map_cloudtypes,
                                             ctype_convert_flags)
@@ -118,17 +129,138 @@ def ctype_pps(pps, areaid):
     return retv
 
 
-def ctype_msg(msg, areaid):
-    """Load MSG paralax corrected cloud type and reproject."""
+def ctype_msg(msg, areaid, cache_dir=None, store_dir=None):
+    """Load MSG paralax corrected cloud type and reproject.
+
+    The resampling info is cached in *cache_dir* if given. If *store_dir* is
+    given the MSG slot is read from the store shared with the CTTH
+    composite, and loaded and reprojected once for both if not there yet.
+    """
+    if store_dir:
+        return load_msg_slot(msg, areaid, ['ct', 'ct_quality'], store_dir, cache_dir=cache_dir)
+
     from satpy.scene import Scene
 
     scene = Scene(filenames=[msg.uri, ], reader='nwcsaf-msg2013-hdf5')
     scene.load(['cloudtype', 'ct', 'ct_quality'])
-    retv = scene.resample(areaid, radius_of_influence=20000)
+    retv = resample_scene(scene, areaid, 20000, cache_dir=cache_dir)
 
     return retv
 
 
+def get_scene_cloudtype(scene, areaid, obstime, cache_dir=None, store_dir=None, lonlat_cache_dir=None):
+    """Load, reproject and weight the cloud type of one MSG or PPS scene.
+
+    The MSG resampling info is cached in *cache_dir* if given, and the
+    latitudes of the area in *lonlat_cache_dir*. Return a dict with the cloud
+    type, flags, weight, time and id of the scene, and the area it is
+    reprojected to. Return None if the PPS scene could not be loaded.
+    """
+    LOG.info("Scene:\n" + str(scene))
+    if (scene.platform_name.startswith("Meteosat") and
+            not hasattr(scene, 'orbit')):
+        is_MSG = True
+        x_local = ctype_msg(scene, areaid, cache_dir=cache_dir, store_dir=store_dir)
+        dummy, lat = get_area_lonlats(x_local['ct'].area, cache_dir=lonlat_cache_dir)
+        x_CT = x_local['ct'].data.compute()
+
+        # convert msg flags to pps, of the type of the PPS flags:
+        x_flag = ctype_procflags2pps(x_local['ct_quality'].data.compute()).astype(np.int32)
+        x_id = np.ones(x_CT.shape, dtype=np.uint8)
+    else:
+        is_MSG = False
+        try:
+            x_local = ctype_pps(scene, areaid)
+        except (ProjectException, LoadException) as err:
+            LOG.warning("Couldn't load pps scene:\n" + str(scene))
+            LOG.warning("Exception was: " + str(err))
+            return None
+
+        # x_CT = x_local['CT'].ct.data
+        # x_flag = x_local['CT'].ct_quality.data
+        # Convert to old format:
+        x_CT = map_cloudtypes(x_local['ct'].data.compute(), inplace=True)
+        sflags = x_local['ct_status_flag']
+        cflags = x_local['ct_conditions']
+        qflags = x_local['ct_quality']
+        x_flag = ctype_convert_flags(sflags, cflags, qflags).values
+        x_id = np.zeros(x_CT.shape, dtype=np.uint8)
+        lat = 0 * np.ones(x_CT.shape)
+
+    # time identifier is seconds since 1970-01-01 00:00:00
+    x_time = time.mktime(scene.timeslot.timetuple()) * np.ones(x_CT.shape)
+    idx_MSG = is_MSG * np.ones(x_CT.shape, dtype=np.bool)
+    x_w = get_weight_cloudtype(
+        x_CT, x_flag, lat, abs(obstime - scene.timeslot), idx_MSG, fill_value=255)
+
+    return {'ct': x_CT,
+            'flag': x_flag,
+            'weight': x_w,
+            'time': x_time,
+            'id': x_id,
+            'area': x_local['ct'].area}
+
+
+def get_scene_cloudtype_tiles(scene, areaid, obstime, tile_rows, cache_dir=None, store_dir=None,
+                              lonlat_cache_dir=None):
+    """Get the reprojected and weighted cloud type of one MSG or PPS scene in tiles.
+
+    As get_scene_cloudtype, but nothing is computed. The fields returned are
+    dask arrays in blocks of *tile_rows* rows, each block computed from the
+    corresponding block of the scene data.
+    """
+    LOG.info("Scene:\n" + str(scene))
+    if (scene.platform_name.startswith("Meteosat") and
+            not hasattr(scene, 'orbit')):
+        is_MSG = True
+        x_local = ctype_msg(scene, areaid, cache_dir=cache_dir, store_dir=store_dir)
+        area = x_local['ct'].area
+        chunks = (tile_rows, area.shape[1])
+        dummy, lat = get_area_lonlats_tiles(area, chunks, cache_dir=lonlat_cache_dir)
+        x_CT = x_local['ct'].data.rechunk(chunks)
+
+        # convert msg flags to pps, of the type of the PPS flags:
+        x_flag = x_local['ct_quality'].data.rechunk(chunks).map_blocks(
+            ctype_procflags2pps, dtype=CTYPE_PROCFLAGS2PPS.dtype).astype(np.int32)
+        x_id = da.ones(area.shape, dtype=np.uint8, chunks=chunks)
+    else:
+        is_MSG = False
+        try:
+            x_local = ctype_pps(scene, areaid)
+        except (ProjectException, LoadException) as err:
+            LOG.warning("Couldn't load pps scene:\n" + str(scene))
+            LOG.warning("Exception was: " + str(err))
+            return None
+
+        area = x_local['ct'].area
+        chunks = (tile_rows, area.shape[1])
+        x_CT = map_cloudtypes(x_local['ct'].data.rechunk(chunks))
+        sflags = x_local['ct_status_flag']
+        cflags = x_local['ct_conditions']
+        qflags = x_local['ct_quality']
+        x_flag = ctype_convert_flags(sflags, cflags, qflags).data.rechunk(chunks)
+        x_id = da.zeros(area.shape, dtype=np.uint8, chunks=chunks)
+        lat = da.zeros(area.shape, chunks=chunks)
+
+    # time identifier is seconds since 1970-01-01 00:00:00
+    x_time = da.full(area.shape, time.mktime(scene.timeslot.timetuple()), chunks=chunks)
+    x_w = da.map_blocks(_get_weight_cloudtype_block, x_CT, x_flag, lat, dtype=np.float64,
+                        tdiff=abs(obstime - scene.timeslot), is_msg=is_MSG)
+
+    return {'ct': da.where(x_CT > 20, 255, x_CT),
+            'flag': x_flag,
+            'weight': x_w,
+            'time': x_time,
+            'id': x_id,
+            'area': area}
+
+
+def _get_weight_cloudtype_block(ctype, ctype_flag, lat, tdiff, is_msg):
+    """Get the cloud type weight of a block of a scene, leaving the cloud types as they are."""
+    idx_MSG = is_msg * np.ones(ctype.shape, dtype=np.bool)
+    return get_weight_cloudtype(ctype.copy(), ctype_flag, lat, tdiff, idx_MSG, fill_value=255)
+
+
 class ctCompositer(object):
     """The Cloud Type Composite generator class."""
 
@@ -171,7 +303,9 @@ class ctCompositer(object):
         self.pps_scenes = []
         self.msg_scenes = []
 
-        self.composite = ncCloudTypeComposite()
+        self.composite = ncCloudTypeComposite(compact=config_options.get('compact_encoding', False))
+        # Number of rows of the blocks a tiled composite is made in, if any:
+        self.tile_rows = int(config_options.get('composite_tile_rows', 0))
 
     def _get_all_pps_files(self, pps_dir):
         """Return list of pps files in directory."""
@@ -201,39 +335,67 @@ class ctCompositer(object):
         """Get the list of valid NWCSAF/Geo scenes from file list."""
         return get_msglist(geo_file_list, self.time_window, self.msg_areaname)  # satellites=self.msg_satellites)
 
-    def get_catalogue(self):
+    def get_catalogue(self, scene_catalogue=None):
         """Get the catalougue of input data files.
 
         Get the meta data (start-time, satellite, orbit number etc) for all
         available satellite scenes (both polar and geostationary) within the
-        time window specified. For the time being this catalouge generation
-        will be done by simple file globbing. In the future this might be
-        done by doing a DB search.
+        time window specified. If a *scene_catalogue* is given, like the one
+        the runner keeps from the incoming messages, the scenes are taken
+        from there as they are. Else if a 'catalogue_file' is configured the
+        scenes are looked up in the persistent file catalogue (see
+        mesan_compositer.catalogue), which is first brought up to date with
+        the input directories. Otherwise the catalouge is generated by simple
+        file globbing.
         """
+        if scene_catalogue is not None:
+            self.pps_scenes, self.msg_scenes = get_catalogue_scenes(
+                scene_catalogue, 'CT', self.time_window, self.polar_satellites, self.msg_areaname)
+            self.pps_scenes.sort()
+            self.msg_scenes.sort()
+            LOG.info("%d PPS and %d MSG scenes taken from the scene catalogue",
+                     len(self.pps_scenes), len(self.msg_scenes))
+            return
+
         min_num_of_pps_dr_files = int(self._options.get('min_num_of_pps_dr_files', '0'))
+        catalogue = None
+        if self._options.get('catalogue_file'):
+            catalogue = FileCatalogue(self._options['catalogue_file'])
 
         # Get all polar satellite scenes:
         pps_dr_dir = self._options['pps_direct_readout_dir']
-        dr_list = self._get_all_pps_files(pps_dr_dir)
-        LOG.info("Number of direct readout pps cloudtype files in dir: %s", str(len(dr_list)))
+        if catalogue:
+            num_dr_files = catalogue.update(pps_dr_dir, 'S_NWC_CT_*nc', 'pps', 'CT')
+        else:
+            dr_list = self._get_all_pps_files(pps_dr_dir)
+            num_dr_files = len(dr_list)
+        LOG.info("Number of direct readout pps cloudtype files in dir: %s", str(num_dr_files))
 
-        if len(dr_list) <= min_num_of_pps_dr_files:
+        if num_dr_files <= min_num_of_pps_dr_files:
             LOG.critical("Too few PPS DR files found! (%d<=%d)\n" +
                          "pps_dr_dir = %s",
-                         len(dr_list), min_num_of_pps_dr_files,
+                         num_dr_files, min_num_of_pps_dr_files,
                          str(pps_dr_dir))
 
-        ppsdr = self.get_pps_scenes(dr_list)
+        if catalogue:
+            ppsdr = catalogue.get_pps_scenes('CT', self.time_window, satellites=self.polar_satellites)
+        else:
+            ppsdr = self.get_pps_scenes(dr_list)
 
         ppsgds = []
-        gds_list = self._get_all_pps_files(self._options.get('pps_metop_gds_dir'))
-        if len(gds_list) > 0:
-            now = datetime.utcnow()
-            LOG.info("Number of Metop GDS files in dir: " + str(len(gds_list)))
-            ppsgds = self.get_pps_scenes(gds_list, satellites=METOPS, variant='global')
-            tic = datetime.utcnow()
-            LOG.info("Retrieve the metop-gds list took " +
-                     str((tic - now).seconds) + " sec")
+        pps_gds_dir = self._options.get('pps_metop_gds_dir')
+        if catalogue and pps_gds_dir:
+            catalogue.update(pps_gds_dir, 'S_NWC_CT_*nc', 'pps', 'CT', variant='global')
+            ppsgds = catalogue.get_pps_scenes('CT', self.time_window, satellites=METOPS, variant='global')
+        elif not catalogue:
+            gds_list = self._get_all_pps_files(pps_gds_dir)
+            if len(gds_list) > 0:
+                now = datetime.utcnow()
+                LOG.info("Number of Metop GDS files in dir: " + str(len(gds_list)))
+                ppsgds = self.get_pps_scenes(gds_list, satellites=METOPS, variant='global')
+                tic = datetime.utcnow()
+                LOG.info("Retrieve the metop-gds list took " +
+                         str((tic - now).seconds) + " sec")
 
         self.pps_scenes = ppsdr + ppsgds
         self.pps_scenes.sort()
@@ -243,15 +405,19 @@ class ctCompositer(object):
 
         # Get all geostationary satellite scenes:
         msg_dir = self._options['msg_dir'] % {"number": "02"}
-        # What about EuropeCanary and possible other areas!? FIXME!
-        msg_list = self._get_all_geo_files(msg_dir)
-        LOG.debug(
-            "MSG files in directory " + str(msg_dir) + " : " + str(msg_list))
         LOG.info("Get files inside time window: " +
                  str(self.time_window[0]) + " - " +
                  str(self.time_window[1]))
-
-        self.msg_scenes = self.get_geo_scenes(msg_list)
+        if catalogue:
+            catalogue.update(msg_dir, '*_CT___*.PLAX.CTTH.0.h5', 'msg', 'CT')
+            self.msg_scenes = catalogue.get_msg_scenes('CT', self.time_window, self.msg_areaname)
+            catalogue.close()
+        else:
+            # What about EuropeCanary and possible other areas!? FIXME!
+            msg_list = self._get_all_geo_files(msg_dir)
+            LOG.debug(
+                "MSG files in directory " + str(msg_dir) + " : " + str(msg_list))
+            self.msg_scenes = self.get_geo_scenes(msg_list)
         self.msg_scenes.sort()
         LOG.info(str(len(self.msg_scenes)) + " MSG scenes located")
         for scene in self.msg_scenes:
@@ -261,17 +427,12 @@ class ctCompositer(object):
         """Make the Cloud Type composite."""
         # Reference time for time stamp in composite file
         # sec1970 = datetime(1970, 1, 1)
-        import time
-
-        comp_CT = None
-
         if len(self.msg_scenes + self.pps_scenes) == 0:
             LOG.error(
                 "Cannot make ct composite when no Scenes have been found!")
             return False
 
         # Loop over all polar and geostationary satellite scenes:
-        is_MSG = False
         LOG.info("Loop over all polar and geostationary scenes:")
         # msgscenes = [self.msg_scenes[0], self.msg_scenes[2], self.msg_scenes[1]]
         # msgscenes = [self.msg_scenes[2], self.msg_scenes[1], self.msg_scenes[0]]
@@ -289,93 +450,123 @@ class ctCompositer(object):
                 tdelta = abs(scene.timeslot - self.obstime)
                 myindex = idx
         msgscenes = self.msg_scenes[::-1]
-        scene = self.msg_scenes[myindex]
-        msgscenes.remove(scene)
-        msgscenes.insert(0, scene)
-
-        for scene in msgscenes + self.pps_scenes:
-            x_CT = None
-            LOG.info("Scene:\n" + str(scene))
-            if (scene.platform_name.startswith("Meteosat") and
-                    not hasattr(scene, 'orbit')):
-                is_MSG = True
-                x_local = ctype_msg(scene, self.areaid)
-                dummy, lat = x_local['ct'].area.get_lonlats()
-                x_CT = x_local['ct'].data.compute()
-
-                # convert msg flags to pps
-                x_flag = ctype_procflags2pps(x_local['ct_quality'].data.compute())
-                x_id = 1 * np.ones(x_CT.shape)
-            else:
-                is_MSG = False
-                try:
-                    x_local = ctype_pps(scene, self.areaid)
-                except (ProjectException, LoadException) as err:
-                    LOG.warning("Couldn't load pps scene:\n" + str(scene))
-                    LOG.warning("Exception was: " + str(err))
-                    continue
-
-                # x_CT = x_local['CT'].ct.data
-                # x_flag = x_local['CT'].ct_quality.data
-                # Convert to old format:
-                x_CT = map_cloudtypes(x_local['ct'].data)
-                sflags = x_local['ct_status_flag']
-                cflags = x_local['ct_conditions']
-                qflags = x_local['ct_quality']
-                x_flag = ctype_convert_flags(sflags, cflags, qflags)
-                x_id = 0 * np.ones(x_CT.shape)
-                lat = 0 * np.ones(x_CT.shape)
-
-            # time identifier is seconds since 1970-01-01 00:00:00
-            x_time = time.mktime(scene.timeslot.timetuple()) * np.ones(x_CT.shape)
-            idx_MSG = is_MSG * np.ones(x_CT.shape, dtype=np.bool)
-            if comp_CT is None:
+        if msgscenes:
+            scene = self.msg_scenes[myindex]
+            msgscenes.remove(scene)
+            msgscenes.insert(0, scene)
+
+        scenes = msgscenes + self.pps_scenes
+        if self.tile_rows:
+            return self._make_composite_tiled(scenes)
+
+        state = CompositeState(scenes)
+        state_filename = None
+        if self._options.get('composite_state_dir'):
+            state_filename = get_composite_state_filename(self._options['composite_state_dir'], 'ct',
+                                                          self.areaid, self.obstime)
+            if state.load(state_filename):
+                scenes = state.get_new_scenes(scenes)
+                LOG.info("%d new scenes to merge into the composite", len(scenes))
+
+        ingest = partial(get_scene_cloudtype, areaid=self.areaid, obstime=self.obstime,
+                         cache_dir=self._options.get('resample_cache_dir'),
+                         store_dir=self._options.get('msg_store_dir'),
+                         lonlat_cache_dir=self._options.get('lonlat_cache_dir'))
+        for scene, x_local in zip(scenes, imap_scenes(ingest, scenes, self._options)):
+            if x_local is None:
+                continue
+
+            if state.fields is None:
                 # initialize field with current CT
-                comp_lon, comp_lat = x_local['ct'].area.get_lonlats()
-                comp_CT = x_CT
-                comp_flag = x_flag
-                comp_time = x_time
-                comp_id = x_id
-                comp_w = get_weight_cloudtype(
-                    x_CT, x_flag, lat, abs(self.obstime - scene.timeslot), idx_MSG, fill_value=255)
+                state.start(scene, dict((name, x_local[name])
+                                        for name in ['ct', 'flag', 'weight', 'time', 'id']),
+                            x_local['area'])
             else:
                 # compare with quality of current CT
-                x_w = get_weight_cloudtype(
-                    x_CT, x_flag, lat, abs(self.obstime - scene.timeslot), idx_MSG, fill_value=255)
+                x_w = x_local['weight']
 
-                # replace info where current CT data is best
-                ii = x_w > comp_w
+                # replace info where current CT data is best, keeping the
+                # data types of the first scene:
+                ii = state.get_replace_mask(scene, x_w)
 
-                comp_CT = np.where(ii, x_CT, comp_CT)
-                comp_flag = np.where(ii, x_flag, comp_flag)
-                comp_w = np.where(ii, x_w, comp_w)
-                comp_time = np.where(ii, x_time, comp_time)
-                comp_id = np.where(ii, x_id, comp_id)
+                comp = state.fields
+                for name in ['ct', 'flag', 'weight', 'time', 'id']:
+                    comp[name] = np.where(ii, x_local[name], comp[name]).astype(comp[name].dtype, copy=False)
 
-        self.longitude = comp_lon
-        self.latitude = comp_lat
+        if state.fields is None:
+            LOG.error("None of the scenes could be loaded, no ct composite made!")
+            return False
+        if state_filename:
+            state.save(state_filename)
+
+        self.area = state.area
+        self.longitude, self.latitude = get_area_lonlats(
+            self.area, cache_dir=self._options.get('lonlat_cache_dir'))
+
+        comp = state.fields
+        composite = {"cloudtype": comp['ct'],
+                     "flag": comp['flag'],
+                     "weight": comp['weight'],
+                     "time": comp['time'],
+                     "id": comp['id'].astype(np.uint8)}
+        self.composite.store(composite, self.area)
+
+        return True
 
-        self.area = x_local['ct'].area
+    def _make_composite_tiled(self, scenes):
+        """Make the Cloud Type composite of the *scenes* in blocks of rows.
 
-        composite = {"cloudtype": comp_CT,
-                     "flag": comp_flag,
-                     "weight": comp_w,
-                     "time": comp_time,
-                     "id": comp_id.astype(np.uint8)}
+        The composite is only set up here, as dask arrays in blocks of rows,
+        and computed block by block when written, see write. No composite
+        state is kept.
+        """
+        if self._options.get('composite_state_dir'):
+            LOG.warning("The composite state is not kept for tiled composites")
+
+        ingest = partial(get_scene_cloudtype_tiles, areaid=self.areaid, obstime=self.obstime,
+                         tile_rows=self.tile_rows,
+                         cache_dir=self._options.get('resample_cache_dir'),
+                         store_dir=self._options.get('msg_store_dir'),
+                         lonlat_cache_dir=self._options.get('lonlat_cache_dir'))
+        scenes_fields = [x_local for x_local in map(ingest, scenes) if x_local is not None]
+        if not scenes_fields:
+            LOG.error("None of the scenes could be loaded, no ct composite made!")
+            return False
+
+        # The composite fields keep the data types of the first scene:
+        names = ['ct', 'flag', 'weight', 'time', 'id']
+        comp = merge_scene_tiles(scenes_fields, names,
+                                 dict((name, scenes_fields[0][name].dtype) for name in names))
+
+        self.area = scenes_fields[0]['area']
+        self.longitude, self.latitude = get_area_lonlats_tiles(
+            self.area, comp['ct'].chunksize, cache_dir=self._options.get('lonlat_cache_dir'))
+
+        composite = {"cloudtype": comp['ct'],
+                     "flag": comp['flag'],
+                     "weight": comp['weight'],
+                     "time": comp['time'],
+                     "id": comp['id'].astype(np.uint8)}
         self.composite.store(composite, self.area)
 
         return True
 
     def write(self):
-        """Write the composite to a netcdf file."""
+        """Write the composite to a netcdf file.
+
+        A tiled composite is computed as it is written, and then read back
+        from the file for the quicklooks and super observations.
+        """
         tmpfname = tempfile.mktemp(suffix=os.path.basename(self.filename),
                                    dir=os.path.dirname(self.filename))
         self.composite.write(tmpfname)
         now = datetime.utcnow()
         fname_with_timestamp = str(
             self.filename) + now.strftime('_%Y%m%d%H%M%S.nc')
-        shutil.copy(tmpfname, fname_with_timestamp)
+        link_or_copy(tmpfname, fname_with_timestamp)
         os.rename(tmpfname, self.filename + '.nc')
+        if self.tile_rows:
+            self.composite.load(self.filename + '.nc')
 
         return
 
@@ -24,6 +24,10 @@
 
 import argparse
 from datetime import datetime, timedelta
+from functools import partial
+import time
+import dask
+import dask.array as da
 import numpy as np
 import xarray as xr
 
@@ -32,18 +36,26 @@ from mesan_compositer import ctth_height
 from satpy.composites import ColormapCompositor
 
 from mesan_compositer import (ProjectException, LoadException)
-from mesan_compositer.pps_msg_conversions import ctth_procflags2pps
+from mesan_compositer.pps_msg_conversions import ctth_procflags2pps, CTTH_PROCFLAGS2PPS
 from nwcsaf_formats.pps_conversions import ctth_convert_flags
 from mesan_compositer.composite_tools import METOPS
 from mesan_compositer.netcdf_io import ncCTTHComposite
 from mesan_compositer import get_config
-from mesan_compositer.composite_tools import (get_msglist,
+from mesan_compositer.composite_tools import (get_area_lonlats,
+                                              get_area_lonlats_tiles,
+                                              get_msglist,
                                               get_ppslist,
-                                              get_weight_ctth)
+                                              get_weight_ctth,
+                                              imap_scenes,
+                                              merge_scene_tiles,
+                                              resample_scene)
+from mesan_compositer.msg_store import load_msg_slot
+from mesan_compositer.catalogue import FileCatalogue, get_catalogue_scenes
+from mesan_compositer.composite_state import CompositeState, get_composite_state_filename
+from mesan_compositer.utils import link_or_copy
 import sys
 import os
 import tempfile
-import shutil
 from logging import handlers
 import logging
 
@@ -114,17 +126,171 @@ def ctth_pps(pps, areaid):
     return retv
 
 
-def ctth_msg(msg, areaid):
-    """Load MSG paralax corrected ctth and reproject."""
+def ctth_msg(msg, areaid, cache_dir=None, store_dir=None):
+    """Load MSG paralax corrected ctth and reproject.
+
+    The resampling info is cached in *cache_dir* if given. If *store_dir* is
+    given the MSG slot is read from the store shared with the cloud type
+    composite, and loaded and reprojected once for both if not there yet.
+    """
+    if store_dir:
+        return load_msg_slot(msg, areaid, ['ctth_alti', 'ctth_pres', 'ctth_tempe', 'ctth_quality'],
+                             store_dir, cache_dir=cache_dir)
+
     from satpy.scene import Scene
 
     scene = Scene(filenames=[msg.uri, ], reader='nwcsaf-msg2013-hdf5')
     scene.load(['ctth_alti', 'ctth_pres', 'ctth_tempe', 'ctth_quality', 'ctth_effective_cloudiness'])
 
-    retv = scene.resample(areaid, radius_of_influence=20000)
+    retv = resample_scene(scene, areaid, 20000, cache_dir=cache_dir)
     return retv
 
 
+def get_scene_ctth(scene, areaid, obstime, cache_dir=None, store_dir=None, lonlat_cache_dir=None):
+    """Load, reproject and weight the CTTH of one MSG or PPS scene.
+
+    All CTTH variables of the scene are computed in one go. The MSG
+    resampling info is cached in *cache_dir* if given, and the latitudes of
+    the area in *lonlat_cache_dir*. Return a dict with the temperature,
+    pressure, height, flags, weight, time and id of the scene, and the area
+    it is reprojected to. Return None if the PPS scene could not be loaded.
+    """
+    LOG.info("Scene: " + str(scene))
+    if (scene.platform_name.startswith("Meteosat") and
+            not hasattr(scene, 'orbit')):
+        is_MSG = True
+        x_local = ctth_msg(scene, areaid, cache_dir=cache_dir, store_dir=store_dir)
+
+        dummy, lat = get_area_lonlats(x_local['ctth_alti'].area, cache_dir=lonlat_cache_dir)
+        x_temperature, x_pressure, x_height, x_quality = dask.compute(
+            x_local['ctth_tempe'].data, x_local['ctth_pres'].data,
+            x_local['ctth_alti'].data, x_local['ctth_quality'].data)
+
+        # convert msg flags to pps
+        # fill_value = 0, fill with 65535 (same as pps flag fill value)
+        # so that bit 0 is set -> unprocessed -> w=0
+        # The weight for masked data is set further down
+        x_flag = np.ma.filled(ctth_procflags2pps(x_quality), fill_value=65535)
+        x_id = np.ones(x_temperature.shape, dtype=np.uint8)
+    else:
+        is_MSG = False
+        try:
+            x_local = ctth_pps(scene, areaid)
+        except (ProjectException, LoadException) as err:
+            LOG.critical("Couldn't load pps scene: %s\nException was: %s",
+                         str(scene), str(err))
+            return None
+
+        # Temperature (K)', u'no_data_value': 255, u'intercept': 100.0,
+        # u'gain': 1.0
+        # LOG.debug("scale and offset: %s %s", str(x_local['ctth_tempe'].attrs['scale_factor']),
+        #          str(x_local['ctth_tempe'].attrs['add_offset']))
+
+        sflags = x_local['ctth_status_flag']
+        cflags = x_local['ctth_conditions']
+        # qflags = x_local['CTTH'].ctth_quality.data.filled(0)
+        qflags = x_local['ctth_quality']
+        # The flags are converted lazily and computed with the rest:
+        oldflags = ctth_convert_flags(sflags, cflags, qflags)
+
+        x_temperature, x_pressure, x_height, oldflags = dask.compute(
+            x_local['ctth_tempe'].data, x_local['ctth_pres'].data,
+            x_local['ctth_alti'].data, oldflags.data)
+
+        # fill_value = 65535 i.e bit 0 is set -> unprocessed -> w=0
+        # x_flag = np.ma.filled(oldflags, fill_value=65535)
+        x_flag = oldflags
+
+        x_id = np.zeros(x_temperature.shape, dtype=np.uint8)
+        lat = 0 * np.ones(x_temperature.shape)
+
+    # time identifier is seconds since 1970-01-01 00:00:00
+    x_time = time.mktime(scene.timeslot.timetuple()) * \
+        np.ones(x_temperature.shape)
+    idx_MSG = is_MSG * np.ones(x_temperature.shape, dtype=np.bool)
+
+    x_w = get_weight_ctth(x_flag, lat, abs(obstime - scene.timeslot), idx_MSG)
+    # fix to cope with unprocessed data
+    # ii = (x_height.mask == True) | (x_height == 0)
+    ii = np.isnan(x_height)
+    x_w[ii] = 0
+
+    return {'temperature': x_temperature,
+            'pressure': x_pressure,
+            'height': x_height,
+            'flag': x_flag,
+            'weight': x_w,
+            'time': x_time,
+            'id': x_id,
+            'area': x_local['ctth_alti'].area}
+
+
+def get_scene_ctth_tiles(scene, areaid, obstime, tile_rows, cache_dir=None, store_dir=None,
+                         lonlat_cache_dir=None):
+    """Get the reprojected and weighted CTTH of one MSG or PPS scene in tiles.
+
+    As get_scene_ctth, but nothing is computed. The fields returned are dask
+    arrays in blocks of *tile_rows* rows, each block computed from the
+    corresponding block of the scene data.
+    """
+    LOG.info("Scene: " + str(scene))
+    if (scene.platform_name.startswith("Meteosat") and
+            not hasattr(scene, 'orbit')):
+        is_MSG = True
+        x_local = ctth_msg(scene, areaid, cache_dir=cache_dir, store_dir=store_dir)
+        area = x_local['ctth_alti'].area
+        chunks = (tile_rows, area.shape[1])
+        dummy, lat = get_area_lonlats_tiles(area, chunks, cache_dir=lonlat_cache_dir)
+
+        # convert msg flags to pps
+        x_flag = x_local['ctth_quality'].data.rechunk(chunks).map_blocks(
+            ctth_procflags2pps, dtype=CTTH_PROCFLAGS2PPS.dtype)
+        x_id = da.ones(area.shape, dtype=np.uint8, chunks=chunks)
+    else:
+        is_MSG = False
+        try:
+            x_local = ctth_pps(scene, areaid)
+        except (ProjectException, LoadException) as err:
+            LOG.critical("Couldn't load pps scene: %s\nException was: %s",
+                         str(scene), str(err))
+            return None
+
+        area = x_local['ctth_alti'].area
+        chunks = (tile_rows, area.shape[1])
+        sflags = x_local['ctth_status_flag']
+        cflags = x_local['ctth_conditions']
+        qflags = x_local['ctth_quality']
+        x_flag = ctth_convert_flags(sflags, cflags, qflags).data.rechunk(chunks)
+        x_id = da.zeros(area.shape, dtype=np.uint8, chunks=chunks)
+        lat = da.zeros(area.shape, chunks=chunks)
+
+    x_temperature = x_local['ctth_tempe'].data.rechunk(chunks)
+    x_pressure = x_local['ctth_pres'].data.rechunk(chunks)
+    x_height = x_local['ctth_alti'].data.rechunk(chunks)
+
+    # time identifier is seconds since 1970-01-01 00:00:00
+    x_time = da.full(area.shape, time.mktime(scene.timeslot.timetuple()), chunks=chunks)
+    x_w = da.map_blocks(_get_weight_ctth_block, x_flag, lat, dtype=np.float64,
+                        tdiff=abs(obstime - scene.timeslot), is_msg=is_MSG)
+    # fix to cope with unprocessed data
+    x_w = da.where(da.isnan(x_height), 0, x_w)
+
+    return {'temperature': x_temperature,
+            'pressure': x_pressure,
+            'height': x_height,
+            'flag': x_flag,
+            'weight': x_w,
+            'time': x_time,
+            'id': x_id,
+            'area': area}
+
+
+def _get_weight_ctth_block(ctth_flag, lat, tdiff, is_msg):
+    """Get the CTTH weight of a block of a scene."""
+    idx_MSG = is_msg * np.ones(ctth_flag.shape, dtype=np.bool)
+    return get_weight_ctth(ctth_flag, lat, tdiff, idx_MSG)
+
+
 class mesanComposite(object):
     """Master class for the Mesan cloud product composite generators."""
 
@@ -150,31 +316,58 @@ class mesanComposite(object):
         self.product_names = {'msg': 'unknown', 'pps': 'unknown'}
         self.composite = None
 
-    def get_catalogue(self, product):
+    def get_catalogue(self, product, scene_catalogue=None):
         """Get a list of meta-data for all input scenes to process.
 
         Get the meta data (start-time, satellite, orbit number etc) for all
         available satellite scenes (both polar and geostationary) within the
-        time window specified. For the time being this catalouge generation
-        will be done by simple file globbing. In a later stage this will be
-        done by doing a DB search.
+        time window specified. If a *scene_catalogue* is given, like the one
+        the runner keeps from the incoming messages, the scenes are taken
+        from there as they are. Else if a 'catalogue_file' is configured the
+        scenes are looked up in the persistent file catalogue (see
+        mesan_compositer.catalogue), which is first brought up to date with
+        the input directories. Otherwise the catalouge is generated by simple
+        file globbing.
 
         *product* can be either 'cloudtype' or 'ctth'
         """
         from glob import glob
 
+        if scene_catalogue is not None:
+            self.pps_scenes, self.msg_scenes = get_catalogue_scenes(
+                scene_catalogue, self.product_names['pps'], self.time_window,
+                self.polar_satellites, self.msg_areaname)
+            self.pps_scenes.sort()
+            self.msg_scenes.sort()
+            LOG.info("%d Polar and %d MSG scenes taken from the scene catalogue",
+                     len(self.pps_scenes), len(self.msg_scenes))
+            return
+
+        catalogue = None
+        if self._options.get('catalogue_file'):
+            catalogue = FileCatalogue(self._options['catalogue_file'])
+
         # Get all polar satellite scenes:
         pps_dr_dir = self._options.get('pps_direct_readout_dir', None)
         LOG.debug('pps_dr_dir = ' + str(pps_dr_dir))
         pps_gds_dir = self._options.get('pps_metop_gds_dir')
         prodn = self.product_names['pps']
-        dr_list = glob(
-            os.path.join(pps_dr_dir, 'S_NWC_' + str(prodn) + '*.nc'))
-        ppsdr = get_ppslist(dr_list, self.time_window,
-                            satellites=self.polar_satellites)
+        if catalogue:
+            catalogue.update(pps_dr_dir, 'S_NWC_' + str(prodn) + '*.nc', 'pps', prodn)
+            ppsdr = catalogue.get_pps_scenes(prodn, self.time_window,
+                                             satellites=self.polar_satellites)
+        else:
+            dr_list = glob(
+                os.path.join(pps_dr_dir, 'S_NWC_' + str(prodn) + '*.nc'))
+            ppsdr = get_ppslist(dr_list, self.time_window,
+                                satellites=self.polar_satellites)
 
         ppsgds = []
-        if pps_gds_dir:
+        if pps_gds_dir and catalogue:
+            catalogue.update(pps_gds_dir, '*' + str(prodn) + '*.nc', 'pps', prodn, variant='global')
+            ppsgds = catalogue.get_pps_scenes(prodn, self.time_window,
+                                              satellites=METOPS, variant='global')
+        elif pps_gds_dir:
             now = datetime.utcnow()
             gds_list = glob(os.path.join(pps_gds_dir, '*' + str(prodn) + '*.nc'))
             if len(gds_list) > 0:
@@ -202,10 +395,15 @@ class mesanComposite(object):
 
         # What about EuropeCanary and possible other areas!? FIXME!
         prodn = self.product_names['msg']
-        msg_list = glob(
-            os.path.join(msg_dir, '*_' + str(prodn) + '*' + str(ext)))
-        self.msg_scenes = get_msglist(msg_list, self.time_window,
-                                      self.msg_areaname)  # satellites=self.msg_satellites)
+        if catalogue:
+            catalogue.update(msg_dir, '*_' + str(prodn) + '*' + str(ext), 'msg', prodn)
+            self.msg_scenes = catalogue.get_msg_scenes(prodn, self.time_window, self.msg_areaname)
+            catalogue.close()
+        else:
+            msg_list = glob(
+                os.path.join(msg_dir, '*_' + str(prodn) + '*' + str(ext)))
+            self.msg_scenes = get_msglist(msg_list, self.time_window,
+                                          self.msg_areaname)  # satellites=self.msg_satellites)
         self.msg_scenes.sort()
         LOG.info(str(len(self.msg_scenes)) + " MSG scenes located")
         for scene in self.msg_scenes:
@@ -244,148 +442,146 @@ class ctthComposite(mesanComposite):
         self.areaid = areaid
 
         self.product_names = {'msg': 'CTTH', 'pps': 'CTTH'}
-        self.composite = ncCTTHComposite()
+        self.composite = ncCTTHComposite(compact=config_options.get('compact_encoding', False))
+        # Number of rows of the blocks a tiled composite is made in, if any:
+        self.tile_rows = int(config_options.get('composite_tile_rows', 0))
 
-    def get_catalogue(self, product='ctth'):
+    def get_catalogue(self, product='ctth', scene_catalogue=None):
         """Get a list with meta-data for all inout scenes."""
-        super(ctthComposite, self).get_catalogue(product)
+        super(ctthComposite, self).get_catalogue(product, scene_catalogue=scene_catalogue)
 
     def make_composite(self):
         """Make the CTTH composite."""
         # Reference time for time stamp in composite file
         # sec1970 = datetime(1970, 1, 1)
-        import time
-
-        comp_temperature = None
-        comp_height = None
-        comp_pressure = None
-
         if len(self.msg_scenes + self.pps_scenes) == 0:
             LOG.critical(
                 "Cannot make ctth composite when no Scenes have been found!")
             return False
 
+        scenes = self.msg_scenes + self.pps_scenes
+        if self.tile_rows:
+            return self._make_composite_tiled(scenes)
+
+        state = CompositeState(scenes)
+        state_filename = None
+        if self._options.get('composite_state_dir'):
+            state_filename = get_composite_state_filename(self._options['composite_state_dir'], 'ctth',
+                                                          self.areaid, self.obstime)
+            if state.load(state_filename):
+                scenes = state.get_new_scenes(scenes)
+                LOG.info("%d new scenes to merge into the composite", len(scenes))
+
         # Loop over all polar scenes:
-        is_MSG = False
         LOG.info(
             "CTTH composite - Loop over all polar and geostationary scenes:")
-        for scene in self.msg_scenes + self.pps_scenes:
-            LOG.info("Scene: " + str(scene))
-            if (scene.platform_name.startswith("Meteosat") and
-                    not hasattr(scene, 'orbit')):
-                is_MSG = True
-                x_local = ctth_msg(scene, self.areaid)
-
-                dummy, lat = x_local['ctth_alti'].area.get_lonlats()
-                x_temperature = x_local['ctth_tempe'].data.compute()
-                x_pressure = x_local['ctth_pres'].data.compute()
-                x_height = x_local['ctth_alti'].data.compute()
-
-                # convert msg flags to pps
-                # fill_value = 0, fill with 65535 (same as pps flag fill value)
-                # so that bit 0 is set -> unprocessed -> w=0
-                # The weight for masked data is set further down
-                x_flag = np.ma.filled(ctth_procflags2pps(x_local['ctth_quality'].data.compute()),
-                                      fill_value=65535)
-                x_id = 1 * np.ones(x_temperature.shape)
-            else:
-                is_MSG = False
-                try:
-                    x_local = ctth_pps(scene, self.areaid)
-                except (ProjectException, LoadException) as err:
-                    LOG.critical("Couldn't load pps scene: %s\nException was: %s",
-                                 (str(scene), str(err)))
-                    continue
-
-                # Temperature (K)', u'no_data_value': 255, u'intercept': 100.0,
-                # u'gain': 1.0
-                # LOG.debug("scale and offset: %s %s", str(x_local['ctth_tempe'].attrs['scale_factor']),
-                #          str(x_local['ctth_tempe'].attrs['add_offset']))
-
-                x_temperature = x_local['ctth_tempe'].data.compute()
-                x_pressure = x_local['ctth_pres'].data.compute()
-                x_height = x_local['ctth_alti'].data.compute()
-
-                sflags = x_local['ctth_status_flag'].data.compute()
-                cflags = x_local['ctth_conditions'].data.compute()
-                # qflags = x_local['CTTH'].ctth_quality.data.filled(0)
-                qflags = x_local['ctth_quality'].data.compute()
-                oldflags = ctth_convert_flags(sflags, cflags, qflags)
-
-                # fill_value = 65535 i.e bit 0 is set -> unprocessed -> w=0
-                # x_flag = np.ma.filled(oldflags, fill_value=65535)
-                x_flag = oldflags
-
-                x_id = 0 * np.ones(x_temperature.shape)
-                lat = 0 * np.ones(x_temperature.shape)
-
-            # time identifier is seconds since 1970-01-01 00:00:00
-            x_time = time.mktime(scene.timeslot.timetuple()) * \
-                np.ones(x_temperature.shape)
-            idx_MSG = is_MSG * np.ones(x_temperature.shape, dtype=np.bool)
-
-            if comp_temperature is None:
+        ingest = partial(get_scene_ctth, areaid=self.areaid, obstime=self.obstime,
+                         cache_dir=self._options.get('resample_cache_dir'),
+                         store_dir=self._options.get('msg_store_dir'),
+                         lonlat_cache_dir=self._options.get('lonlat_cache_dir'))
+        for scene, x_local in zip(scenes, imap_scenes(ingest, scenes, self._options)):
+            if x_local is None:
+                continue
+
+            if state.fields is None:
                 # initialize field with current CTTH
-                comp_lon, comp_lat = x_local['ctth_alti'].area.get_lonlats()
-                comp_temperature = x_temperature
-                comp_pressure = x_pressure
-                comp_height = x_height
-                comp_flag = x_flag
-                comp_time = x_time
-                comp_id = x_id
-                comp_w = get_weight_ctth(x_flag, lat,
-                                         abs(self.obstime - scene.timeslot),
-                                         idx_MSG)
-                # fix to cope with unprocessed data
-                # ii = (x_height.mask == True) | (x_height == 0)
-                ii = np.isnan(x_height)
-                comp_w[ii] = 0
+                state.start(scene, dict((name, x_local[name])
+                                        for name in ['temperature', 'pressure', 'height',
+                                                     'flag', 'time', 'id', 'weight']),
+                            x_local['area'])
             else:
                 # compare with quality of current CTTH
-                x_w = get_weight_ctth(x_flag, lat,
-                                      abs(self.obstime - scene.timeslot),
-                                      idx_MSG)
-
-                # fix to cope with unprocessed data
-                # ii = (x_height.mask == True) | (x_height == 0)
-                ii = np.isnan(x_height)
-                x_w[ii] = 0
+                x_w = x_local['weight']
 
                 # replace info where current CTTH data is best
-                ii = x_w > comp_w
-                comp_temperature[ii] = x_temperature[ii]
-                comp_pressure[ii] = x_pressure[ii]
-                comp_height[ii] = x_height[ii]
-                comp_flag[ii] = x_flag[ii]
-                comp_w[ii] = x_w[ii]
-                comp_time[ii] = x_time[ii]
-                comp_id[ii] = x_id[ii]
-
-        self.longitude = comp_lon
-        self.latitude = comp_lat
-        self.area = x_local['ctth_alti'].area
-
-        composite = {"temperature": comp_temperature,
-                     "height": comp_height,
-                     "pressure": comp_pressure,
-                     "flag": comp_flag,
-                     "weight": comp_w,
-                     "time": comp_time,
-                     "id": comp_id.astype(np.uint8)}
+                ii = state.get_replace_mask(scene, x_w)
+                comp = state.fields
+                comp['temperature'][ii] = x_local['temperature'][ii]
+                comp['pressure'][ii] = x_local['pressure'][ii]
+                comp['height'][ii] = x_local['height'][ii]
+                comp['flag'][ii] = x_local['flag'][ii]
+                comp['weight'][ii] = x_w[ii]
+                comp['time'][ii] = x_local['time'][ii]
+                comp['id'][ii] = x_local['id'][ii]
+
+        if state.fields is None:
+            LOG.critical("None of the scenes could be loaded, no ctth composite made!")
+            return False
+        if state_filename:
+            state.save(state_filename)
+
+        self.area = state.area
+        self.longitude, self.latitude = get_area_lonlats(
+            self.area, cache_dir=self._options.get('lonlat_cache_dir'))
+
+        comp = state.fields
+        composite = {"temperature": comp['temperature'],
+                     "height": comp['height'],
+                     "pressure": comp['pressure'],
+                     "flag": comp['flag'],
+                     "weight": comp['weight'],
+                     "time": comp['time'],
+                     "id": comp['id'].astype(np.uint8)}
+        self.composite.store(composite, self.area)
+
+        return True
+
+    def _make_composite_tiled(self, scenes):
+        """Make the CTTH composite of the *scenes* in blocks of rows.
+
+        The composite is only set up here, as dask arrays in blocks of rows,
+        and computed block by block when written, see write. No composite
+        state is kept.
+        """
+        if self._options.get('composite_state_dir'):
+            LOG.warning("The composite state is not kept for tiled composites")
+
+        ingest = partial(get_scene_ctth_tiles, areaid=self.areaid, obstime=self.obstime,
+                         tile_rows=self.tile_rows,
+                         cache_dir=self._options.get('resample_cache_dir'),
+                         store_dir=self._options.get('msg_store_dir'),
+                         lonlat_cache_dir=self._options.get('lonlat_cache_dir'))
+        scenes_fields = [x_local for x_local in map(ingest, scenes) if x_local is not None]
+        if not scenes_fields:
+            LOG.critical("None of the scenes could be loaded, no ctth composite made!")
+            return False
+
+        # The composite fields keep the data types of the first scene:
+        names = ['temperature', 'pressure', 'height', 'flag', 'weight', 'time', 'id']
+        comp = merge_scene_tiles(scenes_fields, names,
+                                 dict((name, scenes_fields[0][name].dtype) for name in names))
+
+        self.area = scenes_fields[0]['area']
+        self.longitude, self.latitude = get_area_lonlats_tiles(
+            self.area, comp['height'].chunksize, cache_dir=self._options.get('lonlat_cache_dir'))
+
+        composite = {"temperature": comp['temperature'],
+                     "height": comp['height'],
+                     "pressure": comp['pressure'],
+                     "flag": comp['flag'],
+                     "weight": comp['weight'],
+                     "time": comp['time'],
+                     "id": comp['id'].astype(np.uint8)}
         self.composite.store(composite, self.area)
 
         return True
 
     def write(self):
-        """Write the composite to a netcdf file."""
+        """Write the composite to a netcdf file.
+
+        A tiled composite is computed as it is written, and then read back
+        from the file for the quicklooks and super observations.
+        """
         tmpfname = tempfile.mktemp(suffix=os.path.basename(self.filename),
                                    dir=os.path.dirname(self.filename))
         self.composite.write(tmpfname)
         now = datetime.utcnow()
         fname_with_timestamp = str(
             self.filename) + now.strftime('_%Y%m%d%H%M%S.nc')
-        shutil.copy(tmpfname, fname_with_timestamp)
+        link_or_copy(tmpfname, fname_with_timestamp)
         os.rename(tmpfname, self.filename + '.nc')
+        if self.tile_rows:
+            self.composite.load(self.filename + '.nc')
 
         return
 
@@ -36,7 +36,9 @@ from six.moves.urllib.parse import urlparse
 import posttroll.subscriber
 from posttroll.publisher import Publish
 from posttroll.message import Message
-from multiprocessing import Pool, Manager
+from multiprocessing import Manager
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import threading
 try:
     # python 3
@@ -48,8 +50,13 @@ except ImportError:
 from datetime import timedelta, datetime
 
 from mesan_compositer.utils import check_uri
+from mesan_compositer.utils import get_host_ip
 from mesan_compositer.utils import get_local_ips
+from mesan_compositer.utils import refresh_local_ips
 from mesan_compositer.composite_tools import get_analysis_time
+from mesan_compositer.catalogue import SceneCatalogue, get_scene_from_message
+from mesan_compositer.scheduler import AsyncJobScheduler, JobScheduler, get_job_key
+from mesan_compositer.workers import DEFAULT_WORKERS, ExecutorPool, get_worker_pool
 from mesan_compositer import make_ct_composite as mcc
 from mesan_compositer import make_ctth_composite
 from mesan_compositer.prt_nwcsaf_cloudamount import derive_sobs as derive_sobs_clamount
@@ -86,6 +93,26 @@ MSG_NAME = {'Meteosat-10': 'MSG3', 'Meteosat-9': 'MSG2',
 
 PRODUCT_NAMES = ['CMA', 'CT', 'CTTH', 'PC', 'CPP']
 
+#: The topics of the messages the runner listens to
+SUBSCRIBE_TOPICS = ['CF/2',
+                    '2/nwcsaf-msg/0deg/ctth-plax-corrected',
+                    '2/nwcsaf-msg/0deg/ct-plax-corrected']
+
+#: How long scenes are kept in the scene catalogue of the runner
+SCENE_CATALOGUE_RETENTION = timedelta(hours=6)
+
+#: Seconds to wait for more scenes of the same composite before making it
+DEFAULT_JOB_SETTLE_SECONDS = 60
+
+#: Composites of analysis times older than this (hours) are not made
+DEFAULT_JOB_HORIZON_HOURS = 3
+
+#: Seconds between the checks for a change of the local network addresses
+DEFAULT_NETWORK_CHECK_SECONDS = 60
+
+#: Maximum number of messages waiting in the queues of the runner
+DEFAULT_QUEUE_SIZE = 1000
+
 
 def get_arguments():
     """
@@ -181,9 +208,7 @@ class FileListener(threading.Thread):
 
     def run(self):
 
-        with posttroll.subscriber.Subscribe('', ['CF/2',
-                                                 '2/nwcsaf-msg/0deg/ctth-plax-corrected',
-                                                 '2/nwcsaf-msg/0deg/ct-plax-corrected'], True) as subscr:
+        with posttroll.subscriber.Subscribe('', SUBSCRIBE_TOPICS, True) as subscr:
 
             for msg in subscr.recv(timeout=90):
                 if not self.loop:
@@ -196,34 +221,43 @@ class FileListener(threading.Thread):
                     self.queue.put(msg)
 
     def check_message(self, msg):
+        return check_message(msg)
 
-        if not msg:
-            return False
 
-        urlobj = urlparse(msg.data['uri'])
-        url_ip = socket.gethostbyname(urlobj.netloc)
-        if urlobj.netloc and (url_ip not in get_local_ips()):
-            LOG.warning("Server %s not the current one: %s", str(urlobj.netloc), socket.gethostname())
-            return False
+def check_message(msg, url_ip=None):
+    """Check whether the message *msg* is about a scene to make composites of.
 
+    The address *url_ip* of the host of the file is looked up, or taken from
+    the cache, if not given.
+    """
+    if not msg:
+        return False
+
+    urlobj = urlparse(msg.data['uri'])
+    if url_ip is None:
+        url_ip = get_host_ip(urlobj.netloc)
+    if urlobj.netloc and (url_ip not in get_local_ips()):
+        LOG.warning("Server %s not the current one: %s", str(urlobj.netloc), socket.gethostname())
+        return False
+
+    if ('platform_name' not in msg.data or
+            'orbit_number' not in msg.data or
+            'start_time' not in msg.data):
+        LOG.info(
+            "Message is lacking crucial fields, probably an MSG scene...")
         if ('platform_name' not in msg.data or
-                'orbit_number' not in msg.data or
-                'start_time' not in msg.data):
-            LOG.info(
-                "Message is lacking crucial fields, probably an MSG scene...")
-            if ('platform_name' not in msg.data or
-                    'nominal_time' not in msg.data or
-                    'pge' not in msg.data):
-                LOG.warning("Message is lacking crucial fields...")
-                return False
-
-        if msg.data['platform_name'] not in (GEO_SATS + POLAR_SATELLITES):
-            LOG.info(str(msg.data['platform_name']) + ": " +
-                     "Not a MSG or a NOAA/Metop/S-NPP/Terra/Aqua scene. Continue...")
+                'nominal_time' not in msg.data or
+                'pge' not in msg.data):
+            LOG.warning("Message is lacking crucial fields...")
             return False
 
-        LOG.debug("Ok: message = %s", str(msg))
-        return True
+    if msg.data['platform_name'] not in (GEO_SATS + POLAR_SATELLITES):
+        LOG.info(str(msg.data['platform_name']) + ": " +
+                 "Not a MSG or a NOAA/Metop/S-NPP/Terra/Aqua scene. Continue...")
+        return False
+
+    LOG.debug("Ok: message = %s", str(msg))
+    return True
 
 
 def create_message(resultfile, scene):
@@ -250,8 +284,12 @@ def create_message(resultfile, scene):
     return pub_message
 
 
-def ready2run(msg, files4comp, job_register, sceneid, product='CT'):
-    """Check whether we can start a composite generation on scene"""
+def ready2run(msg, files4comp, job_register, sceneid, product='CT', scene_catalogue=None):
+    """Check whether we can start a composite generation on scene
+
+    The product file of an applicable scene is added to the
+    *scene_catalogue* if given.
+    """
 
     LOG.debug("Ready to run?")
     LOG.info("Got message: " + str(msg))
@@ -318,6 +356,11 @@ def ready2run(msg, files4comp, job_register, sceneid, product='CT'):
                   "Product requested: " + str(product))
         return False
 
+    if scene_catalogue is not None:
+        scene = get_scene_from_message(msg.data, file4mesan, gds_dir=scene_catalogue.gds_dir)
+        if scene is not None:
+            scene_catalogue.add(scene, product)
+
     LOG.debug("Scene identifier = " + str(sceneid))
     LOG.debug("Job register = " + str(job_register))
     if sceneid in job_register and job_register[sceneid]:
@@ -337,9 +380,16 @@ def ready2run(msg, files4comp, job_register, sceneid, product='CT'):
     return True
 
 
-def ctype_composite_worker(scene, job_id, publish_q, config_options):
-    """Spawn/Start a Mesan composite generation on a new thread if available"""
+def ctype_composite_worker(scene, job_id, publish_q, config_options, scene_catalogue=None):
+    """Spawn/Start a Mesan composite generation on a new thread if available
+
+    The input scenes are taken from the *scene_catalogue* if given, rather
+    than searched for on disk. Return the message announcing the composite,
+    which is also put on *publish_q* if given, or None if no composite was
+    made.
+    """
 
+    pubmsg = None
     try:
         LOG.debug("Ctype: Start compositer...")
         # Get the time of analysis from start and end times:
@@ -364,7 +414,7 @@ def ctype_composite_worker(scene, job_id, publish_q, config_options):
             raise IOError("No ipar value in config file!")
 
         ctcomp = mcc.ctCompositer(time_of_analysis, delta_t, mesan_area_id, config_options)
-        ctcomp.get_catalogue()
+        ctcomp.get_catalogue(scene_catalogue=scene_catalogue)
         if not ctcomp.make_composite():
             LOG.error("Failed creating ctype composite...")
         else:
@@ -385,7 +435,8 @@ def ctype_composite_worker(scene, job_id, publish_q, config_options):
 
             pubmsg = create_message(result_file, scene)
             LOG.info("Sending: " + str(pubmsg))
-            publish_q.put(pubmsg)
+            if publish_q is not None:
+                publish_q.put(pubmsg)
 
             if isinstance(job_id, datetime):
                 dt_ = datetime.utcnow() - job_id
@@ -399,11 +450,20 @@ def ctype_composite_worker(scene, job_id, publish_q, config_options):
         LOG.exception('Failed in ctype_composite_worker...')
         raise
 
+    return pubmsg
+
 
-def ctth_composite_worker(scene, job_id, publish_q, config_options):
+def ctth_composite_worker(scene, job_id, publish_q, config_options, scene_catalogue=None):
     """Spawn/Start a Mesan cloud height composite generation on a new thread if
-    available"""
+    available
+
+    The input scenes are taken from the *scene_catalogue* if given, rather
+    than searched for on disk. Return the message announcing the composite,
+    which is also put on *publish_q* if given, or None if no composite was
+    made.
+    """
 
+    pubmsg = None
     try:
         LOG.debug("CTTH compositer: Start...")
         # Get the time of analysis from start and end times:
@@ -427,7 +487,7 @@ def ctth_composite_worker(scene, job_id, publish_q, config_options):
             raise IOError("No ipar value in config file!")
 
         ctth_comp = make_ctth_composite.ctthComposite(time_of_analysis, delta_t, mesan_area_id, config_options)
-        ctth_comp.get_catalogue()
+        ctth_comp.get_catalogue(scene_catalogue=scene_catalogue)
         if not ctth_comp.make_composite():
             LOG.error("Failed creating ctth composite...")
         else:
@@ -446,7 +506,8 @@ def ctth_composite_worker(scene, job_id, publish_q, config_options):
 
             pubmsg = create_message(result_file, scene)
             LOG.info("Sending: " + str(pubmsg))
-            publish_q.put(pubmsg)
+            if publish_q is not None:
+                publish_q.put(pubmsg)
 
             if isinstance(job_id, datetime):
                 dt_ = datetime.utcnow() - job_id
@@ -460,6 +521,134 @@ def ctth_composite_worker(scene, job_id, publish_q, config_options):
         LOG.exception('Failed in ctth_composite_worker...')
         raise
 
+    return pubmsg
+
+
+def watch_network(interval):
+    """Check the local network addresses for changes every *interval* seconds, in a timer thread.
+
+    The cached host addresses are forgotten when the local addresses change,
+    see refresh_local_ips.
+    """
+    refresh_local_ips()
+    timer = threading.Timer(interval, watch_network, args=(interval, ))
+    timer.daemon = True
+    timer.start()
+
+
+async def async_watch_network(interval):
+    """Check the local network addresses for changes every *interval* seconds, on the event loop."""
+    while True:
+        await asyncio.sleep(interval)
+        refresh_local_ips()
+
+
+def fill_scene_catalogue(scene_catalogue, config_options):
+    """Add the CT and CTTH scenes on disk to the *scene_catalogue*.
+
+    The PPS direct readout and Metop GDS, and the NWCSAF/Geo, input
+    directories are searched for the scenes of the last
+    SCENE_CATALOGUE_RETENTION, so that the catalogue covers the time windows
+    of the composites also right after the runner is (re)started.
+    """
+    oldest = datetime.utcnow() - SCENE_CATALOGUE_RETENTION
+    for product in ['CT', 'CTTH']:
+        for pps_dir in [config_options.get('pps_direct_readout_dir'), config_options.get('pps_metop_gds_dir')]:
+            if pps_dir:
+                scene_catalogue.scan(pps_dir, 'S_NWC_' + product + '_*.nc', 'pps', product, oldest)
+
+    msg_dir = config_options.get('msg_dir')
+    if msg_dir:
+        scene_catalogue.scan(msg_dir % {"number": "02"}, '*_CT___*.PLAX.CTTH.0.h5', 'msg', 'CT', oldest)
+        scene_catalogue.scan(msg_dir % {"number": "03"},
+                             '*_CTTH*' + str(config_options.get('msg_ctth_file_ext', '')), 'msg', 'CTTH', oldest)
+    LOG.info("%d scenes found on disk for the scene catalogue", len(scene_catalogue))
+
+
+def get_composite_job(msg, composite_files, jobs_dict, mesan_area_id, scene_catalogue=None):
+    """Get the composite job asked for by the message *msg*.
+
+    Return the key of the scene in the *jobs_dict* job registry and the job,
+    a tuple with the job key, the worker function and the scene. Both are
+    None if the scene is not to be processed, and the job is None if the
+    product is not supported.
+    """
+    if 'start_time' in msg.data:
+        start_time = msg.data['start_time']
+    elif 'nominal_time' in msg.data:
+        start_time = msg.data['nominal_time']
+    else:
+        LOG.warning("Neither start_time nor nominal_time in message!")
+        start_time = None
+
+    if 'end_time' in msg.data:
+        end_time = msg.data['end_time']
+    else:
+        LOG.warning("No end_time in message!")
+        end_time = None
+
+    sensor = str(msg.data['sensor'])
+    platform_name = msg.data['platform_name']
+    if platform_name not in GEO_SATS:
+        orbit_number = int(msg.data['orbit_number'])
+        LOG.info("Polar satellite: " + str(platform_name))
+    else:
+        orbit_number = '00000'
+        LOG.info("Geostationary satellite: " + str(platform_name))
+
+    keyname = (str(platform_name) + '_' +
+               str(orbit_number) + '_' +
+               str(start_time.strftime('%Y%m%d%H%M')))
+
+    product = 'UNKNOWN'
+    if 'pge' in msg.data:
+        product = msg.data['pge']
+    elif 'uid' in msg.data:
+        uid = msg.data['uid']
+        for pge in PRODUCT_NAMES:
+            match = '_' + pge + '_'
+            if match in uid:
+                product = pge
+                break
+
+    keyname = str(product) + '_' + keyname
+    status = ready2run(msg, composite_files,
+                       jobs_dict, keyname, product, scene_catalogue)
+    if scene_catalogue is not None:
+        scene_catalogue.prune(datetime.utcnow() - SCENE_CATALOGUE_RETENTION)
+
+    if not status:
+        return None, None
+
+    # Start composite generation:
+
+    urlobj = urlparse(msg.data['uri'])
+    path, fname = os.path.split(urlobj.path)
+    LOG.debug("path " + str(path) + " filename = " + str(fname))
+
+    scene = {'platform_name': platform_name,
+             'orbit_number': orbit_number,
+             'starttime': start_time, 'endtime': end_time,
+             'sensor': sensor,
+             'filename': urlobj.path,
+             'product': product}
+
+    if keyname not in jobs_dict:
+        LOG.warning("Scene-run seems unregistered! Forget it...")
+        return None, None
+
+    # Scenes of the same composite arriving close in time make one job:
+    job_key = get_job_key(product, get_analysis_time(start_time, end_time), mesan_area_id)
+    if product == 'CT':
+        LOG.debug("Product is CT")
+        return keyname, (job_key, ctype_composite_worker, scene)
+    elif product == 'CTTH':
+        LOG.debug("Product is CTTH")
+        return keyname, (job_key, ctth_composite_worker, scene)
+
+    LOG.warning("Product %s not supported!", str(product))
+    return keyname, None
+
 
 def mesan_live_runner(config_options):
     """Listens and triggers processing"""
@@ -469,18 +658,37 @@ def mesan_live_runner(config_options):
     npix = int(config_options.get('number_of_pixels', DEFAULT_SUPEROBS_WINDOW_SIZE_NPIX))
     LOG.debug("Number of pixels = " + str(npix))
 
-    pool = Pool(processes=6, maxtasksperchild=1)
+    pool = get_worker_pool(config_options)
     manager = Manager()
-    listener_q = manager.Queue()
-    publisher_q = manager.Queue()
+    # The listener waits when the queue is full:
+    queue_size = int(config_options.get('runner_queue_size', DEFAULT_QUEUE_SIZE))
+    listener_q = manager.Queue(queue_size)
+    publisher_q = manager.Queue(queue_size)
+
+    settle_delay = float(config_options.get('job_settle_seconds', DEFAULT_JOB_SETTLE_SECONDS))
+    LOG.debug("Jobs are started %.1f seconds after their last scene", settle_delay)
+    horizon = float(config_options.get('job_horizon_hours', DEFAULT_JOB_HORIZON_HOURS))
+    scheduler = JobScheduler(pool, settle_delay,
+                             max_running=int(config_options.get('runner_workers', DEFAULT_WORKERS)),
+                             horizon=timedelta(hours=horizon) if horizon else None)
+    scheduler.start()
+    mesan_area_id = config_options.get('mesan_area_id', DEFAULT_AREA)
 
     pub_thread = FilePublisher(publisher_q)
     pub_thread.start()
     listen_thread = FileListener(listener_q)
     listen_thread.start()
+    network_check = float(config_options.get('network_check_seconds', DEFAULT_NETWORK_CHECK_SECONDS))
+    if network_check:
+        watch_network(network_check)
 
     composite_files = {}
     jobs_dict = {}
+    scene_catalogue = None
+    if config_options.get('runner_scene_catalogue', False):
+        LOG.info("Keep a catalogue of the scenes from the incoming messages")
+        scene_catalogue = SceneCatalogue(config_options.get('pps_metop_gds_dir'))
+        fill_scene_catalogue(scene_catalogue, config_options)
     while True:
 
         try:
@@ -491,94 +699,24 @@ def mesan_live_runner(config_options):
 
         LOG.debug(
             "Number of threads currently alive: " + str(threading.active_count()))
+        LOG.debug("Queue depth: %d messages, %d jobs waiting, %d jobs running",
+                  listener_q.qsize(), *scheduler.get_queue_depth())
 
-        if 'start_time' in msg.data:
-            start_time = msg.data['start_time']
-        elif 'nominal_time' in msg.data:
-            start_time = msg.data['nominal_time']
-        else:
-            LOG.warning("Neither start_time nor nominal_time in message!")
-            start_time = None
-
-        if 'end_time' in msg.data:
-            end_time = msg.data['end_time']
-        else:
-            LOG.warning("No end_time in message!")
-            end_time = None
-
-        sensor = str(msg.data['sensor'])
-        platform_name = msg.data['platform_name']
-        if platform_name not in GEO_SATS:
-            orbit_number = int(msg.data['orbit_number'])
-            LOG.info("Polar satellite: " + str(platform_name))
-        else:
-            orbit_number = '00000'
-            LOG.info("Geostationary satellite: " + str(platform_name))
-
-        keyname = (str(platform_name) + '_' +
-                   str(orbit_number) + '_' +
-                   str(start_time.strftime('%Y%m%d%H%M')))
-
-        product = 'UNKNOWN'
-        if 'pge' in msg.data:
-            product = msg.data['pge']
-        elif 'uid' in msg.data:
-            uid = msg.data['uid']
-            for pge in PRODUCT_NAMES:
-                match = '_' + pge + '_'
-                if match in uid:
-                    product = pge
-                    break
-
-        keyname = str(product) + '_' + keyname
-        status = ready2run(msg, composite_files,
-                           jobs_dict, keyname, product)
-
-        if status:
-            # Start composite generation:
-
-            urlobj = urlparse(msg.data['uri'])
-            path, fname = os.path.split(urlobj.path)
-            LOG.debug("path " + str(path) + " filename = " + str(fname))
-
-            scene = {'platform_name': platform_name,
-                     'orbit_number': orbit_number,
-                     'starttime': start_time, 'endtime': end_time,
-                     'sensor': sensor,
-                     'filename': urlobj.path,
-                     'product': product}
-
-            if keyname not in jobs_dict:
-                LOG.warning("Scene-run seems unregistered! Forget it...")
-                continue
-
-            if product == 'CT':
-                LOG.debug("Product is CT")
-                pool.apply_async(ctype_composite_worker,
-                                 (scene,
-                                  jobs_dict[
-                                      keyname],
-                                  publisher_q,
-                                  config_options))
-
-            elif product == 'CTTH':
-                LOG.debug("Product is CTTH")
-                pool.apply_async(ctth_composite_worker,
-                                 (scene,
-                                  jobs_dict[
-                                      keyname],
-                                  publisher_q,
-                                  config_options))
-
-            else:
-                LOG.warning("Product %s not supported!", str(product))
+        keyname, job = get_composite_job(msg, composite_files, jobs_dict,
+                                         mesan_area_id, scene_catalogue)
+        if job is not None:
+            job_key, worker, scene = job
+            scheduler.schedule(job_key, worker,
+                               (scene, jobs_dict[keyname], publisher_q, config_options, scene_catalogue))
 
+        if keyname is not None:
             # Block any future run on this scene for x minutes from now
             # x = 5
             thread_job_registry = threading.Timer(
                 5 * 60.0, reset_job_registry, args=(jobs_dict, keyname))
             thread_job_registry.start()
 
+    scheduler.stop()
     pool.close()
     pool.join()
 
@@ -586,6 +724,85 @@ def mesan_live_runner(config_options):
     listen_thread.stop()
 
 
+async def async_live_runner(config_options):
+    """Listens and triggers processing, driven by an asyncio event loop.
+
+    The messages are received, checked and turned into jobs, and the results
+    published, on the event loop, and the composites are made in a process
+    pool executor. Posttroll only has a blocking subscriber, so the messages
+    are received in a thread of their own.
+    """
+
+    LOG.info("*** Start the asyncio runner for the Mesan composite generator:")
+    loop = asyncio.get_running_loop()
+    workers = int(config_options.get('runner_workers', DEFAULT_WORKERS))
+    pool = ExecutorPool(loop, workers, config_options,
+                        max_jobs=int(config_options.get('worker_max_jobs', 0)),
+                        max_memory=float(config_options.get('worker_max_memory_mb', 0)))
+    recv_executor = ThreadPoolExecutor(max_workers=1)
+
+    settle_delay = float(config_options.get('job_settle_seconds', DEFAULT_JOB_SETTLE_SECONDS))
+    LOG.debug("Jobs are started %.1f seconds after their last scene", settle_delay)
+    horizon = float(config_options.get('job_horizon_hours', DEFAULT_JOB_HORIZON_HOURS))
+    mesan_area_id = config_options.get('mesan_area_id', DEFAULT_AREA)
+
+    composite_files = {}
+    jobs_dict = {}
+    scene_catalogue = None
+    if config_options.get('runner_scene_catalogue', False):
+        LOG.info("Keep a catalogue of the scenes from the incoming messages")
+        scene_catalogue = SceneCatalogue(config_options.get('pps_metop_gds_dir'))
+        fill_scene_catalogue(scene_catalogue, config_options)
+
+    with Publish('mesan_composite_runner', 0, ['netCDF/3', ]) as publisher, \
+            posttroll.subscriber.Subscribe('', SUBSCRIBE_TOPICS, True) as subscr:
+
+        def publish(pubmsg):
+            LOG.info("Publish the files...")
+            publisher.send(pubmsg)
+
+        scheduler = AsyncJobScheduler(loop, pool, settle_delay, max_running=workers,
+                                      horizon=timedelta(hours=horizon) if horizon else None,
+                                      result_callback=publish)
+        network_check = float(config_options.get('network_check_seconds', DEFAULT_NETWORK_CHECK_SECONDS))
+        network_watcher = None
+        if network_check:
+            network_watcher = asyncio.ensure_future(async_watch_network(network_check))
+        messages = subscr.recv(timeout=90)
+        try:
+            while True:
+                msg = await loop.run_in_executor(recv_executor, next, messages, None)
+                if not msg:
+                    continue
+
+                # Only host names not in the cache are looked up, off the event loop:
+                netloc = urlparse(msg.data['uri']).netloc
+                url_ip = get_host_ip(netloc, cached_only=True)
+                if url_ip is None:
+                    url_ip = await loop.run_in_executor(None, get_host_ip, netloc)
+                if not check_message(msg, url_ip):
+                    continue
+
+                LOG.debug("Queue depth: %d jobs waiting, %d jobs running",
+                          *scheduler.get_queue_depth())
+                keyname, job = get_composite_job(msg, composite_files, jobs_dict,
+                                                 mesan_area_id, scene_catalogue)
+                if job is not None:
+                    job_key, worker, scene = job
+                    scheduler.schedule(job_key, worker,
+                                       (scene, jobs_dict[keyname], None, config_options, scene_catalogue))
+
+                if keyname is not None:
+                    # Block any future run on this scene for 5 minutes from now
+                    loop.call_later(5 * 60.0, reset_job_registry, jobs_dict, keyname)
+        finally:
+            if network_watcher is not None:
+                network_watcher.cancel()
+            scheduler.stop()
+            pool.shutdown(wait=False)
+            recv_executor.shutdown(wait=False)
+
+
 if __name__ == "__main__":
 
     (logfile, config_filename) = get_arguments()
@@ -619,4 +836,7 @@ if __name__ == "__main__":
     servername = socket.gethostname()
     SERVERNAME = OPTIONS.get('servername', servername)
 
-    mesan_live_runner(OPTIONS)
+    if OPTIONS.get('runner_core', 'threads') == 'asyncio':
+        asyncio.run(async_live_runner(OPTIONS))
+    else:
+        mesan_live_runner(OPTIONS)
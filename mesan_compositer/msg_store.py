@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2026 Adam.Dybbroe
+
+# Author(s):
+
+#   Adam.Dybbroe <adam.dybbroe@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Load and reproject the MSG cloud type and CTTH of a slot once.
+
+The cloud type and the CTTH composites both need the NWCSAF/Geo products of
+the same MSG slots on the same area. The datasets of both products are
+loaded from one Scene, reprojected in one go, and kept in a store directory
+from where both composites (in any process) read them. Whenever a slot is
+stored, the slots more than MSG_STORE_RETENTION older than it are removed.
+"""
+
+import os
+import tempfile
+import logging
+from datetime import datetime, timedelta
+
+import dask
+import dask.array as da
+import numpy as np
+import xarray as xr
+
+from mesan_compositer.composite_tools import resample_scene
+
+LOG = logging.getLogger(__name__)
+
+#: The MSG datasets used by the composites, per product file name tag
+MSG_DATASETS = {'CT___': ['ct', 'ct_quality'],
+                'CTTH_': ['ctth_alti', 'ctth_pres', 'ctth_tempe', 'ctth_quality',
+                          'ctth_effective_cloudiness']}
+
+#: How long the slots are kept in the store, counted back from the latest slot stored
+MSG_STORE_RETENTION = timedelta(hours=6)
+
+
+def get_msg_slot_files(filename):
+    """Get the cloud type and CTTH files of the MSG slot of *filename*.
+
+    Example: SAFNWC_MSG4_CT___201911051900_MSG-N.PLAX.CTTH.0.h5 and
+    SAFNWC_MSG4_CTTH_201911051900_MSG-N.PLAX.CTTH.0.h5. Return a dict with
+    the files found, keyed on the product file name tag.
+    """
+    dirname, bname = os.path.split(filename)
+    files = {}
+    for tag in MSG_DATASETS:
+        if '_' + tag in bname:
+            break
+    else:
+        return files
+
+    for product in MSG_DATASETS:
+        slot_file = os.path.join(dirname, bname.replace('_' + tag, '_' + product, 1))
+        if os.path.exists(slot_file):
+            files[product] = slot_file
+
+    return files
+
+
+def get_msg_store_filename(msg, areaid, store_dir):
+    """Get the name of the file in *store_dir* holding the MSG slot *msg* on *areaid*."""
+    bname = '%s_%s_%s_%s.npz' % (msg.platform_name, msg.timeslot.strftime('%Y%m%d%H%M'),
+                                 msg.areaid, areaid)
+    return os.path.join(store_dir, bname)
+
+
+def load_msg_slot(msg, areaid, datasets, store_dir, cache_dir=None):
+    """Load the reprojected MSG *datasets* of the slot *msg* via the store.
+
+    If the slot is not in *store_dir* yet, all datasets of both products
+    found for the slot are loaded from one Scene, reprojected to *areaid*
+    and computed in one go, and then stored. The MSG resampling info is
+    cached in *cache_dir* if given. Return a dict of DataArrays with the area
+    definition in the attributes. The datasets are read whole, in one chunk,
+    also for tiled composites.
+    """
+    filename = get_msg_store_filename(msg, areaid, store_dir)
+    try:
+        with np.load(filename) as npz:
+            stored = dict(npz)
+    except IOError:
+        stored = {}
+
+    if not all(name in stored for name in datasets):
+        stored = _store_msg_slot(msg, areaid, filename, cache_dir)
+    else:
+        LOG.debug("MSG slot read from store: %s", filename)
+
+    from pyresample.area_config import load_area_from_string
+    area = load_area_from_string(str(stored['area']))
+
+    return dict((name, xr.DataArray(da.from_array(stored[name], chunks=stored[name].shape),
+                                    dims=('y', 'x'), attrs={'area': area, 'name': name}))
+                for name in datasets)
+
+
+def _store_msg_slot(msg, areaid, filename, cache_dir):
+    """Load, reproject and store all datasets of both products of an MSG slot."""
+    from satpy.scene import Scene
+
+    files = get_msg_slot_files(msg.uri)
+    if not files:
+        files = {'': msg.uri}
+    names = []
+    for product in sorted(files):
+        names += MSG_DATASETS.get(product, sum(MSG_DATASETS.values(), []))
+    LOG.info("Load MSG slot %s", str(sorted(files.values())))
+
+    scene = Scene(filenames=sorted(files.values()), reader='nwcsaf-msg2013-hdf5')
+    scene.load(names)
+    local = resample_scene(scene, areaid, 20000, cache_dir=cache_dir)
+
+    names = [name for name in names if name in local]
+    stored = dict(zip(names, dask.compute(*[local[name].data for name in names])))
+    stored['area'] = np.array(local[names[0]].attrs['area'].dump())
+
+    store_dir = os.path.dirname(filename)
+    if not os.path.isdir(store_dir):
+        os.makedirs(store_dir, exist_ok=True)
+    fd_, tmpfname = tempfile.mkstemp(suffix='.npz', dir=store_dir)
+    with os.fdopen(fd_, 'wb') as fpt:
+        np.savez(fpt, **stored)
+    os.rename(tmpfname, filename)
+    LOG.debug("MSG slot stored in %s", filename)
+    prune_msg_store(store_dir, msg.timeslot - MSG_STORE_RETENTION)
+
+    return stored
+
+
+def prune_msg_store(store_dir, oldest):
+    """Remove the slots older than *oldest* from *store_dir*."""
+    for bname in os.listdir(store_dir):
+        try:
+            timeslot = datetime.strptime(bname.split('_')[1], '%Y%m%d%H%M')
+        except (IndexError, ValueError):
+            continue
+        if bname.endswith('.npz') and timeslot < oldest:
+            LOG.debug("Remove old MSG slot %s", bname)
+            try:
+                os.remove(os.path.join(store_dir, bname))
+            except OSError as err:
+                LOG.warning("Failed removing %s: %s", bname, str(err))
@@ -24,6 +24,8 @@
 """
 
 import logging
+import dask
+import dask.array as da
 import numpy as np
 from mesan_compositer.utils import proj2cf
 import xarray as xr
@@ -34,6 +36,8 @@ LOG = logging.getLogger(__name__)
 TIME_UNITS = "seconds since 1970-01-01 00:00:00"
 CF_FLOAT_TYPE = np.float64
 CF_DATA_TYPE = np.int16
+# Compression level of the composite variables
+NC_COMPLEVEL = 4
 # To be complete, get from appendix F of cf conventions
 MAPPING_ATTRIBUTES = {'grid_mapping_name': "proj",
                       'standard_parallel': ["lat_1", "lat_2"],
@@ -75,9 +79,13 @@ class InfoObject(object):
 
 class ncCloudTypeComposite(object):
 
-    """netcdf cloud type composite object"""
+    """netcdf cloud type composite object
 
-    def __init__(self):
+    With *compact* the time and id fields are written in a compact encoding
+    (see get_compact_encoding), decoded again on load.
+    """
+
+    def __init__(self, compact=False):
 
         self.info = {}
         #self.info["Conventions"] = "CF-1.6"
@@ -89,6 +97,7 @@ class ncCloudTypeComposite(object):
         self.id = InfoObject()
         self.area = InfoObject()
         self.area_def = None
+        self.compact = compact
 
     def store(self, comp_dict, area_obj, product_id='MSG/PPS Cloud Type composite'):
         """Store the composite into the object"""
@@ -101,13 +110,13 @@ class ncCloudTypeComposite(object):
         dim_names = ['y' + str_res, 'x' + str_res]
 
         self.time.data = comp_dict["time"]
-        valid_min, valid_max = (self.time.data.min(), self.time.data.max())
+        valid_range = get_valid_range(self.time.data)
         self.time.info = {"var_name": "time",
                           "var_data": self.time.data,
                           "var_dim_names": dim_names,
                           "long_name": "observation time of best cloud type",
                           "standard_name": "time",
-                          "valid_range": np.array([valid_min, valid_max]),
+                          "valid_range": valid_range,
                           "units": TIME_UNITS}
 
         self.cloudtype.data = comp_dict["cloudtype"]
@@ -122,23 +131,23 @@ class ncCloudTypeComposite(object):
 
         # Weight:
         self.weight.data = comp_dict["weight"]
-        valid_min, valid_max = (self.weight.data.min(), self.weight.data.max())
+        valid_range = get_valid_range(self.weight.data)
         self.weight.info = {"var_name": "weight",
                             "var_data": self.weight.data,
                             'var_dim_names': dim_names,
                             "standard_name": "Cloud Type weight",
-                            "valid_range": np.array([valid_min, valid_max]),
+                            "valid_range": valid_range,
                             "resolution": 1000}
         self.weight.info["description"] = "Weight of the best Cloud Type"
 
         # Id:
         self.id.data = comp_dict["id"]
-        valid_min, valid_max = (self.id.data.min(), self.id.data.max())
+        valid_range = get_valid_range(self.id.data)
         self.id.info = {"var_name": "id",
                         "var_data": self.id.data,
                         'var_dim_names': dim_names,
                         "standard_name": "Cloud Type id",
-                        "valid_range": np.array([valid_min, valid_max]),
+                        "valid_range": valid_range,
                         "resolution": 1000}
         self.id.info[
             "description"] = "Id (pps=0 or msg=1) of the best Cloud Type"
@@ -182,11 +191,6 @@ class ncCloudTypeComposite(object):
     def write(self, filename):
         """Write the data to netCDF file"""
 
-        other_to_netcdf_kwargs = {'compute': True}
-        root = xr.Dataset({}, attrs={'history': 'Created by mesan_compositor on {}'.format(datetime.utcnow()),
-                                     'Conventions': 'Undefined'})
-        engine = 'netcdf4'
-
         xcoord, ycoord = self.area_def.get_proj_vectors()
         attrs = get_nc_attributes_from_object(self.cloudtype.info)
 
@@ -204,122 +208,126 @@ class ncCloudTypeComposite(object):
         attrs = get_nc_attributes_from_object(self.area.info)
         area_data = xr.DataArray(data=self.area.data, dims=None, attrs=attrs)
 
-        _ = root.to_netcdf(filename, engine=engine, mode='w')
-
         data_arrays = [ctype, data_id, data_time, weight, area_data]
         data_names = ['cloudtype', 'id', 'time', 'weight', 'area']
 
-        encodings = {'dtype': ctype.dtype, 'scale_factor': 1, 'zlib': True,
-                     'complevel': 4, '_FillValue': 255, 'add_offset': 0}
-        encodings2 = {'complevel': 4, 'zlib': True}
+        encodings = {'dtype': ctype.dtype, 'scale_factor': 1, '_FillValue': 255, 'add_offset': 0}
 
         dataset_dict = {}
         encoding = {}
         for dataset_name, data_array in zip(data_names, data_arrays):
             dataset_dict[dataset_name] = data_array
             if dataset_name in ['cloudtype', 'id']:
-                encoding[dataset_name] = encodings
-            elif dataset_name not in ['area']:
-                encoding[dataset_name] = encodings2
+                encoding[dataset_name] = dict(encodings)
+        if self.compact:
+            encode_compact(dataset_dict, encoding)
 
-        dataset = xr.Dataset(dataset_dict, coords={'y1000 m': ycoord, 'x1000 m': xcoord})
-        _ = dataset.to_netcdf(filename, engine=engine, group=None, mode='a',
-                              encoding=encoding, **other_to_netcdf_kwargs)
+        write_dataset(filename, dataset_dict, {'y1000 m': ycoord, 'x1000 m': xcoord}, encoding)
 
         return
 
-    def load(self, filename):
-        """Read the cloudtype composite from file"""
+    def load(self, filename, var_names=None):
+        """Read the cloudtype composite from file
 
-        import numpy as np
-        from netCDF4 import Dataset
-
-        rootgrp = Dataset(filename, 'r')
-
-        self.info["Conventions"] = rootgrp.Conventions
-        # self.info["product"] = rootgrp.product
-        self.info["product"] = 'Unknown'
+        Only the variables in *var_names* are read, all of them if not
+        given. The area definition is built once, from the grid mapping of
+        the first variable read that has one.
+        """
 
-        for var_name in rootgrp.variables.keys():
-            LOG.debug(str(var_name))
-            var = rootgrp.variables[str(var_name)]
-            dims = var.dimensions
-
-            cnt = 0
-            for cnt, dim in enumerate(dims):
-                if dim.startswith("x") or dim.startswith("y"):
-                    break
+        from netCDF4 import Dataset
 
-            if hasattr(self, str(var_name)):
-                LOG.debug("set data...")
-                item = getattr(self, str(var_name))
-                setattr(item, 'data', var[:])
+        with Dataset(filename, 'r') as rootgrp:
+            self.info["Conventions"] = rootgrp.Conventions
+            # self.info["product"] = rootgrp.product
+            self.info["product"] = 'Unknown'
 
-                info = {}
-                for attr in var.ncattrs():
-                    info[str(attr)] = getattr(var, str(attr))
+            area = None
+            for var_name in rootgrp.variables.keys():
+                if var_names is not None and var_name not in var_names:
+                    continue
+                LOG.debug(str(var_name))
+                var = rootgrp.variables[str(var_name)]
+
+                if hasattr(self, str(var_name)):
+                    LOG.debug("set data...")
+                    item = getattr(self, str(var_name))
+                    setattr(item, 'data', var[:])
+
+                    info = {}
+                    for attr in var.ncattrs():
+                        info[str(attr)] = getattr(var, str(attr))
                     setattr(item, 'info', info)
+                    if 'valid_range' in info and 'scale_factor' in info:
+                        # Packed (compact) variable, the data are unpacked by netCDF4:
+                        info['valid_range'] = (info['valid_range'] * info['scale_factor'] +
+                                               info.get('add_offset', 0))
+
+                if area is None and hasattr(var, "grid_mapping"):
+                    area = get_area_def(rootgrp, var)
+                    if area is not None:
+                        self.area_def = area
+                    LOG.info("Grid mapping found and used")
+
+            if area is None:
+                LOG.info("No grid mapping found")
 
-            area = None
-            try:
-                area_var_name = getattr(var, "grid_mapping")
-                area_var = rootgrp.variables[area_var_name]
-                proj4_dict = {}
-                for attr, projattr in MAPPING_ATTRIBUTES.items():
-                    try:
-                        the_attr = getattr(area_var, attr)
-                        if projattr == "proj":
-                            proj4_dict[projattr] = PROJNAME[the_attr]
-                        elif(isinstance(projattr, (list, tuple))):
-                            try:
-                                for i, subattr in enumerate(the_attr):
-                                    proj4_dict[projattr[i]] = subattr
-                            except TypeError:
-                                proj4_dict[projattr[0]] = the_attr
-                        else:
-                            proj4_dict[projattr] = the_attr
-                    except AttributeError:
-                        pass
-                y_name, x_name = dims[:cnt] + dims[cnt:]
-                x__ = rootgrp.variables[x_name][:]
-                y__ = rootgrp.variables[y_name][:]
-
-                if proj4_dict["proj"] == "ob_tran":
-                    proj4_dict["o_proj"] = 'eqc'  # FIXME!
-                elif proj4_dict["proj"] == "geos":
-                    x__ *= proj4_dict["h"]
-                    y__ *= proj4_dict["h"]
-
-                x_pixel_size = abs((np.diff(x__)).mean())
-                y_pixel_size = abs((np.diff(y__)).mean())
-
-                llx = x__[0] - x_pixel_size / 2.0
-                lly = y__[-1] - y_pixel_size / 2.0
-                urx = x__[-1] + x_pixel_size / 2.0
-                ury = y__[0] + y_pixel_size / 2.0
-
-                area_extent = (llx, lly, urx, ury)
+
+def get_area_def(rootgrp, var):
+    """Get the area definition of the variable *var* from its grid mapping."""
+    dims = var.dimensions
+    area_var = rootgrp.variables[var.grid_mapping]
+    proj4_dict = {}
+    for attr, projattr in MAPPING_ATTRIBUTES.items():
+        try:
+            the_attr = getattr(area_var, attr)
+            if projattr == "proj":
+                proj4_dict[projattr] = PROJNAME[the_attr]
+            elif(isinstance(projattr, (list, tuple))):
                 try:
-                    # create the pyresample areadef
-                    from pyresample.geometry import AreaDefinition
-                    area = AreaDefinition("myareaid", "myareaname",
-                                          "myprojid", proj4_dict,
-                                          len(x__), len(y__),
-                                          area_extent)
-                    self.area_def = area
-                except ImportError:
-                    LOG.error("Pyresample not found, "
-                              "cannot load area descrition")
-                LOG.info("Grid mapping found and used")
-            except AttributeError:
-                LOG.info("No grid mapping found")
+                    for i, subattr in enumerate(the_attr):
+                        proj4_dict[projattr[i]] = subattr
+                except TypeError:
+                    proj4_dict[projattr[0]] = the_attr
+            else:
+                proj4_dict[projattr] = the_attr
+        except AttributeError:
+            pass
+    y_name, x_name = dims
+    x__ = rootgrp.variables[x_name][:]
+    y__ = rootgrp.variables[y_name][:]
+
+    if proj4_dict["proj"] == "ob_tran":
+        proj4_dict["o_proj"] = 'eqc'  # FIXME!
+    elif proj4_dict["proj"] == "geos":
+        x__ *= proj4_dict["h"]
+        y__ *= proj4_dict["h"]
+
+    x_pixel_size = abs((np.diff(x__)).mean())
+    y_pixel_size = abs((np.diff(y__)).mean())
+
+    llx = x__[0] - x_pixel_size / 2.0
+    lly = y__[-1] - y_pixel_size / 2.0
+    urx = x__[-1] + x_pixel_size / 2.0
+    ury = y__[0] + y_pixel_size / 2.0
+
+    area_extent = (llx, lly, urx, ury)
+    try:
+        # create the pyresample areadef
+        from pyresample.geometry import AreaDefinition
+        return AreaDefinition("myareaid", "myareaname",
+                              "myprojid", proj4_dict,
+                              len(x__), len(y__),
+                              area_extent)
+    except ImportError:
+        LOG.error("Pyresample not found, "
+                  "cannot load area descrition")
 
 
 class ncCTTHComposite(ncCloudTypeComposite):
 
     """netcdf ctth composite object"""
 
-    def __init__(self):
+    def __init__(self, compact=False):
         self.info = {}
         #self.info["Conventions"] = "CF-1.6"
         self.info["Conventions"] = "Undefined"
@@ -333,6 +341,7 @@ class ncCTTHComposite(ncCloudTypeComposite):
         self.id = InfoObject()
         self.area = InfoObject()
         self.area_def = None
+        self.compact = compact
 
     def store(self, comp_dict, area_obj, product_id='MSG/PPS CTTH composite'):
         """Store the composite into the object"""
@@ -345,19 +354,18 @@ class ncCTTHComposite(ncCloudTypeComposite):
         dim_names = ['y' + str_res, 'x' + str_res]
 
         self.time.data = comp_dict["time"]
-        valid_min, valid_max = (self.time.data.min(), self.time.data.max())
+        valid_range = get_valid_range(self.time.data)
         self.time.info = {"var_name": "time",
                           "var_data": self.time.data,
                           "var_dim_names": dim_names,
                           "long_name": "observation time of best ctth value",
                           "standard_name": "time",
-                          "valid_range": np.array([valid_min, valid_max]),
+                          "valid_range": valid_range,
                           "units": TIME_UNITS}
 
         # Temperature
         self.temperature.data = comp_dict["temperature"]
-        valid_min, valid_max = (
-            np.nanmin(self.temperature.data), np.nanmax(self.temperature.data))
+        valid_range = get_valid_range(self.temperature.data, ignore_nan=True)
         self.temperature.info = {"var_name": "temperature",
                                  "var_data": self.temperature.data,
                                  'var_dim_names': dim_names,
@@ -365,14 +373,13 @@ class ncCTTHComposite(ncCloudTypeComposite):
                                  "_FillValue": np.nan,
                                  "scale_factor": 1.0,
                                  "add_offset": 0.0,
-                                 "valid_range": np.array([valid_min, valid_max]),
+                                 "valid_range": valid_range,
                                  "resolution": resolution}
         self.temperature.info["description"] = 'NWCSAF CTTH - temperature'
 
         # Height
         self.height.data = comp_dict["height"]
-        valid_min, valid_max = (
-            np.nanmin(self.height.data), np.nanmax(self.height.data))
+        valid_range = get_valid_range(self.height.data, ignore_nan=True)
         self.height.info = {"var_name": "height",
                             "var_data": self.height.data,
                             'var_dim_names': dim_names,
@@ -380,14 +387,13 @@ class ncCTTHComposite(ncCloudTypeComposite):
                             "_FillValue": np.nan,
                             "scale_factor": 1.0,
                             "add_offset": 0.0,
-                            "valid_range": np.array([valid_min, valid_max]),
+                            "valid_range": valid_range,
                             "resolution": resolution}
         self.height.info["description"] = 'NWCSAF CTTH - height'
 
         # Pressure
         self.pressure.data = comp_dict["pressure"]
-        valid_min, valid_max = (
-            np.nanmin(self.pressure.data), np.nanmax(self.pressure.data))
+        valid_range = get_valid_range(self.pressure.data, ignore_nan=True)
         self.pressure.info = {"var_name": "pressure",
                               "var_data": self.pressure.data,
                               'var_dim_names': dim_names,
@@ -395,40 +401,40 @@ class ncCTTHComposite(ncCloudTypeComposite):
                               "_FillValue": np.nan,
                               "scale_factor": 1.0,
                               "add_offset": 0.0,
-                              "valid_range": np.array([valid_min, valid_max]),
+                              "valid_range": valid_range,
                               "resolution": resolution}
         self.pressure.info["description"] = 'NWCSAF CTTH - pressure'
 
         # Weight:
         self.weight.data = comp_dict["weight"]
-        valid_min, valid_max = (self.weight.data.min(), self.weight.data.max())
+        valid_range = get_valid_range(self.weight.data)
         self.weight.info = {"var_name": "weight",
                             "var_data": self.weight.data,
                             'var_dim_names': dim_names,
                             "standard_name": "CTTH weight",
-                            "valid_range": np.array([valid_min, valid_max]),
+                            "valid_range": valid_range,
                             "resolution": 1000}
         self.weight.info["description"] = "Weight of the best CTTH"
 
         # Processing flags:
         self.flags.data = comp_dict["flag"]
-        valid_min, valid_max = (self.flags.data.min(), self.flags.data.max())
+        valid_range = get_valid_range(self.flags.data)
         self.flags.info = {"var_name": "flags",
                            "var_data": self.flags.data,
                            'var_dim_names': dim_names,
                            "standard_name": "CTTH processing flags",
-                           "valid_range": np.array([valid_min, valid_max]),
+                           "valid_range": valid_range,
                            "resolution": 1000}
         self.flags.info["description"] = "CTTH processing flags"
 
         # Id:
         self.id.data = comp_dict["id"]
-        valid_min, valid_max = (self.id.data.min(), self.id.data.max())
+        valid_range = get_valid_range(self.id.data)
         self.id.info = {"var_name": "id",
                         "var_data": self.id.data,
                         'var_dim_names': dim_names,
                         "standard_name": "CTTH id",
-                        "valid_range": np.array([valid_min, valid_max]),
+                        "valid_range": valid_range,
                         "resolution": 1000}
         self.id.info[
             "description"] = "Id (pps=0 or msg=1) of the best CTTH estimate"
@@ -482,11 +488,6 @@ class ncCTTHComposite(ncCloudTypeComposite):
     def write(self, filename):
         """Write the data to netCDF file"""
 
-        other_to_netcdf_kwargs = {'compute': True}
-        root = xr.Dataset({}, attrs={'history': 'Created by mesan_compositor on {}'.format(datetime.utcnow()),
-                                     'Conventions': 'Undefined'})
-        engine = 'netcdf4'
-
         xcoord, ycoord = self.area_def.get_proj_vectors()
 
         attrs = get_nc_attributes_from_object(self.height.info)
@@ -515,28 +516,145 @@ class ncCTTHComposite(ncCloudTypeComposite):
         attrs = get_nc_attributes_from_object(self.area.info)
         area_data = xr.DataArray(data=self.area.data, dims=None, attrs=attrs)
 
-        _ = root.to_netcdf(filename, engine=engine, mode='w')
-
         data_arrays = [height, temperature, pressure, weight, flags, identifiers, time_data, area_data]
         data_names = ['height', 'temperature', 'pressure', 'weight', 'flags', 'id', 'time', 'area']
 
-        encodings = {'dtype': height.dtype, 'scale_factor': 1, 'zlib': True,
-                     'complevel': 4, '_FillValue': 255, 'add_offset': 0}
-        encodings2 = {'complevel': 4, 'zlib': True}
-
-        dataset_dict = {}
+        dataset_dict = dict(zip(data_names, data_arrays))
         encoding = {}
-        for dataset_name, data_array in zip(data_names, data_arrays):
-            dataset_dict[dataset_name] = data_array
-            if dataset_name not in ['area']:
-                encoding[dataset_name] = encodings2
+        if self.compact:
+            encode_compact(dataset_dict, encoding)
+        write_dataset(filename, dataset_dict, {'y1000 m': ycoord, 'x1000 m': xcoord}, encoding)
+
+        return
 
-        dataset = xr.Dataset(dataset_dict, coords={'y1000 m': ycoord, 'x1000 m': xcoord})
-        _ = dataset.to_netcdf(filename, engine=engine, group=None, mode='a',
-                              encoding=encoding, **other_to_netcdf_kwargs)
 
+def get_valid_range(data, ignore_nan=False):
+    """Get the valid range of *data*, ignoring NaNs if *ignore_nan*.
+
+    For dask arrays the range is left a dask array as well. When written, it
+    is taken from the data in the file instead, see write_dataset.
+    """
+    if ignore_nan:
+        valid_min, valid_max = np.nanmin(data), np.nanmax(data)
+    else:
+        valid_min, valid_max = data.min(), data.max()
+    if isinstance(data, da.Array):
+        return da.stack([valid_min, valid_max])
+    return np.array([valid_min, valid_max])
+
+
+def get_compact_encoding(name, data):
+    """Get the compact encoding of the composite variable *name*, or None.
+
+    The observation time is stored as an int16 offset from a reference time
+    (the middle of the time span, in whole minutes), in seconds or, if the
+    time span is too long for that, in minutes. The id is stored as uint8.
+    The weight is not packed, so that the super observations derived from it
+    stay the same, and is only compressed as all variables. For dask arrays
+    the reference time takes an extra pass over the time data.
+    """
+    if name == 'time':
+        tmin, tmax = dask.compute(np.nanmin(data), np.nanmax(data))
+        reftime = 60.0 * np.round((tmin + tmax) / 120.0)
+        if max(reftime - tmin, tmax - reftime) <= np.iinfo(np.int16).max:
+            scale_factor = 1.0
+        else:
+            scale_factor = 60.0
+        return {'dtype': np.int16, 'scale_factor': scale_factor,
+                'add_offset': reftime, '_FillValue': np.iinfo(np.int16).min}
+    elif name == 'id':
+        return {'dtype': np.uint8, '_FillValue': np.iinfo(np.uint8).max}
+
+    return None
+
+
+def encode_compact(data_arrays, encoding):
+    """Set the compact encoding of the time and id in *encoding*.
+
+    The valid range attributes of the packed variables are given in packed
+    units, as the CF conventions have it.
+    """
+    for name, data_array in data_arrays.items():
+        var_encoding = get_compact_encoding(name, data_array.data)
+        if var_encoding is None:
+            continue
+        encoding[name] = var_encoding
+        if 'valid_range' in data_array.attrs and 'scale_factor' in var_encoding:
+            valid_range = data_array.attrs['valid_range']
+            if not isinstance(valid_range, da.Array):
+                valid_range = np.asarray(valid_range)
+            valid_range = (valid_range - var_encoding['add_offset']) / var_encoding['scale_factor']
+            data_array.attrs['valid_range'] = np.round(valid_range).astype(var_encoding['dtype'])
+
+
+def write_dataset(filename, data_arrays, coords, encoding=None):
+    """Write the composite *data_arrays* to the netCDF file *filename* in one go.
+
+    The composite fields are always read as a whole, so each image variable
+    is zlib compressed as one single chunk, on top of the variable specific
+    *encoding*. Variables holding dask arrays (tiled composites) are instead
+    chunked as the dask arrays, in row blocks, and computed and written block
+    by block. Their valid range is then taken from the data as written, see
+    set_valid_range, rather than computed in another pass over the composite.
+    """
+    attrs = {'history': 'Created by mesan_compositor on {}'.format(datetime.utcnow()),
+             'Conventions': 'Undefined'}
+
+    encoding = dict(encoding or {})
+    lazy_ranges = []
+    for name, data_array in data_arrays.items():
+        if isinstance(data_array.attrs.get('valid_range'), da.Array):
+            del data_array.attrs['valid_range']
+            lazy_ranges.append(name)
+        if data_array.ndim != 2:
+            continue
+        chunksizes = data_array.shape
+        if data_array.chunks is not None:
+            chunksizes = (data_array.chunks[0][0], data_array.shape[1])
+        var_encoding = encoding.setdefault(name, {})
+        var_encoding.update({'zlib': True, 'complevel': NC_COMPLEVEL,
+                             'chunksizes': chunksizes})
+
+    dataset = xr.Dataset(data_arrays, coords=coords, attrs=attrs)
+    if not lazy_ranges:
+        dataset.to_netcdf(filename, engine='netcdf4', mode='w', encoding=encoding)
         return
 
+    import netCDF4
+
+    # The blocks are written whole and once, so they are not to be cached:
+    chunk_cache = netCDF4.get_chunk_cache()
+    netCDF4.set_chunk_cache(0)
+    try:
+        dataset.to_netcdf(filename, engine='netcdf4', mode='w', encoding=encoding)
+    finally:
+        netCDF4.set_chunk_cache(*chunk_cache)
+    with netCDF4.Dataset(filename, 'a') as rootgrp:
+        for name in lazy_ranges:
+            set_valid_range(rootgrp.variables[name])
+
+
+def set_valid_range(var):
+    """Set the valid range of the netCDF variable *var* from its data.
+
+    The data are read chunk row by chunk row, as stored (packed, if so), and
+    NaNs are ignored.
+    """
+    import warnings
+
+    var.set_auto_maskandscale(False)
+    rows = var.chunking()[0]
+    limits = []
+    with warnings.catch_warnings():
+        # Blocks with NaNs only:
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for row in range(0, var.shape[0], rows):
+            block = var[row:row + rows]
+            limits += [np.nanmin(block), np.nanmax(block)]
+        valid_range = np.array([np.nanmin(limits[::2]), np.nanmax(limits[1::2])], dtype=var.dtype)
+    var.setncattr('valid_range', valid_range)
+    var.set_auto_maskandscale(True)
+
 
 def get_nc_attributes_from_object(info_dict):
     attrs = {}
@@ -205,6 +205,25 @@ def ctth_procflags2pps_old(data):
 
 def ctth_procflags2pps(data):
     """Convert ctth processing flags from MSG to PPS format.
+
+    The converted flags are looked up in a table of all 16 bit flag values,
+    see ctth_procflags2pps_bitwise.
+    """
+    return np.take(CTTH_PROCFLAGS2PPS, np.ma.getdata(data).astype(np.uint16))
+
+
+def ctype_procflags2pps(data):
+    """Converting cloud type processing flags to the PPS format, in order to
+    have consistency between PPS and MSG cloud type contents.
+
+    The converted flags are looked up in a table of all 16 bit flag values,
+    see ctype_procflags2pps_bitwise.
+    """
+    return np.take(CTYPE_PROCFLAGS2PPS, np.ma.getdata(data).astype(np.uint16))
+
+
+def ctth_procflags2pps_bitwise(data):
+    """Convert ctth processing flags from MSG to PPS format, bit by bit.
     """
 
     ones = np.ones(data.shape, "int32")
@@ -355,9 +374,8 @@ def ctth_procflags2pps(data):
     return retv.astype('int32')
 
 
-def ctype_procflags2pps(data):
-    """Converting cloud type processing flags to the PPS format, in order to
-    have consistency between PPS and MSG cloud type contents.
+def ctype_procflags2pps_bitwise(data):
+    """Converting cloud type processing flags to the PPS format, bit by bit.
     """
 
     ones = np.ones(data.shape, "h")
@@ -438,3 +456,8 @@ def ctype_procflags2pps(data):
     del is_bit9_set
 
     return retv.astype('h')
+
+
+# The MSG to PPS flag conversions for all possible 16 bit flag values:
+CTTH_PROCFLAGS2PPS = ctth_procflags2pps_bitwise(np.arange(65536))
+CTYPE_PROCFLAGS2PPS = ctype_procflags2pps_bitwise(np.arange(65536))
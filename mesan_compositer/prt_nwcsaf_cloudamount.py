@@ -28,6 +28,9 @@ amount/cover and print to stdout.
 
 import numpy as np
 from mesan_compositer.netcdf_io import ncCloudTypeComposite
+from mesan_compositer.composite_tools import (get_superobs_blocks,
+                                              get_superobs_geometry,
+                                              get_superobs_midpoints)
 from mesan_compositer import get_config
 
 import argparse
@@ -213,17 +216,89 @@ def get_arguments():
     return args.logging_conf_file, args.config_file, obs_time, area_id, wsize, ipar
 
 
-def derive_sobs(ct_comp, ipar, npix, resultfile):
-    """Derive the super observations and print data to file."""
+def get_superobs_statistics(ctype, weight, ipar, dlen, dx, dy):
+    """Get the statistics for all super observation cells in one go.
+
+    The cells are reduced block wise, from a strided view of the grid, rather
+    than one by one. Return the number of valid pixels, the total weight of
+    the valid pixels and the weighted cloud fraction for each cell. Same
+    results, down to the last bit, as get_superobs_statistics_cellwise.
+    """
+    so_ctype = get_superobs_blocks(ctype, dlen, dx, dy)
+    so_w = get_superobs_blocks(np.ma.filled(weight, 0), dlen, dx, dy)
+    grid_shape = so_ctype.shape[:2]
+
+    # One contiguous row of pixels per cell:
+    ncells = grid_shape[0] * grid_shape[1]
+    so_ctype = so_ctype.reshape(ncells, -1)
+    so_w = so_w.reshape(ncells, -1)
+
+    # pass all but: 00 Unprocessed and 20 Unclassified
+    so_ok = (so_ctype > 0) & (so_ctype < 20)
+    so_nfound = so_ok.sum(axis=1)
+
+    # Pack the valid pixels first in each cell, keeping their order, and sum
+    # all cells with the same number of valid pixels together. This way the
+    # summation order, and thus the rounding, is the same as when summing the
+    # valid pixels of each cell separately:
+    packed_w = np.take_along_axis(so_w, np.argsort(~so_ok, axis=1, kind='stable'), axis=1)
+    so_wtot = np.zeros(ncells, dtype=packed_w.dtype)
+    for nfound in np.unique(so_nfound):
+        cells = so_nfound == nfound
+        so_wtot[cells] = packed_w[cells, :nfound].sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        so_cloud = (nctypecl[ipar][so_ctype] * so_w / so_wtot[:, np.newaxis]).sum(axis=1)
+
+    return (so_nfound.reshape(grid_shape), so_wtot.reshape(grid_shape),
+            so_cloud.reshape(grid_shape))
+
+
+def get_superobs_statistics_cellwise(ctype, weight, ipar, dlen, dx, dy):
+    """Get the statistics for all super observation cells, one cell at a time.
+
+    Return the number of valid pixels, the total weight of the valid pixels
+    and the weighted cloud fraction for each cell.
+    """
+    lx, ly = get_superobs_midpoints(ctype.shape, dlen, dx, dy)
+
+    so_nfound = np.zeros((len(ly), len(lx)), dtype=int)
+    so_wtot = np.zeros((len(ly), len(lx)))
+    so_cloud = np.zeros((len(ly), len(lx)))
+    for iy in range(len(ly)):
+        for ix in range(len(lx)):
+            # super ob domain is: ix-dlen:ix+dlen-1, iy-dlen:iy+dlen-1
+            x = lx[ix]
+            y = ly[iy]
+            so_x = np.arange(x - dlen, x + dlen - 1 + 1)
+            so_y = np.arange(y - dlen, y + dlen - 1 + 1)
+            so_ctype = ctype[np.ix_(so_y, so_x)]
+            so_w = weight[np.ix_(so_y, so_x)]
+            #
+            # pass all but: 00 Unprocessed and 20 Unclassified
+            so_ok = (so_ctype > 0) * (so_ctype < 20)
+            so_wtot[iy, ix] = np.sum(so_w[so_ok])
+            so_nfound[iy, ix] = np.sum(so_ok)
+
+            so_nc = nctypecl[ipar][so_ctype]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                so_cloud[iy, ix] = np.sum(so_nc * so_w / so_wtot[iy, ix])
+
+    return so_nfound, so_wtot, so_cloud
+
+
+def derive_sobs(ct_comp, ipar, npix, resultfile, blockwise=True):
+    """Derive the super observations and print data to file.
+
+    If *blockwise* is False the super observation cells are reduced one by
+    one rather than all at once. The output is the same.
+    """
     import tempfile
     import shutil
 
     tmpfname = tempfile.mktemp(suffix=('_' + os.path.basename(resultfile)),
                                dir=os.path.dirname(resultfile))
 
-    # Get the lon,lat:
-    lon, lat = ct_comp.area_def.get_lonlats()
-
     # Seems the cloudtype data can be three types of arrays at this stage:
     # 1) a dask array (with 255 for no data)
     # 2) a masked data array with fill-value = 255
@@ -255,55 +330,40 @@ def derive_sobs(ct_comp, ipar, npix, resultfile):
     # non overlapping superobservations
     # min 8x8 pixels = ca 8x8 km = 2*dlen x 2*dlen pixels for a
     # superobservation
-    dlen = int(np.ceil(float(npix) / 2.0))
-    dx = int(max(2 * DLENMIN, 2 * dlen))
-    dy = dx
-    fpt = open(tmpfname, 'w')
+    # The super obs "midpoints" and their lon,lat are the same every time:
+    geometry = get_superobs_geometry(ct_comp.area_def, npix, DLENMIN)
+    dlen, dx, dy = geometry['dlen'], geometry['dx'], geometry['dy']
     LOG.info('\tUsing %d x %d pixels in a superobservation', dx, dy)
 
-    # initialize superobs data */
-    ny, nx = ctype.shape
-
-    # indices to super obs "midpoints"
-    lx = np.arange(dlen, nx - dlen + 1, dx)
-    ly = np.arange(ny - dlen, dlen - 1, -dy)
-
-    so_lon = lon[np.ix_(ly, lx)]
-    so_lat = lat[np.ix_(ly, lx)]
+    lx, ly = geometry['lx'], geometry['ly']
+    so_lon = geometry['lon']
+    so_lat = geometry['lat']
 
     LOG.debug("Superobservation grid size: %d,%d", len(ly), len(lx))
     LOG.debug("dlen = %d", dlen)
+    if blockwise:
+        so_nfound, so_wtot, so_cloud = get_superobs_statistics(ctype, weight, ipar, dlen, dx, dy)
+    else:
+        so_nfound, so_wtot, so_cloud = get_superobs_statistics_cellwise(ctype, weight, ipar, dlen, dx, dy)
+
+    # observation quality
+    so_q = so_wtot / (so_nfound + 1e-6)
+    #
+    # check super obs statistics:
+    # enough number of OK pixels and quality
+    so_pass = (so_nfound / npix ** 2 > FPASS) & (so_q >= QPASS)
+
     so_tot = 0
     so_rejected = 0
-    for iy in range(len(ly)):
-        for ix in range(len(lx)):
-            # super ob domain is: ix-dlen:ix+dlen-1, iy-dlen:iy+dlen-1
-            x = lx[ix]
-            y = ly[iy]
-            so_x = np.arange(x - dlen, x + dlen - 1 + 1)
-            so_y = np.arange(y - dlen, y + dlen - 1 + 1)
-            so_ctype = ctype[np.ix_(so_y, so_x)]
-            so_w = weight[np.ix_(so_y, so_x)]
-            #
-            # pass all but: 00 Unprocessed and 20 Unclassified
-            so_ok = (so_ctype > 0) * (so_ctype < 20)
-            so_wtot = np.sum(so_w[so_ok])
-            so_nfound = np.sum(so_ok)
-            #
-            # observation quality
-            so_q = so_wtot / (so_nfound + 1e-6)
-            #
-            # check super obs statistics
-            # pdb.set_trace()
-            #
-            if float(so_nfound) / npix ** 2 > FPASS and so_q >= QPASS:
-                # enough number of OK pixels and quality
-                #      pdb.set_trace()
-                so_nc = nctypecl[ipar][so_ctype]
-                so_cloud = np.sum(so_nc * so_w / so_wtot)
-                #
+    with open(tmpfname, 'w') as fpt:
+        for iy in range(len(ly)):
+            for ix in range(len(lx)):
+                if not so_pass[iy, ix]:
+                    so_rejected = so_rejected + 1
+                    continue
+
                 # print data
-                if ipar == '71' and so_q >= 0.95:
+                if ipar == '71' and so_q[iy, ix] >= 0.95:
                     # 10 => checked uncorrelated observations
                     # 11 => checked correlated observations
                     # use 10 to override data from automatic stations
@@ -314,15 +374,12 @@ def derive_sobs(ct_comp, ipar, npix, resultfile):
                 # -999: no stn number, -60: satellite data */
                 result = '%8d %7.2f %7.2f %5d %2.2d %2.2d %8.2f %8.2f\n' % \
                     (99999, so_lat[iy, ix], so_lon[iy, ix], -999, cortyp, -60,
-                     so_cloud, SDcc)
+                     so_cloud[iy, ix], SDcc)
                 fpt.write(result)
                 so_tot += 1
-            else:
-                so_rejected = so_rejected + 1
 
     LOG.info('\tCreated %d superobservations', so_tot)
     LOG.debug('\t%d superobservations rejected', so_rejected)
-    fpt.close()
 
     now = datetime.utcnow()
     fname_with_timestamp = str(resultfile) + now.strftime('_%Y%m%d%H%M%S')
@@ -369,7 +426,7 @@ if __name__ == "__main__":
 
     # Load the Cloud Type composite from file
     comp = ncCloudTypeComposite()
-    comp.load(filename)
+    comp.load(filename, var_names=['cloudtype', 'weight'])
 
     IPAR = str(iparam)
     NPIX = int(window_size)
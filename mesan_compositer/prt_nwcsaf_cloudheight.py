@@ -37,6 +37,9 @@ import logging
 from logging import handlers
 from mesan_compositer.netcdf_io import ncCTTHComposite
 from mesan_compositer.pps_msg_conversions import get_bit_from_flags
+from mesan_compositer.composite_tools import (get_superobs_blocks,
+                                              get_superobs_geometry,
+                                              get_superobs_midpoints)
 from mesan_compositer import get_config
 
 
@@ -198,14 +201,101 @@ def cloudtop(so_CTH, so_w, so_flg, num_of_datapoints):
     # return top, sd
 
 
-def derive_sobs(ctth_comp, npix, resultfile):
-    """Derive the super observations and print data to file."""
+def get_superobs_heights(ctth_height, flags, weight, dlen, dx, dy):
+    """Get the cloud top heights for all super observation cells in one go.
+
+    The cells are reduced block wise, from strided views of the grids, rather
+    than one by one. Return the number of processed pixels, the number of
+    those with a valid height, and the weighted mean cloud top height of each
+    cell. The height is zero where new_cloudtop would give no height at
+    all. Same results, down to the last bit, as get_superobs_heights_cellwise.
+    """
+    is_processed = ((ctth_height.filled() != ctth_height.fill_value) &
+                    (get_bit_from_flags(np.ma.getdata(flags), 0) != 1))
+    is_valid = is_processed & ~np.ma.getmaskarray(ctth_height)
+
+    so_ii = get_superobs_blocks(is_processed, dlen, dx, dy)
+    grid_shape = so_ii.shape[:2]
+    ncells = grid_shape[0] * grid_shape[1]
+    so_ii = so_ii.reshape(ncells, -1)
+    so_ok = get_superobs_blocks(is_valid, dlen, dx, dy).reshape(ncells, -1)
+    so_cth = get_superobs_blocks(np.ma.getdata(ctth_height), dlen, dx, dy).reshape(ncells, -1)
+    so_w = get_superobs_blocks(np.ma.getdata(weight), dlen, dx, dy).reshape(ncells, -1)
+
+    so_nprocessed = so_ii.sum(axis=1)
+    so_nfound = so_ok.sum(axis=1)
+    so_max = np.where(so_ok, so_cth, -np.inf).max(axis=1)
+
+    # Pack the valid pixels first in each cell, keeping their order, and sum
+    # all cells with the same number of valid pixels together, to get the
+    # same summation order as new_cloudtop:
+    order = np.argsort(~so_ok, axis=1, kind='stable')
+    packed_w = np.take_along_axis(so_w, order, axis=1)
+    packed_wcth = packed_w * np.take_along_axis(so_cth, order, axis=1)
+    so_top = np.zeros(ncells, dtype=packed_wcth.dtype)
+    for nfound in np.unique(so_nfound[so_nfound > 0]):
+        cells = so_nfound == nfound
+        with np.errstate(divide='ignore', invalid='ignore'):
+            so_top[cells] = (packed_wcth[cells, :nfound].sum(axis=1) /
+                             packed_w[cells, :nfound].sum(axis=1))
+    so_top[so_max == 0.0] = 0.0
+
+    return (so_nprocessed.reshape(grid_shape), so_nfound.reshape(grid_shape),
+            so_top.reshape(grid_shape))
+
+
+def get_superobs_heights_cellwise(ctth_height, flags, weight, dlen, dx, dy):
+    """Get the cloud top heights for all super observation cells, one cell at a time.
+
+    Return the number of processed pixels, the number of those with a valid
+    height, and the weighted mean cloud top height of each cell.
+    """
+    lx, ly = get_superobs_midpoints(ctth_height.shape, dlen, dx, dy)
+
+    so_nprocessed = np.zeros((len(ly), len(lx)), dtype=int)
+    so_nfound = np.zeros((len(ly), len(lx)), dtype=int)
+    so_top = np.zeros((len(ly), len(lx)))
+    for iy in range(len(ly)):
+        for ix in range(len(lx)):
+            # super ob domain is: ix-dlen:ix+dlen-1, iy-dlen:iy+dlen-1
+            x = lx[ix]
+            y = ly[iy]
+            so_x = np.arange(x - dlen, x + dlen - 1 + 1)
+            so_y = np.arange(y - dlen, y + dlen - 1 + 1)
+            so_cth = ctth_height[np.ix_(so_y, so_x)]
+
+            so_w = weight[np.ix_(so_y, so_x)]
+            so_flg = flags[np.ix_(so_y, so_x)]
+            ii = (so_cth.filled() != so_cth.fill_value) & (
+                get_bit_from_flags(so_flg, 0) != 1)
+
+            so_nprocessed[iy, ix] = np.sum(ii)
+            so_nfound[iy, ix] = so_cth[ii].compressed().shape[0]
+            if so_nfound[iy, ix] == 0:
+                continue
+
+            # # calculate top and std
+            # cth, sd = cloudtop(
+            #     so_cth[ii], so_w[ii], so_flg[ii], np.prod(so_w.shape))
+
+            # Calculate cloud top height for the super obs:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cth = new_cloudtop(so_cth[ii], so_w[ii])
+            if cth is not None:
+                so_top[iy, ix] = cth
+
+    return so_nprocessed, so_nfound, so_top
+
+
+def derive_sobs(ctth_comp, npix, resultfile, blockwise=True):
+    """Derive the super observations and print data to file.
+
+    If *blockwise* is False the super observation cells are reduced one by
+    one rather than all at once. The output is the same.
+    """
     tmpfname = tempfile.mktemp(suffix=('_' + os.path.basename(resultfile)),
                                dir=os.path.dirname(resultfile))
 
-    # Get the lon,lat:
-    lon, lat = ctth_comp.area_def.get_lonlats()
-
     # isinstance(ctth_comp.height.data, numpy.ma.core.MaskedArray)
     try:
         ctth_height = ctth_comp.height.data.compute()
@@ -222,20 +312,19 @@ def derive_sobs(ctth_comp, npix, resultfile):
     # non overlapping super observations
     # min 8x8 pixels = ca 8x8 km = 2*dlen x 2*dlen pixels for a
     # superobservation
-    dlen = int(np.ceil(float(npix) / 2.0))
-    dx = int(max(2 * DLENMIN, 2 * dlen))
-    dy = dx
+    # The super obs "midpoints" and their lon,lat are the same every time:
+    geometry = get_superobs_geometry(ctth_comp.area_def, npix, DLENMIN)
+    dlen, dx, dy = geometry['dlen'], geometry['dx'], geometry['dy']
     LOG.info('\tUsing %d x %d pixels in a superobservation', dx, dy)
 
-    # initialize superobs data */
-    ny, nx = np.shape(ctth_height)
-
-    # indices to super obs "midpoints"
-    lx = np.arange(dlen, nx - dlen + 1, dx)
-    ly = np.arange(ny - dlen, dlen - 1, -dy)
+    lx, ly = geometry['lx'], geometry['ly']
+    so_lon = geometry['lon']
+    so_lat = geometry['lat']
 
-    so_lon = lon[np.ix_(ly, lx)]
-    so_lat = lat[np.ix_(ly, lx)]
+    if blockwise:
+        so_nprocessed, so_nfound, so_top = get_superobs_heights(ctth_height, flags, weight, dlen, dx, dy)
+    else:
+        so_nprocessed, so_nfound, so_top = get_superobs_heights_cellwise(ctth_height, flags, weight, dlen, dx, dy)
 
     npcount1 = 0
     npcount2 = 0
@@ -244,38 +333,21 @@ def derive_sobs(ctth_comp, npix, resultfile):
     with open(tmpfname, 'w') as fpt:
         for iy in range(len(ly)):
             for ix in range(len(lx)):
-                # super ob domain is: ix-dlen:ix+dlen-1, iy-dlen:iy+dlen-1
-                x = lx[ix]
-                y = ly[iy]
-                so_x = np.arange(x - dlen, x + dlen - 1 + 1)
-                so_y = np.arange(y - dlen, y + dlen - 1 + 1)
-                so_cth = ctth_height[np.ix_(so_y, so_x)]
-
-                so_w = weight[np.ix_(so_y, so_x)]
-                so_flg = flags[np.ix_(so_y, so_x)]
-                ii = (so_cth.filled() != so_cth.fill_value) & (
-                    get_bit_from_flags(so_flg, 0) != 1)
-
                 # any valid data?
-                if np.sum(ii) == 0:
+                if so_nprocessed[iy, ix] == 0:
                     npcount1 += 1
                     continue
 
-                if so_cth[ii].compressed().shape[0] == 0:
+                if so_nfound[iy, ix] == 0:
                     npcount1 += 2
                     continue
 
-                # # calculate top and std
-                # cth, sd = cloudtop(
-                #     so_cth[ii], so_w[ii], so_flg[ii], np.prod(so_w.shape))
-
-                # Calculate cloud top height for the super obs:
-                cth = new_cloudtop(so_cth[ii], so_w[ii])
+                cth = so_top[iy, ix]
                 sd = 999.9
 
                 if not cth:
                     LOG.debug("iy, ix, so_y, so_x, so_lat, so_lon: %d %d %d %d %f %f",
-                              iy, ix, y, x, so_lat[iy, ix], so_lon[iy, ix])
+                              iy, ix, ly[iy], lx[ix], so_lat[iy, ix], so_lon[iy, ix])
                 else:
                     result = '%8d %7.2f %7.2f %5d %d %d %8.2f %8.2f\n' % \
                              (99999, so_lat[iy, ix], so_lon[iy, ix], -999, 1, -60,
@@ -333,7 +405,7 @@ if __name__ == "__main__":
 
     # Load the Cloud Height composite from file
     COMP = ncCTTHComposite()
-    COMP.load(filename)
+    COMP.load(filename, var_names=['height', 'flags', 'weight'])
 
     NPIX = int(window_size)
 
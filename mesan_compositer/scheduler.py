@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2026 Adam.Dybbroe
+
+# Author(s):
+
+#   Adam.Dybbroe <adam.dybbroe@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Scheduling of the composite jobs of the runner.
+
+The scenes of one analysis time arrive in bursts, and each of them asks for
+the same composite to be made again. The jobs are therefore keyed on the
+composite they make, (product, analysis time, area), and a job is only
+started once no new scene has asked for it for a settle delay. A job asked for
+again before it is started is replaced by the new one. No more than one job
+per key is run at a time, a job asked for while the previous one for the same
+key is running is started when that one has finished.
+
+No more jobs are handed to the worker pool than it has workers, the others
+wait in the scheduler. When a worker is free, the job of the latest analysis
+time goes first, so that the composites of the current analysis time are not
+held up by a backlog of older ones, after an outage say. Jobs with analysis
+times older than a horizon are dropped.
+
+The jobs are either started by a thread of their own, or by an asyncio event
+loop when the runner is driven by one.
+"""
+
+import threading
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime
+from functools import partial
+from time import monotonic
+
+LOG = logging.getLogger(__name__)
+
+
+def get_job_key(product, analysis_time, areaid):
+    """Get the key of the job making the *product* composite of *analysis_time* on *areaid*."""
+    return (product, analysis_time, areaid)
+
+
+class JobQueue(ABC):
+    """The composite jobs waiting to be started in a process *pool*.
+
+    A job is started a *settle_delay* (seconds) after it is last asked for,
+    by the subclasses when notified (see _notify). No more than *max_running*
+    jobs are run at a time, and jobs with analysis times older than *horizon*
+    (a timedelta) are dropped. None means no limit.
+    """
+
+    def __init__(self, pool, settle_delay=0, max_running=None, horizon=None):
+        """Initialize the queue with no jobs."""
+        self.pool = pool
+        self.settle_delay = settle_delay
+        self.max_running = max_running
+        self.horizon = horizon
+        self._cond = threading.Condition()
+        # key -> (start time, func, args) of the jobs not started yet
+        self._pending = {}
+        self._running = set()
+
+    @abstractmethod
+    def _notify(self):
+        """Let the jobs that can be started be started."""
+
+    def schedule(self, key, func, args):
+        """Ask for *func* to be run with *args* as the job of *key*.
+
+        A job of the same key not started yet is replaced, and the job is
+        started when no other job of the key has been asked for during the
+        settle delay.
+        """
+        with self._cond:
+            if key in self._pending:
+                LOG.debug("Job %s superseded by a new one", str(key))
+            self._pending[key] = (monotonic() + self.settle_delay, func, args)
+            self._notify()
+
+    def get_queue_depth(self):
+        """Get the number of jobs waiting and the number of jobs running."""
+        with self._cond:
+            return len(self._pending), len(self._running)
+
+    def start_due_jobs(self):
+        """Start the jobs whose settle delay is over, latest analysis time first.
+
+        Jobs are only started if no job of the same key is running, and if
+        there is a free worker. Return the number of seconds until the settle
+        delay of the next job is over, or None if there are no jobs waiting
+        for their settle delay.
+        """
+        with self._cond:
+            if self.horizon is not None:
+                oldest = datetime.utcnow() - self.horizon
+                for key in [key for key in self._pending if key[1] < oldest]:
+                    LOG.warning("Job %s is too old, dropped", str(key))
+                    del self._pending[key]
+
+            now = monotonic()
+            due = [key for key in self._pending
+                   if key not in self._running and self._pending[key][0] <= now]
+            for key in sorted(due, key=lambda key: key[1], reverse=True):
+                if self.max_running and len(self._running) >= self.max_running:
+                    LOG.debug("All workers busy, %d jobs waiting", len(self._pending))
+                    break
+                start_time, func, args = self._pending.pop(key)
+                self._running.add(key)
+                LOG.info("Start job %s", str(key))
+                self.pool.apply_async(func, args,
+                                      callback=partial(self._job_done, key),
+                                      error_callback=partial(self._job_failed, key))
+
+            start_times = [start_time for start_time, func, args in self._pending.values()
+                           if start_time > now]
+            if not start_times:
+                return None
+            return min(start_times) - now
+
+    def _job_done(self, key, result):
+        """Let the next job of *key* start."""
+        with self._cond:
+            LOG.debug("Job %s done", str(key))
+            self._running.discard(key)
+            self._notify()
+
+    def _job_failed(self, key, err):
+        """Let the next job of *key* start, after a failed one."""
+        LOG.error("Job %s failed: %s", str(key), str(err))
+        self._job_done(key, None)
+
+
+class JobScheduler(JobQueue, threading.Thread):
+    """Start the composite jobs in a process *pool* from a thread of its own.
+
+    See JobQueue for the arguments.
+    """
+
+    def __init__(self, pool, settle_delay=0, max_running=None, horizon=None):
+        """Initialize the scheduler thread."""
+        JobQueue.__init__(self, pool, settle_delay, max_running, horizon)
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.loop = True
+
+    def stop(self):
+        """Stop the scheduler."""
+        with self._cond:
+            self.loop = False
+            self._cond.notify()
+
+    def _notify(self):
+        self._cond.notify()
+
+    def run(self):
+        """Start the jobs as they are due, until stopped."""
+        with self._cond:
+            while self.loop:
+                self._cond.wait(self.start_due_jobs())
+
+
+class AsyncJobScheduler(JobQueue):
+    """Start the composite jobs in a process *pool* from the asyncio *event_loop*.
+
+    The results of the jobs, other than None, are handed to *result_callback*
+    on the event loop. See JobQueue for the other arguments.
+    """
+
+    def __init__(self, event_loop, pool, settle_delay=0, max_running=None, horizon=None,
+                 result_callback=None):
+        """Initialize the scheduler on the event loop."""
+        JobQueue.__init__(self, pool, settle_delay, max_running, horizon)
+        self.event_loop = event_loop
+        self.result_callback = result_callback
+        self._timer = None
+
+    def stop(self):
+        """Stop the scheduler."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _notify(self):
+        self.event_loop.call_soon_threadsafe(self._start_jobs)
+
+    def _start_jobs(self):
+        """Start the jobs that are due, and come back when the next one is."""
+        if self._timer is not None:
+            self._timer.cancel()
+        delay = self.start_due_jobs()
+        self._timer = None if delay is None else self.event_loop.call_later(delay, self._start_jobs)
+
+    def _job_done(self, key, result):
+        JobQueue._job_done(self, key, result)
+        if result is not None and self.result_callback is not None:
+            self.result_callback(result)
@@ -24,13 +24,25 @@
 """
 
 import os
+import shutil
 import socket
+import threading
+from time import monotonic
 import netifaces
 from six.moves.urllib.parse import urlparse
 import numpy as np
 import logging
 LOG = logging.getLogger(__name__)
 
+#: Number of seconds the host addresses and the local addresses are cached
+HOST_CACHE_SECONDS = 300
+
+_HOST_CACHE_LOCK = threading.Lock()
+# hostname -> (expiry time, address)
+_HOST_IPS = {}
+# (expiry time, addresses) of the local interfaces
+_LOCAL_IPS = [None, None]
+
 
 def get_bit_from_flags(arr, nbit):
     """I don't know what this function does.
@@ -394,7 +406,7 @@ def check_uri(uri):
     url = urlparse(uri)
     try:
         if url.hostname:
-            url_ip = socket.gethostbyname(url.hostname)
+            url_ip = get_host_ip(url.hostname)
 
             if url_ip not in get_local_ips():
                 try:
@@ -409,7 +421,28 @@ def check_uri(uri):
     return url.path
 
 
-def get_local_ips():
+def get_host_ip(hostname, cached_only=False):
+    """Get the IPv4 address of *hostname*.
+
+    The addresses are cached for HOST_CACHE_SECONDS. With *cached_only*, None
+    is returned if the address is not in the cache rather than looked up.
+    Failed lookups are not cached.
+    """
+    now = monotonic()
+    with _HOST_CACHE_LOCK:
+        expiry, url_ip = _HOST_IPS.get(hostname, (None, None))
+    if expiry is not None and expiry > now:
+        return url_ip
+    if cached_only:
+        return None
+
+    url_ip = socket.gethostbyname(hostname)
+    with _HOST_CACHE_LOCK:
+        _HOST_IPS[hostname] = (now + HOST_CACHE_SECONDS, url_ip)
+    return url_ip
+
+
+def _read_local_ips():
     inet_addrs = [netifaces.ifaddresses(iface).get(netifaces.AF_INET)
                   for iface in netifaces.interfaces()]
     ips = []
@@ -418,3 +451,59 @@ def get_local_ips():
             for add in addr:
                 ips.append(add['addr'])
     return ips
+
+
+def get_local_ips():
+    """Get the IPv4 addresses of the local network interfaces.
+
+    The addresses are cached for HOST_CACHE_SECONDS.
+    """
+    now = monotonic()
+    with _HOST_CACHE_LOCK:
+        expiry, ips = _LOCAL_IPS
+    if expiry is not None and expiry > now:
+        return ips
+
+    ips = _read_local_ips()
+    with _HOST_CACHE_LOCK:
+        _LOCAL_IPS[:] = [now + HOST_CACHE_SECONDS, ips]
+    return ips
+
+
+def refresh_local_ips():
+    """Read the local addresses again, and clear the host cache if they have changed.
+
+    The runner calls this periodically, so that the cached addresses don't
+    outlive a network change by up to HOST_CACHE_SECONDS. Return True if the
+    local addresses have changed.
+    """
+    ips = _read_local_ips()
+    with _HOST_CACHE_LOCK:
+        cached_ips = _LOCAL_IPS[1]
+        changed = cached_ips is not None and set(cached_ips) != set(ips)
+        if changed:
+            _HOST_IPS.clear()
+        _LOCAL_IPS[:] = [monotonic() + HOST_CACHE_SECONDS, ips]
+    if changed:
+        LOG.info("Local addresses changed from %s to %s, host cache cleared", str(cached_ips), str(ips))
+    return changed
+
+
+def clear_host_cache():
+    """Forget the cached host addresses and local addresses."""
+    with _HOST_CACHE_LOCK:
+        _HOST_IPS.clear()
+        _LOCAL_IPS[:] = [None, None]
+
+
+def link_or_copy(src, dst):
+    """Make *dst* a hard link to the file *src*, or a copy if linking is not possible.
+
+    A file which is replaced (renamed onto) later on keeps its content in the
+    link, so this is safe for files that are never modified in place.
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        LOG.debug("Could not link %s to %s, copy instead", src, dst)
+        shutil.copy(src, dst)
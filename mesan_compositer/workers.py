@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2026 Adam.Dybbroe
+
+# Author(s):
+
+#   Adam.Dybbroe <adam.dybbroe@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""The worker processes making the composites for the runner.
+
+By default every job is run in a fresh process, which has to import satpy
+and the rest, and set up the area, before it can start. With warm workers the
+processes are kept between the jobs instead, and prepared once when started:
+the modules of the satpy readers are imported, and the target area, its
+longitudes and latitudes and the super observation geometry are set up. The
+workers are recycled after a number of jobs, or when one of them has grown
+beyond a memory limit, in which case the whole pool is replaced: the old
+workers finish their jobs and exit, and new jobs go to new workers.
+
+The runner driven by an asyncio event loop has its jobs run by a
+concurrent.futures process pool instead, whose workers are always kept warm.
+"""
+
+import threading
+import logging
+import resource
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Pool
+
+LOG = logging.getLogger(__name__)
+
+#: Default number of worker processes
+DEFAULT_WORKERS = 6
+
+#: The satpy readers used for the PPS and NWCSAF/Geo scenes
+READERS = ['nwcsaf-pps_nc', 'nwcsaf-msg2013-hdf5']
+
+
+def init_worker(config_options):
+    """Prepare a warm worker process for the composite jobs.
+
+    The satpy readers are loaded once to have their modules imported. The
+    readers themselves are not kept, satpy loads them again for every Scene.
+    The area and its lon/lats and super observation geometry are cached for
+    the jobs. Everything is done on a best effort basis, what fails here is
+    done by the jobs themselves.
+    """
+    from satpy.readers import configs_for_reader, load_reader
+
+    for reader in READERS:
+        try:
+            for reader_configs in configs_for_reader(reader):
+                load_reader(reader_configs)
+        except Exception as err:
+            LOG.warning("Failed importing the %s reader: %s", reader, str(err))
+
+    try:
+        from satpy.resample import get_area_def
+        from mesan_compositer.composite_tools import get_area_lonlats, get_superobs_geometry
+        from mesan_compositer.prt_nwcsaf_cloudamount import DLENMIN
+
+        if config_options.get('mesan_area_id'):
+            area = get_area_def(config_options['mesan_area_id'])
+            get_area_lonlats(area, cache_dir=config_options.get('lonlat_cache_dir'))
+            if config_options.get('number_of_pixels'):
+                get_superobs_geometry(area, int(config_options['number_of_pixels']), DLENMIN)
+    except Exception as err:
+        LOG.warning("Failed preparing the target area: %s", str(err))
+
+    LOG.debug("Worker ready")
+
+
+def run_job(func, args):
+    """Run *func* with *args* in a worker.
+
+    Return the result and the peak memory use of the worker, in MB.
+    """
+    result = func(*args)
+    return result, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class WorkerPool(object):
+    """A pool of warm worker processes, with the interface of multiprocessing.Pool used by the runner.
+
+    The workers are recycled after *max_jobs* jobs each, and all of them
+    after a job has taken a worker beyond *max_memory* MB. Zero or None means
+    no limit.
+    """
+
+    def __init__(self, processes, config_options, max_jobs=None, max_memory=None):
+        """Initialize the pool and start the workers."""
+        self.processes = processes
+        self.config_options = config_options
+        self.max_jobs = max_jobs or None
+        self.max_memory = max_memory or None
+        self._lock = threading.Lock()
+        self._closing = []
+        self._pool = self._new_pool()
+
+    def _new_pool(self):
+        LOG.info("Start %d warm workers", self.processes)
+        return Pool(processes=self.processes, initializer=init_worker,
+                    initargs=(self.config_options, ), maxtasksperchild=self.max_jobs)
+
+    def apply_async(self, func, args, callback=None, error_callback=None):
+        """Run *func* with *args* in one of the workers."""
+        with self._lock:
+            pool = self._pool
+
+        def job_done(retv):
+            result, memory = retv
+            if self.max_memory and memory > self.max_memory:
+                LOG.info("Worker memory use %.0f MB above the limit", memory)
+                self.recycle(pool)
+            if callback is not None:
+                callback(result)
+
+        return pool.apply_async(run_job, (func, args), callback=job_done,
+                                error_callback=error_callback)
+
+    def recycle(self, pool):
+        """Replace the workers of *pool* with new ones, letting them finish their jobs."""
+        with self._lock:
+            if pool is not self._pool:
+                return
+            LOG.info("Recycle the workers")
+            self._pool = self._new_pool()
+            pool.close()
+            # The old workers are waited for in the background:
+            self._closing = [thread for thread in self._closing if thread.is_alive()]
+            thread = threading.Thread(target=pool.join)
+            thread.daemon = True
+            thread.start()
+            self._closing.append(thread)
+
+    def close(self):
+        """Take no more jobs."""
+        with self._lock:
+            self._pool.close()
+
+    def join(self):
+        """Wait for all the jobs to finish."""
+        with self._lock:
+            pool = self._pool
+            closing = list(self._closing)
+        for thread in closing:
+            thread.join()
+        pool.join()
+
+
+class ExecutorPool(object):
+    """A process pool executor of warm workers, with the interface of multiprocessing.Pool used by the runner.
+
+    The jobs are submitted from the asyncio *event_loop*, and the callbacks
+    are called on it. The executor can't retire single workers, so all of
+    them are recycled after *max_jobs* jobs per worker on average, and after a
+    job has taken a worker beyond *max_memory* MB. Zero or None means no
+    limit.
+    """
+
+    def __init__(self, event_loop, processes, config_options, max_jobs=None, max_memory=None):
+        """Initialize the pool and its executor."""
+        self.event_loop = event_loop
+        self.processes = processes
+        self.config_options = config_options
+        self.max_jobs = max_jobs or None
+        self.max_memory = max_memory or None
+        self._njobs = 0
+        self._executor = self._new_executor()
+
+    def _new_executor(self):
+        LOG.info("Start %d warm workers", self.processes)
+        self._njobs = 0
+        # The workers need the globals of the runner, so they are forked:
+        return ProcessPoolExecutor(max_workers=self.processes, initializer=init_worker,
+                                   initargs=(self.config_options, ),
+                                   mp_context=multiprocessing.get_context('fork'))
+
+    def apply_async(self, func, args, callback=None, error_callback=None):
+        """Run *func* with *args* in one of the workers."""
+        executor = self._executor
+
+        def job_done(future):
+            try:
+                result, memory = future.result()
+            except Exception as err:
+                if error_callback is not None:
+                    error_callback(err)
+                return
+            if self.max_memory and memory > self.max_memory:
+                LOG.info("Worker memory use %.0f MB above the limit", memory)
+                self.recycle(executor)
+            if callback is not None:
+                callback(result)
+
+        future = self.event_loop.run_in_executor(executor, run_job, func, args)
+        future.add_done_callback(job_done)
+        self._njobs += 1
+        if self.max_jobs and self._njobs >= self.max_jobs * self.processes:
+            self.recycle(executor)
+        return future
+
+    def recycle(self, executor):
+        """Replace the workers of *executor* with new ones, letting them finish their jobs."""
+        if executor is not self._executor:
+            return
+        LOG.info("Recycle the workers")
+        self._executor = self._new_executor()
+        executor.shutdown(wait=False)
+
+    def shutdown(self, wait=True):
+        """Take no more jobs, and wait for the jobs to finish if *wait*."""
+        self._executor.shutdown(wait=wait)
+
+
+def get_worker_pool(config_options):
+    """Get the pool of worker processes of the runner, as given in *config_options*."""
+    processes = int(config_options.get('runner_workers', DEFAULT_WORKERS))
+    if not config_options.get('warm_workers', False):
+        return Pool(processes=processes, maxtasksperchild=1)
+
+    return WorkerPool(processes, config_options,
+                      max_jobs=int(config_options.get('worker_max_jobs', 0)),
+                      max_memory=float(config_options.get('worker_max_memory_mb', 0)))
@@ -26,6 +26,10 @@
 from mesan_compositer.pps_msg_conversions import get_bit_from_flags
 
 import numpy as np
+import xarray as xr
+
+import logging
+LOG = logging.getLogger(__name__)
 
 
 OLD_CTYPE_NAMES = ["Not processed",
@@ -86,8 +90,109 @@ OLD_CTYPE_QFLAG_NAMES = ["Land",
                          ]
 
 
+# The bits of the v2014 (status, conditions, quality) flags used in the
+# conversion to the old flags:
+CTTH_FLAG_BITS = ((0, 2, 4, 5, 6, 7), (0, 8, 9, 10, 11), (0, 3, 4, 5))
+CTYPE_FLAG_BITS = ((0, 2, 3), (1, 2, 3, 4, 5), ())
+
+
+def get_bit_runs(bits):
+    """Split the sorted list of *bits* in runs of consecutive bits.
+
+    Return a list of (first bit, number of bits) tuples.
+    """
+    runs = []
+    for bit in bits:
+        if runs and runs[-1][0] + runs[-1][1] == bit:
+            runs[-1] = (runs[-1][0], runs[-1][1] + 1)
+        else:
+            runs.append((bit, 1))
+
+    return runs
+
+
+def get_flags_key(flags, flag_bits):
+    """Gather the given bits of the flags into one compact integer key.
+
+    *flags* is a sequence of flag arrays (numpy, dask or xarray), and
+    *flag_bits* the bits to pick from each of them. The bits end up in the key
+    in the order given, starting with the lowest bit of the key.
+    """
+    key = 0
+    pos = 0
+    for flag, bits in zip(flags, flag_bits):
+        for start, nbits in get_bit_runs(bits):
+            part = np.bitwise_and(np.right_shift(flag, start), 2 ** nbits - 1)
+            key = np.bitwise_or(key, np.left_shift(part.astype('int32'), pos))
+            pos += nbits
+
+    return key
+
+
+def get_flags_from_key(key, flag_bits):
+    """Spread the bits of the compact integer *key* back to flag arrays.
+
+    This is the inverse of get_flags_key, with all other flag bits unset.
+    """
+    flags = []
+    pos = 0
+    for bits in flag_bits:
+        flag = np.zeros(np.shape(key), 'int32')
+        for bit in bits:
+            flag += np.left_shift(get_bit_from_flags(key, pos).astype('int32'), bit)
+            pos += 1
+        flags.append(flag)
+
+    return flags
+
+
+def get_flags_table(convert_flags, flag_bits):
+    """Tabulate the flag conversion *convert_flags* for all possible keys."""
+    nbits = sum(len(bits) for bits in flag_bits)
+    key = np.arange(2 ** nbits, dtype='int32')
+
+    return convert_flags(*get_flags_from_key(key, flag_bits))
+
+
+def lookup_flags(table, key):
+    """Look up the flags for the *key* in *table*.
+
+    Dask arrays are looked up chunk wise and stay lazy. Xarray DataArrays are
+    returned as DataArrays with the dimensions and coordinates of the key.
+    """
+    if isinstance(key, xr.DataArray):
+        return xr.DataArray(lookup_flags(table, key.data),
+                            dims=key.dims, coords=key.coords)
+    if hasattr(key, 'map_blocks'):
+        return key.map_blocks(table.take, dtype=table.dtype)
+
+    return table.take(key)
+
+
 def ctth_convert_flags(status_flag, conditions_flag, quality_flag):
-    """Convert from new v2014 ctth flags to the old ones"""
+    """Convert from new v2014 ctth flags to the old ones
+
+    Only the relevant bits of the three flags are gathered in a compact key,
+    which is looked up in a precomputed table, see ctth_convert_flags_bitwise.
+    Works for numpy, dask and xarray flags.
+    """
+    key = get_flags_key((status_flag, conditions_flag, quality_flag), CTTH_FLAG_BITS)
+    return lookup_flags(CTTH_FLAGS_TABLE, key)
+
+
+def ctype_convert_flags(status_flag, conditions_flag, quality_flag):
+    """Convert from new v2014 cloudtype flags to old ones
+
+    Only the relevant bits of the flags are gathered in a compact key, which
+    is looked up in a precomputed table, see ctype_convert_flags_bitwise.
+    Works for numpy, dask and xarray flags.
+    """
+    key = get_flags_key((status_flag, conditions_flag, quality_flag), CTYPE_FLAG_BITS)
+    return lookup_flags(CTYPE_FLAGS_TABLE, key)
+
+
+def ctth_convert_flags_bitwise(status_flag, conditions_flag, quality_flag):
+    """Convert from new v2014 ctth flags to the old ones, bit by bit"""
 
     shape = status_flag.shape
     ones = np.ones(shape, "int32")
@@ -192,8 +297,8 @@ def ctth_convert_flags(status_flag, conditions_flag, quality_flag):
     return retv
 
 
-def ctype_convert_flags(status_flag, conditions_flag, quality_flag):
-    """Convert from new v2014 cloudtype flags to old ones"""
+def ctype_convert_flags_bitwise(status_flag, conditions_flag, quality_flag):
+    """Convert from new v2014 cloudtype flags to old ones, bit by bit"""
     # New status flag (ct_status_flag):
     # Bit 0: Low level thermal inversion in NWP field
     # Bit 1: NWP data suspected low quality
@@ -247,12 +352,44 @@ def ctype_convert_flags(status_flag, conditions_flag, quality_flag):
     return retv
 
 
-def map_cloudtypes(newctype):
+# The conversions for all combinations of the flag bits used:
+CTTH_FLAGS_TABLE = get_flags_table(ctth_convert_flags_bitwise, CTTH_FLAG_BITS)
+CTYPE_FLAGS_TABLE = get_flags_table(ctype_convert_flags_bitwise, CTYPE_FLAG_BITS)
+
+
+def map_cloudtypes(newctype, inplace=False):
+    """Map the v2014 cloudtype classes to the old (v2012 and before) cloud type
+    categories
+
+    The classes are looked up in the 256 entry table CTYPE_V2014_TO_OLD. If
+    *inplace* is True a numpy array is overwritten with the result. Dask
+    arrays (and xarray DataArrays holding them) are mapped chunk wise and
+    stay lazy. Other than uint8 numpy arrays are mapped class by class, see
+    map_cloudtypes_classwise.
+    """
+
+    LOG.debug("Map new cloud type to old one...")
+    if isinstance(newctype, xr.DataArray):
+        return newctype.copy(data=map_cloudtypes(newctype.data, inplace=inplace))
+    if hasattr(newctype, 'map_blocks'):
+        return newctype.map_blocks(map_cloudtypes, dtype=newctype.dtype)
+    if np.ma.isMaskedArray(newctype) or newctype.dtype != np.uint8:
+        return map_cloudtypes_classwise(newctype, inplace=inplace)
+
+    if inplace:
+        return np.take(CTYPE_V2014_TO_OLD, newctype, out=newctype)
+    return np.take(CTYPE_V2014_TO_OLD, newctype)
+
+
+def map_cloudtypes_classwise(newctype, inplace=False):
     """Map the v2014 cloudtype classes to the old (v2012 and before) cloud type
-    categories"""
+    categories, class by class"""
 
-    print("Map new cloud type to old one...")
-    retv = newctype.copy()
+    if inplace:
+        retv = newctype
+        newctype = newctype.copy()
+    else:
+        retv = newctype.copy()
 
     retv[newctype == 5] = 6
     retv[newctype == 6] = 8
@@ -272,6 +409,10 @@ def map_cloudtypes(newctype):
     return retv
 
 
+# The old cloudtype category for all uint8 v2014 cloudtype values:
+CTYPE_V2014_TO_OLD = map_cloudtypes_classwise(np.arange(256, dtype=np.uint8))
+
+
 def old_processing_flag_palette(product):
     """Make the old name list with cloudtype or ctth processing flag descriptions"""
 
@@ -28,6 +28,15 @@ from tests import test_compositer
 from tests import test_pps_conversions
 from tests import test_color_legends
 from tests import test_make_ct_composite
+from tests import test_make_ctth_composite
+from tests import test_superobs
+from tests import test_msg_store
+from tests import test_netcdf_io
+from tests import test_catalogue
+from tests import test_scheduler
+from tests import test_workers
+from tests import test_utils
+from tests import test_runner
 
 import unittest
 
@@ -52,6 +61,15 @@ def suite():
     mysuite.addTests(test_pps_conversions.suite())
     mysuite.addTests(test_color_legends.suite())
     mysuite.addTests(test_make_ct_composite.suite())
+    mysuite.addTests(test_make_ctth_composite.suite())
+    mysuite.addTests(test_superobs.suite())
+    mysuite.addTests(test_msg_store.suite())
+    mysuite.addTests(test_netcdf_io.suite())
+    mysuite.addTests(test_catalogue.suite())
+    mysuite.addTests(test_scheduler.suite())
+    mysuite.addTests(test_workers.suite())
+    mysuite.addTests(test_utils.suite())
+    mysuite.addTests(test_runner.suite())
 
     return mysuite
 
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2026 Adam.Dybbroe
+
+# Author(s):
+
+#   Adam.Dybbroe <adam.dybbroe@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the persistent file catalogue."""
+
+import os
+import tempfile
+import shutil
+import unittest
+from datetime import datetime, timedelta
+from glob import glob
+
+from mock import patch
+
+from mesan_compositer import catalogue
+from mesan_compositer.catalogue import FileCatalogue, SceneCatalogue, get_scene_from_message
+from mesan_compositer.catalogue import get_catalogue_scenes
+from mesan_compositer.composite_tools import get_ppslist, get_msglist, PLATFORM_NAME, METEOSAT, PPS_FILENAME
+from mesan_compositer.make_ct_composite import ctCompositer
+from tests.test_make_ct_composite import CONFIG_OPTIONS
+
+POLAR_SATELLITES = ['NOAA-20', 'Metop-B', 'NOAA-19', 'Suomi-NPP']
+
+
+def touch(dirname, bname):
+    """Create an empty file."""
+    filename = os.path.join(dirname, bname)
+    open(filename, 'w').close()
+    return filename
+
+
+def make_files(dirname, start, nfiles):
+    """Create PPS and MSG cloud type files, one every 10 minutes from *start*."""
+    for i in range(nfiles):
+        tstart = start + timedelta(minutes=10 * i)
+        tend = tstart + timedelta(minutes=5)
+        sat = ['noaa19', 'metopb', 'npp', 'noaa18'][i % 4]
+        touch(dirname, 'S_NWC_CT_%s_%05d_%sZ_%sZ.nc' % (sat, 40000 + i, tstart.strftime('%Y%m%dT%H%M%S0'),
+                                                        tend.strftime('%Y%m%dT%H%M%S0')))
+        area = ['MSG-N', 'EuropeCanary'][i % 2]
+        touch(dirname, 'SAFNWC_MSG4_CT___%s_%s.PLAX.CTTH.0.h5' % (tstart.strftime('%Y%m%d%H%M'), area))
+
+
+def as_tuples(scenes):
+    """Get the scenes as comparable tuples."""
+    return [(s.uri, s.platform_name, s.timeslot, getattr(s, 'orbit', None),
+             getattr(s, 'geofilename', None), getattr(s, 'areaid', None)) for s in sorted(scenes)]
+
+
+class TestFileCatalogue(unittest.TestCase):
+    """Test the file catalogue."""
+
+    def setUp(self):
+        """Set up a directory with input files."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.datadir = os.path.join(self.tmpdir, 'data')
+        os.mkdir(self.datadir)
+        make_files(self.datadir, datetime(2019, 11, 5, 12, 3), 40)
+        self.time_window = (datetime(2019, 11, 5, 14, 25), datetime(2019, 11, 5, 15, 35))
+        self.catalogue = FileCatalogue(os.path.join(self.tmpdir, 'catalogue.db'))
+
+    def test_same_as_globbing(self):
+        """Test that the catalogue finds the same scenes as the file globbing."""
+        self.catalogue.update(self.datadir, 'S_NWC_CT_*nc', 'pps', 'CT')
+        self.catalogue.update(self.datadir, '*_CT___*.PLAX.CTTH.0.h5', 'msg', 'CT')
+
+        expected = get_ppslist(glob(os.path.join(self.datadir, 'S_NWC_CT_*nc')), self.time_window,
+                               satellites=POLAR_SATELLITES)
+        result = self.catalogue.get_pps_scenes('CT', self.time_window, satellites=POLAR_SATELLITES)
+        self.assertTrue(len(expected) > 0)
+        self.assertEqual(as_tuples(result), as_tuples(expected))
+
+        expected = get_msglist(glob(os.path.join(self.datadir, '*_CT___*.PLAX.CTTH.0.h5')),
+                               self.time_window, 'MSG-N')
+        result = self.catalogue.get_msg_scenes('CT', self.time_window, 'MSG-N')
+        self.assertTrue(len(expected) > 0)
+        self.assertEqual(as_tuples(result), as_tuples(expected))
+
+        self.assertEqual(self.catalogue.get_pps_scenes('CT', self.time_window, variant='global'), [])
+        self.assertEqual(self.catalogue.get_pps_scenes('CTTH', self.time_window), [])
+
+    def test_incremental_update(self):
+        """Test that only new files are parsed, and that removed files are dropped."""
+        self.assertEqual(self.catalogue.update(self.datadir, 'S_NWC_CT_*nc', 'pps', 'CT'), 40)
+        with patch.object(catalogue, 'get_pps_record', wraps=catalogue.get_pps_record) as get_record:
+            make_files(self.datadir, datetime(2019, 11, 5, 15, 1), 1)
+            os.remove(sorted(glob(os.path.join(self.datadir, 'S_NWC_CT_noaa19*nc')))[0])
+            self.assertEqual(self.catalogue.update(self.datadir, 'S_NWC_CT_*nc', 'pps', 'CT'), 40)
+        self.assertEqual(get_record.call_count, 1)
+
+        time_window = (datetime(2019, 11, 5, 11, 0), datetime(2019, 11, 5, 20, 0))
+        result = self.catalogue.get_pps_scenes('CT', time_window)
+        self.assertEqual(len(result), 40)
+        self.assertEqual(as_tuples(result),
+                         as_tuples(get_ppslist(glob(os.path.join(self.datadir, 'S_NWC_CT_*nc')), time_window)))
+
+    def test_ct_compositer(self):
+        """Test that the cloud type compositer gets the same scenes from the catalogue."""
+        options = dict(CONFIG_OPTIONS, pps_direct_readout_dir=self.datadir, pps_metop_gds_dir=None,
+                       msg_dir=self.datadir)
+        scenes = []
+        for catalogue_file in [None, os.path.join(self.tmpdir, 'ct_catalogue.db')]:
+            ctcomp = ctCompositer(datetime(2019, 11, 5, 15, 0), timedelta(minutes=35), 'mesanEx',
+                                  dict(options, catalogue_file=catalogue_file))
+            ctcomp.get_catalogue()
+            scenes.append((as_tuples(ctcomp.pps_scenes), as_tuples(ctcomp.msg_scenes)))
+        self.assertTrue(len(scenes[0][0]) > 0 and len(scenes[0][1]) > 0)
+        self.assertEqual(scenes[0], scenes[1])
+
+    def test_scene_catalogue(self):
+        """Test that the scenes from the messages are the same as from the files."""
+        from trollsift import Parser
+
+        scene_catalogue = SceneCatalogue()
+        for filename in sorted(glob(os.path.join(self.datadir, 'S_NWC_CT_*nc'))):
+            res = Parser(PPS_FILENAME).parse(os.path.basename(filename))
+            msg_data = {'platform_name': PLATFORM_NAME[res['platform_name']], 'orbit_number': res['orbit'],
+                        'start_time': res['start_time'], 'end_time': res['end_time']}
+            scene_catalogue.add(get_scene_from_message(msg_data, filename), 'CT')
+        for filename in sorted(glob(os.path.join(self.datadir, '*_CT___*.PLAX.CTTH.0.h5')), reverse=True):
+            bname = os.path.basename(filename)
+            msg_data = {'platform_name': METEOSAT[bname.split('_')[1]],
+                        'nominal_time': datetime.strptime(bname[17:29], '%Y%m%d%H%M')}
+            scene = get_scene_from_message(msg_data, filename)
+            scene_catalogue.add(scene, 'CT')
+            scene_catalogue.add(scene, 'CT')
+        self.assertEqual(len(scene_catalogue), 80)
+
+        expected = get_ppslist(glob(os.path.join(self.datadir, 'S_NWC_CT_*nc')), self.time_window,
+                               satellites=POLAR_SATELLITES)
+        result = scene_catalogue.get_pps_scenes('CT', self.time_window, satellites=POLAR_SATELLITES)
+        self.assertTrue(len(expected) > 0)
+        self.assertEqual(as_tuples(result), as_tuples(expected))
+
+        expected = get_msglist(glob(os.path.join(self.datadir, '*_CT___*.PLAX.CTTH.0.h5')),
+                               self.time_window, 'MSG-N')
+        result = scene_catalogue.get_msg_scenes('CT', self.time_window, 'MSG-N')
+        self.assertTrue(len(expected) > 0)
+        self.assertEqual(as_tuples(result), as_tuples(expected))
+        self.assertEqual(scene_catalogue.get_msg_scenes('CTTH', self.time_window, 'MSG-N'), [])
+
+        scene_catalogue.prune(datetime(2019, 11, 5, 15, 0))
+        self.assertEqual(len(scene_catalogue.get_pps_scenes('CT', self.time_window)), 3)
+
+    def test_scene_catalogue_gds(self):
+        """Test that the Metop scenes from the GDS directory are taken as GDS, not direct readout."""
+        gds_dir = os.path.join(self.tmpdir, 'gds')
+        os.mkdir(gds_dir)
+        msg_data = {'platform_name': 'Metop-B', 'orbit_number': 37011,
+                    'start_time': datetime(2019, 11, 5, 14, 50), 'end_time': datetime(2019, 11, 5, 14, 53)}
+        gds_file = touch(gds_dir, 'S_NWC_CT_metopb_37011_20191105T1450000Z_20191105T1453000Z.nc')
+        dr_file = touch(self.datadir, 'S_NWC_CT_metopb_37011_20191105T1450000Z_20191105T1453000Z.nc')
+
+        scene_catalogue = SceneCatalogue(gds_dir)
+        for filename in [gds_file, dr_file]:
+            scene = get_scene_from_message(msg_data, filename, gds_dir=scene_catalogue.gds_dir)
+            scene_catalogue.add(scene, 'CT')
+        self.assertEqual(get_scene_from_message(msg_data, gds_file).variant, None)
+
+        pps_scenes, msg_scenes = get_catalogue_scenes(scene_catalogue, 'CT', self.time_window,
+                                                      ['Metop-B'], 'MSG-N')
+        self.assertEqual([(scene.uri, scene.variant) for scene in pps_scenes], [(dr_file, None)])
+        gds_scenes = scene_catalogue.get_pps_scenes('CT', self.time_window, variant='global')
+        self.assertEqual([scene.uri for scene in gds_scenes], [gds_file])
+
+    def tearDown(self):
+        """Clean up."""
+        self.catalogue.close()
+        shutil.rmtree(self.tmpdir)
+
+
+def suite():
+    """Run all the tests for the file catalogue."""
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestFileCatalogue))
+
+    return mysuite
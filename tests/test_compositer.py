@@ -22,15 +22,37 @@
 
 """Unit testing the composite generation."""
 
+import os
+import shutil
+import tempfile
+import threading
+import sys
 import unittest
 import numpy as np
+import dask.array as da
+import xarray as xr
+from pyresample.geometry import AreaDefinition
+from satpy import Scene
 from mesan_compositer.composite_tools import get_weight_cloudtype
+from mesan_compositer.composite_tools import CTYPE_FLAG_WEIGHTS
+from mesan_compositer.composite_tools import get_weight_ctth
+from mesan_compositer.composite_tools import CTTH_FLAG_WEIGHTS
+from mesan_compositer.composite_tools import resample_scene
+from mesan_compositer.composite_tools import get_area_lonlats
+from mesan_compositer.composite_tools import get_area_lonlats_tiles
+from mesan_compositer.composite_tools import imap_scenes
+from mesan_compositer import composite_tools
 from mesan_compositer.composite_tools import get_analysis_time
 from mesan_compositer.composite_tools import PpsMetaData
 from mesan_compositer.composite_tools import MsgMetaData
 
 from datetime import datetime, timedelta
 
+if sys.version_info < (3,):
+    from mock import patch
+else:
+    from unittest.mock import patch
+
 CTYPE_MSG = np.array([[6, 6, 6, 6, 6, 6, 6, 6, 6, 6],
                       [6, 6, 6, 6, 6, 6, 6, 19, 6, 6],
                       [6, 6, 6, 6, 6, 6, 19, 19, 19, 6],
@@ -134,11 +156,170 @@ class TestCloudTypeWeights(unittest.TestCase):
             CTYPE_MSG, CTYPE_MSG_FLAG, LAT_MSG2, TDIFF_MSG, IS_MSG_MSG)
         self.assertTrue(np.allclose(retv, WEIGHT_MSG2))
 
+    def test_cloudtype_flag_weights(self):
+        """Test the flag weights for all combinations of the 12 cloudtype flag bits."""
+        flags = np.arange(4096 * 4).reshape((64, 256)) - 8192
+        ctype = 5 * np.ones(flags.shape, dtype=np.uint8)
+        lat = 50.0 * np.ones(flags.shape)
+        for is_msg in [False, True]:
+            expected = np.ones(flags.shape)
+            for bit in range(12):
+                bit_is_set = np.bitwise_and(np.right_shift(flags, bit), 1) == 1
+                expected[bit_is_set] *= CTYPE_FLAG_WEIGHTS[bit, 1 * is_msg]
+            idx_msg = is_msg * np.ones(flags.shape, dtype=bool)
+            retv = get_weight_cloudtype(ctype, flags, lat, TDIFF_MSG, idx_msg)
+            np.testing.assert_array_equal(retv, expected)
+
     def tearDown(self):
         """Clean up."""
         return
 
 
+class TestCTTHWeights(unittest.TestCase):
+    """Unit testing the derivation of the CTTH weights."""
+
+    def test_ctth_flag_weights(self):
+        """Test the flag weights for all combinations of the 16 CTTH flag bits."""
+        flags = np.arange(65536, dtype=np.int32).reshape((256, 256))
+        lat = np.linspace(40.0, 80.0, 256)[np.newaxis, :] * np.ones((256, 1))
+        for is_msg in [False, True]:
+            for tdiff in [TDIFF_MSG, timedelta(minutes=45)]:
+                expected = np.ones(flags.shape)
+                if tdiff.seconds > 30 * 60:
+                    expected *= 0.5
+                for bit in range(16):
+                    bit_is_set = np.bitwise_and(np.right_shift(flags, bit), 1) == 1
+                    expected[bit_is_set] *= CTTH_FLAG_WEIGHTS[bit, 1 * is_msg]
+                if is_msg:
+                    ii = (lat >= 52.0) & (lat <= 75.0)
+                    expected[ii] *= (75.0 - lat[ii]) / (75.0 - 52.0)
+                    expected[lat > 75.0] = 0.0
+                idx_msg = is_msg * np.ones(flags.shape, dtype=bool)
+                retv = get_weight_ctth(flags, lat, tdiff, idx_msg)
+                self.assertEqual(retv.dtype, np.float64)
+                np.testing.assert_array_equal(retv, expected)
+
+
+class TestResampleScene(unittest.TestCase):
+    """Test the resampling with cached resampling info."""
+
+    def setUp(self):
+        """Set up a small geostationary scene."""
+        self.cache_dir = tempfile.mkdtemp()
+        self.source = AreaDefinition('msgn', 'msgn', 'msgn',
+                                     {'proj': 'geos', 'h': 35785831, 'lon_0': 0,
+                                      'a': 6378169, 'b': 6356583.8},
+                                     120, 60, (-1800000, 3000000, 1800000, 4800000))
+        self.target = AreaDefinition('mesanEx', 'mesanEx', 'mesanEx',
+                                     {'proj': 'stere', 'lat_0': 90, 'lon_0': 14,
+                                      'lat_ts': 60, 'ellps': 'WGS84'},
+                                     80, 60, (-800000, -4200000, 800000, -3000000))
+        self.data = np.random.default_rng(0).integers(0, 21, size=(60, 120)).astype(np.float64)
+
+    def _get_scene(self):
+        scene = Scene()
+        scene['ct'] = xr.DataArray(da.from_array(self.data, chunks=30), dims=('y', 'x'),
+                                   attrs={'area': self.source, 'name': 'ct'})
+        return scene
+
+    def test_resample_scene(self):
+        """Test that the resampling info is cached and gives the same result."""
+        expected = resample_scene(self._get_scene(), self.target, 20000)['ct'].values
+
+        for _ in range(2):
+            res = resample_scene(self._get_scene(), self.target, 20000,
+                                 cache_dir=self.cache_dir)['ct'].values
+            np.testing.assert_array_equal(res, expected)
+            cached = os.listdir(self.cache_dir)
+            self.assertEqual(len(cached), 1)
+            self.assertTrue(cached[0].startswith('nn_lut-'))
+
+        resample_scene(self._get_scene(), self.target, 10000, cache_dir=self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def tearDown(self):
+        """Clean up."""
+        shutil.rmtree(self.cache_dir)
+
+
+class TestAreaLonlats(unittest.TestCase):
+    """Test the cached longitudes and latitudes of an area."""
+
+    def setUp(self):
+        """Set up the area."""
+        self.cache_dir = tempfile.mkdtemp()
+        self.area = AreaDefinition('mesanEx', 'mesanEx', 'mesanEx',
+                                   {'proj': 'stere', 'lat_0': 90, 'lon_0': 14,
+                                    'lat_ts': 60, 'ellps': 'WGS84'},
+                                   80, 60, (-800000, -4200000, 800000, -3000000))
+        composite_tools._AREA_LONLATS.clear()
+
+    def test_get_area_lonlats(self):
+        """Test that the longitudes and latitudes are computed once only."""
+        expected = self.area.get_lonlats()
+
+        lon, lat = get_area_lonlats(self.area)
+        self.assertEqual(lat.dtype, np.float32)
+        np.testing.assert_allclose(lon, expected[0], atol=1e-4)
+        np.testing.assert_allclose(lat, expected[1], atol=1e-4)
+        self.assertIs(get_area_lonlats(self.area)[1], lat)
+        self.assertFalse(lat.flags.writeable)
+
+    def test_get_area_lonlats_cached(self):
+        """Test that the longitudes and latitudes are read from the cache file."""
+        lon, lat = get_area_lonlats(self.area, cache_dir=self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        composite_tools._AREA_LONLATS.clear()
+        with patch.object(AreaDefinition, 'get_lonlats') as get_lonlats:
+            cached_lon, cached_lat = get_area_lonlats(self.area, cache_dir=self.cache_dir)
+        get_lonlats.assert_not_called()
+        self.assertIsInstance(cached_lat.base, np.memmap)
+        np.testing.assert_array_equal(cached_lon, lon)
+        np.testing.assert_array_equal(cached_lat, lat)
+
+        for cache_dir in [None, self.cache_dir]:
+            composite_tools._AREA_LONLATS.clear()
+            tiles = get_area_lonlats_tiles(self.area, (16, 80), cache_dir=cache_dir)
+            self.assertEqual(tiles[1].chunks, ((16, 16, 16, 12), (80,)))
+            np.testing.assert_array_equal(tiles[0].compute(), lon)
+            np.testing.assert_array_equal(tiles[1].compute(), lat)
+
+    def tearDown(self):
+        """Clean up."""
+        composite_tools._AREA_LONLATS.clear()
+        shutil.rmtree(self.cache_dir)
+
+
+class TestImapScenes(unittest.TestCase):
+    """Test processing the scenes concurrently."""
+
+    def test_scenes_in_flight(self):
+        """Test that the results come in order, with no more scenes processed ahead than workers."""
+        lock = threading.Lock()
+        started = []
+        yielded = []
+
+        def process(scene):
+            with lock:
+                started.append(scene)
+                self.assertLessEqual(len(started) - len(yielded), 3)
+            return scene * 2
+
+        for result in imap_scenes(process, list(range(10)), {'scene_workers': 2}):
+            yielded.append(result)
+        self.assertEqual(yielded, [scene * 2 for scene in range(10)])
+
+    @patch('mesan_compositer.composite_tools.multiprocessing.current_process')
+    @patch('mesan_compositer.composite_tools.ProcessPoolExecutor')
+    def test_no_processes_in_daemon(self, executor, current_process):
+        """Test that threads are used in a daemonic process."""
+        current_process.return_value.daemon = True
+        options = {'scene_workers': 2, 'scene_worker_pool': 'process'}
+        self.assertEqual(list(imap_scenes(abs, [-1, -2, -3], options)), [1, 2, 3])
+        executor.assert_not_called()
+
+
 class TestTimeTools(unittest.TestCase):
     """Test (time) arithmetics for observation time and listing/sorting of PPS/MSG scenes."""
 
@@ -249,6 +430,10 @@ def suite():
     loader = unittest.TestLoader()
     mysuite = unittest.TestSuite()
     mysuite.addTest(loader.loadTestsFromTestCase(TestCloudTypeWeights))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestCTTHWeights))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestResampleScene))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestAreaLonlats))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestImapScenes))
     mysuite.addTest(loader.loadTestsFromTestCase(TestTimeTools))
 
     return mysuite
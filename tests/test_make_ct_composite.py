@@ -22,18 +22,26 @@
 
 """Test the generation of the cloudtype composite."""
 
+import os
 import sys
+import shutil
+import tempfile
 from datetime import datetime, timedelta
 import unittest
+import dask.array as da
+import numpy as np
+import xarray as xr
+from pyresample.geometry import AreaDefinition
 
-from mesan_compositer.make_ct_composite import ctCompositer
+from mesan_compositer.make_ct_composite import ctCompositer, get_scene_cloudtype
+from mesan_compositer.composite_tools import imap_scenes
 from mesan_compositer.composite_tools import PpsMetaData
 from mesan_compositer.composite_tools import MsgMetaData
 
 if sys.version_info < (3,):
-    from mock import patch
+    from mock import patch, MagicMock
 else:
-    from unittest.mock import patch
+    from unittest.mock import patch, MagicMock
 
 _PATTERN = ('S_NWC_{product:s}_{platform_name:s}_{orbit:05d}_' +
             '{start_time:%Y%m%dT%H%M%S%f}Z_{end_time:%Y%m%dT%H%M%S%f}Z.nc')
@@ -73,6 +81,73 @@ FAKE_PPS_FILES = ['/tmp/pps1.nc',
                   '/tmp/pps11.nc']
 
 
+class FakeArea(object):
+    """Fake area definition."""
+
+    shape = (40, 50)
+
+    def get_lonlats(self):
+        """Get the longitudes and latitudes."""
+        return np.zeros(self.shape), np.ones(self.shape)
+
+    def dump(self):
+        """Dump the area definition as yaml."""
+        return get_area_def(self.shape).dump()
+
+
+def get_area_def(shape):
+    """Get a real area definition of the given *shape*."""
+    return AreaDefinition('mesanEx', 'mesanEx', 'mesanEx',
+                          {'proj': 'stere', 'lat_0': 90, 'lon_0': 14, 'lat_ts': 60, 'ellps': 'WGS84'},
+                          shape[1], shape[0], (-800000, -4200000, 800000, -3000000))
+
+
+def fake_scene_data(scene, names):
+    """Make up the reprojected datasets *names* of a scene, with 16 bit flags."""
+    rng = np.random.default_rng(int(scene.timeslot.timestamp()))
+    area = get_area_def(FakeArea.shape)
+    datasets = {}
+    for name in names:
+        if name == 'ct':
+            data = rng.integers(0, 23, size=area.shape).astype(np.uint8)
+        else:
+            data = rng.integers(0, 2**16, size=area.shape).astype(np.uint16)
+        datasets[name] = xr.DataArray(da.from_array(data, chunks=(25, 30)), dims=('y', 'x'),
+                                      attrs={'area': area})
+    return datasets
+
+
+def fake_ctype_msg(msg, areaid, cache_dir=None, store_dir=None):
+    """Make up the reprojected MSG cloud type."""
+    return fake_scene_data(msg, ['ct', 'ct_quality'])
+
+
+def fake_ctype_pps(pps, areaid):
+    """Make up the reprojected PPS cloud type."""
+    return fake_scene_data(pps, ['ct', 'ct_quality', 'ct_status_flag', 'ct_conditions'])
+
+
+def fake_scene_cloudtype(scene, areaid, obstime, cache_dir=None, store_dir=None, lonlat_cache_dir=None):
+    """Make up the reprojected and weighted cloud type of a scene."""
+    if scene.uri == '/tmp/my_bad_pps_testfile.nc':
+        return None
+    rng = np.random.default_rng(int(scene.timeslot.timestamp()))
+    shape = FakeArea.shape
+    return {'ct': rng.integers(0, 21, size=shape).astype(np.uint8),
+            'flag': rng.integers(0, 2**15, size=shape),
+            'weight': rng.random(shape),
+            'time': scene.timeslot.timestamp() * np.ones(shape),
+            'id': 1 * np.ones(shape),
+            'area': FakeArea()}
+
+
+def fake_scene_cloudtype_ties(scene, areaid, obstime, cache_dir=None, store_dir=None, lonlat_cache_dir=None):
+    """Make up the cloud type of a scene, with the same weights in many pixels."""
+    x_local = fake_scene_cloudtype(scene, areaid, obstime)
+    x_local['weight'] = np.round(x_local['weight'] * 2) / 2
+    return x_local
+
+
 class TestctCompositor(unittest.TestCase):
     """Test the ctCompositor class."""
 
@@ -126,6 +201,123 @@ class TestctCompositor(unittest.TestCase):
 
             # TODO: Here we should try test the generation of the composite
 
+    @patch('mesan_compositer.make_ct_composite.get_scene_cloudtype', fake_scene_cloudtype)
+    def test_make_composite_in_parallel(self):
+        """Test that the composite is the same when scenes are processed concurrently."""
+        t_analysis = datetime(2019, 11, 5, 19, 0)
+        delta_t = timedelta(seconds=2100)
+        pps_scenes = []
+        for idx, minute in enumerate([3, 12, 25, 31, 44, 50]):
+            uri = '/tmp/my_bad_pps_testfile.nc' if idx == 2 else '/tmp/my_pps_testfile.nc'
+            pps_scenes.append(PpsMetaData(uri, None, 'Metop-B', '%05d' % idx,
+                                          datetime(2019, 11, 5, 18, minute), None))
+
+        composites = []
+        for workers in [1, 4]:
+            options = dict(CONFIG_OPTIONS, scene_workers=workers, scene_worker_pool='thread')
+            ctcomp = ctCompositer(t_analysis, delta_t, 'mesanEx', options)
+            ctcomp.pps_scenes = pps_scenes
+            ctcomp.msg_scenes = list(self.msg_scenes)
+            ctcomp.composite = MagicMock()
+            self.assertTrue(ctcomp.make_composite())
+            composites.append(ctcomp.composite.store.call_args[0][0])
+
+        for name in ['cloudtype', 'flag', 'weight', 'time', 'id']:
+            np.testing.assert_array_equal(composites[0][name], composites[1][name])
+
+    @patch('mesan_compositer.make_ct_composite.ctype_pps', fake_ctype_pps)
+    @patch('mesan_compositer.make_ct_composite.ctype_msg', fake_ctype_msg)
+    def test_get_scene_cloudtype_in_parallel(self):
+        """Test that the scenes are loaded and weighted the same when done concurrently."""
+        obstime = datetime(2019, 11, 5, 19, 0)
+        scenes = [PpsMetaData('/tmp/my_pps_testfile.nc', None, 'Metop-B', '%05d' % idx,
+                              datetime(2019, 11, 5, 18, minute), None)
+                  for idx, minute in enumerate([3, 31, 50])] + self.msg_scenes
+
+        def get_scene(scene):
+            return get_scene_cloudtype(scene, 'mesanEx', obstime)
+
+        serial = list(imap_scenes(get_scene, scenes, {}))
+        parallel = list(imap_scenes(get_scene, scenes, {'scene_workers': 4, 'scene_worker_pool': 'thread'}))
+        self.assertEqual(len(parallel), len(scenes))
+        for expected, result in zip(serial, parallel):
+            for name in ['ct', 'flag', 'weight', 'time', 'id']:
+                np.testing.assert_array_equal(result[name], expected[name])
+
+    def test_make_composite_incremental(self):
+        """Test that merging the scenes as they arrive gives the same composite as in one go."""
+        t_analysis = datetime(2019, 11, 5, 19, 0)
+        delta_t = timedelta(seconds=2100)
+        pps_scenes = [PpsMetaData('/tmp/my_pps_testfile.nc', None, 'Metop-B', '%05d' % idx,
+                                  datetime(2019, 11, 5, 18, minute), None)
+                      for idx, minute in enumerate([3, 12, 25, 31, 44, 50])]
+        arrived = [pps_scenes[3], self.msg_scenes[0], pps_scenes[0], self.msg_scenes[1],
+                   pps_scenes[5], pps_scenes[1], self.msg_scenes[2], pps_scenes[4], pps_scenes[2]]
+
+        def make_composite(scenes, options):
+            ctcomp = ctCompositer(t_analysis, delta_t, 'mesanEx', options)
+            ctcomp.pps_scenes = sorted(scene for scene in scenes if scene in pps_scenes)
+            ctcomp.msg_scenes = sorted(scene for scene in scenes if scene in self.msg_scenes)
+            ctcomp.composite = MagicMock()
+            self.assertTrue(ctcomp.make_composite())
+            return ctcomp.composite.store.call_args[0][0]
+
+        state_dir = tempfile.mkdtemp()
+        options = dict(CONFIG_OPTIONS, composite_state_dir=state_dir)
+        old_states = ['ct_mesanEx_201911051200.npz', 'ctth_mesanEx_201911051200.npz']
+        for bname in old_states + ['ct_mesanEx_201911051300.npz']:
+            open(os.path.join(state_dir, bname), 'w').close()
+        try:
+            with patch('mesan_compositer.make_ct_composite.get_scene_cloudtype',
+                       side_effect=fake_scene_cloudtype_ties) as get_scene:
+                for idx in range(1, len(arrived) + 1):
+                    incremental = make_composite(arrived[:idx], options)
+                self.assertEqual(get_scene.call_count, len(arrived))
+                self.assertEqual(sorted(os.listdir(state_dir)),
+                                 ['ct_mesanEx_201911051300.npz', 'ct_mesanEx_201911051900.npz'])
+                expected = make_composite(arrived, CONFIG_OPTIONS)
+                for name in ['cloudtype', 'flag', 'weight', 'time', 'id']:
+                    np.testing.assert_array_equal(incremental[name], expected[name])
+
+                # A scene has gone, so the composite is made from scratch:
+                get_scene.reset_mock()
+                incremental = make_composite(arrived[1:], options)
+                self.assertEqual(get_scene.call_count, len(arrived) - 1)
+                expected = make_composite(arrived[1:], CONFIG_OPTIONS)
+                for name in ['cloudtype', 'flag', 'weight', 'time', 'id']:
+                    np.testing.assert_array_equal(incremental[name], expected[name])
+        finally:
+            shutil.rmtree(state_dir)
+
+    @patch('mesan_compositer.make_ct_composite.ctype_pps', fake_ctype_pps)
+    @patch('mesan_compositer.make_ct_composite.ctype_msg', fake_ctype_msg)
+    def test_make_composite_tiled(self):
+        """Test that the tiled composite is the same as the one made in one go."""
+        t_analysis = datetime(2019, 11, 5, 19, 0)
+        delta_t = timedelta(seconds=2100)
+        pps_scenes = [PpsMetaData('/tmp/my_pps_testfile.nc', None, 'Metop-B', '%05d' % idx,
+                                  datetime(2019, 11, 5, 18, minute), None)
+                      for idx, minute in enumerate([3, 31, 50])]
+
+        composites = []
+        for tile_rows in [0, 16]:
+            options = dict(CONFIG_OPTIONS, composite_tile_rows=tile_rows)
+            ctcomp = ctCompositer(t_analysis, delta_t, 'mesanEx', options)
+            ctcomp.pps_scenes = pps_scenes
+            ctcomp.msg_scenes = list(self.msg_scenes)
+            ctcomp.composite = MagicMock()
+            self.assertTrue(ctcomp.make_composite())
+            composites.append(ctcomp.composite.store.call_args[0][0])
+
+        for name in ['cloudtype', 'flag', 'weight', 'time', 'id']:
+            self.assertIsInstance(composites[1][name], da.Array)
+            self.assertEqual(composites[1][name].chunks[0], (16, 16, 8))
+            tiled = composites[1][name].compute()
+            self.assertEqual(tiled.dtype, composites[0][name].dtype)
+            np.testing.assert_array_equal(tiled, composites[0][name])
+        self.assertTrue(np.any(composites[0]['id'] == 0))
+        self.assertTrue(np.any(composites[0]['id'] == 1))
+
     def tearDown(self):
         """Clean up."""
         pass
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2026 Adam.Dybbroe
+
+# Author(s):
+
+#   Adam.Dybbroe <adam.dybbroe@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the generation of the CTTH composite."""
+
+import sys
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+import unittest
+import dask.array as da
+import numpy as np
+import xarray as xr
+
+from mesan_compositer.make_ctth_composite import ctthComposite
+from mesan_compositer.composite_tools import PpsMetaData
+from mesan_compositer.composite_tools import MsgMetaData
+from tests.test_make_ct_composite import CONFIG_OPTIONS, FakeArea, get_area_def
+
+if sys.version_info < (3,):
+    from mock import patch, MagicMock
+else:
+    from unittest.mock import patch, MagicMock
+
+
+def fake_scene_ctth(scene, areaid, obstime, cache_dir=None, store_dir=None, lonlat_cache_dir=None):
+    """Make up the reprojected and weighted CTTH of a scene."""
+    if scene.uri == '/tmp/my_bad_pps_testfile.nc':
+        return None
+    rng = np.random.default_rng(int(scene.timeslot.timestamp()))
+    shape = FakeArea.shape
+    return {'temperature': rng.uniform(200.0, 300.0, size=shape),
+            'pressure': rng.uniform(100.0, 1000.0, size=shape),
+            'height': rng.uniform(0.0, 12000.0, size=shape),
+            'flag': rng.integers(0, 2**15, size=shape),
+            'weight': rng.random(shape),
+            'time': scene.timeslot.timestamp() * np.ones(shape),
+            'id': 1 * np.ones(shape),
+            'area': FakeArea()}
+
+
+def fake_ctth_data(scene, flag_names):
+    """Make up the reprojected CTTH of a scene, with unprocessed (NaN) pixels."""
+    rng = np.random.default_rng(int(scene.timeslot.timestamp()))
+    area = get_area_def(FakeArea.shape)
+    height = rng.uniform(0.0, 12000.0, size=area.shape).astype(np.float32)
+    height[rng.random(area.shape) < 0.1] = np.nan
+    datasets = {'ctth_alti': height,
+                'ctth_tempe': rng.uniform(200.0, 300.0, size=area.shape).astype(np.float32),
+                'ctth_pres': rng.uniform(100.0, 1000.0, size=area.shape).astype(np.float32)}
+    for name in flag_names:
+        datasets[name] = rng.integers(0, 2**16, size=area.shape).astype(np.uint16)
+    return dict((name, xr.DataArray(da.from_array(data, chunks=(25, 30)), dims=('y', 'x'),
+                                    attrs={'area': area}))
+                for name, data in datasets.items())
+
+
+def fake_ctth_msg(msg, areaid, cache_dir=None, store_dir=None):
+    """Make up the reprojected MSG CTTH."""
+    return fake_ctth_data(msg, ['ctth_quality'])
+
+
+def fake_ctth_pps(pps, areaid):
+    """Make up the reprojected PPS CTTH."""
+    return fake_ctth_data(pps, ['ctth_quality', 'ctth_status_flag', 'ctth_conditions'])
+
+
+class TestctthComposite(unittest.TestCase):
+    """Test the ctthComposite class."""
+
+    def setUp(self):
+        """Set up the tests."""
+        self.pps_scenes = []
+        for idx, minute in enumerate([3, 12, 25, 31, 44, 50]):
+            uri = '/tmp/my_bad_pps_testfile.nc' if idx == 4 else '/tmp/my_pps_testfile.nc'
+            self.pps_scenes.append(PpsMetaData(uri, None, 'NOAA-20', '%05d' % idx,
+                                               datetime(2019, 11, 5, 18, minute), None))
+        self.msg_scenes = [MsgMetaData('/tmp/my_msg_testfile.nc', 'Meteosat-11', 'MSG-N',
+                                       datetime(2019, 11, 5, 18, minute)) for minute in [30, 45]]
+
+    @patch('mesan_compositer.make_ctth_composite.get_scene_ctth', fake_scene_ctth)
+    def test_make_composite_in_parallel(self):
+        """Test that the composite is the same when scenes are processed concurrently."""
+        t_analysis = datetime(2019, 11, 5, 19, 0)
+        delta_t = timedelta(seconds=2100)
+
+        composites = []
+        for workers in [1, 3]:
+            options = dict(CONFIG_OPTIONS, scene_workers=workers, scene_worker_pool='thread')
+            ctthcomp = ctthComposite(t_analysis, delta_t, 'mesanEx', options)
+            ctthcomp.pps_scenes = self.pps_scenes
+            ctthcomp.msg_scenes = self.msg_scenes
+            ctthcomp.composite = MagicMock()
+            self.assertTrue(ctthcomp.make_composite())
+            composites.append(ctthcomp.composite.store.call_args[0][0])
+
+        for name in ['temperature', 'pressure', 'height', 'flag', 'weight', 'time', 'id']:
+            np.testing.assert_array_equal(composites[0][name], composites[1][name])
+
+    def test_make_composite_incremental(self):
+        """Test that merging the scenes as they arrive gives the same composite as in one go."""
+        t_analysis = datetime(2019, 11, 5, 19, 0)
+        delta_t = timedelta(seconds=2100)
+        arrived = [self.pps_scenes[2], self.msg_scenes[0], self.pps_scenes[0], self.pps_scenes[5],
+                   self.msg_scenes[1], self.pps_scenes[1], self.pps_scenes[3]]
+
+        def make_composite(scenes, options):
+            ctthcomp = ctthComposite(t_analysis, delta_t, 'mesanEx', options)
+            ctthcomp.pps_scenes = sorted(scene for scene in scenes if scene in self.pps_scenes)
+            ctthcomp.msg_scenes = sorted(scene for scene in scenes if scene in self.msg_scenes)
+            ctthcomp.composite = MagicMock()
+            self.assertTrue(ctthcomp.make_composite())
+            return ctthcomp.composite.store.call_args[0][0]
+
+        state_dir = tempfile.mkdtemp()
+        try:
+            with patch('mesan_compositer.make_ctth_composite.get_scene_ctth',
+                       side_effect=fake_scene_ctth) as get_scene:
+                for idx in range(1, len(arrived) + 1):
+                    incremental = make_composite(arrived[:idx],
+                                                 dict(CONFIG_OPTIONS, composite_state_dir=state_dir))
+                self.assertEqual(get_scene.call_count, len(arrived))
+                expected = make_composite(arrived, CONFIG_OPTIONS)
+        finally:
+            shutil.rmtree(state_dir)
+
+        for name in ['temperature', 'pressure', 'height', 'flag', 'weight', 'time', 'id']:
+            np.testing.assert_array_equal(incremental[name], expected[name])
+
+    @patch('mesan_compositer.make_ctth_composite.ctth_pps', fake_ctth_pps)
+    @patch('mesan_compositer.make_ctth_composite.ctth_msg', fake_ctth_msg)
+    def test_make_composite_tiled(self):
+        """Test that the tiled composite is the same as the one made in one go."""
+        t_analysis = datetime(2019, 11, 5, 19, 0)
+        delta_t = timedelta(seconds=2100)
+
+        composites = []
+        for tile_rows in [0, 16]:
+            options = dict(CONFIG_OPTIONS, composite_tile_rows=tile_rows)
+            ctthcomp = ctthComposite(t_analysis, delta_t, 'mesanEx', options)
+            ctthcomp.pps_scenes = [scene for scene in self.pps_scenes
+                                   if scene.uri != '/tmp/my_bad_pps_testfile.nc']
+            ctthcomp.msg_scenes = self.msg_scenes
+            ctthcomp.composite = MagicMock()
+            self.assertTrue(ctthcomp.make_composite())
+            composites.append(ctthcomp.composite.store.call_args[0][0])
+
+        for name in ['temperature', 'pressure', 'height', 'flag', 'weight', 'time', 'id']:
+            self.assertEqual(composites[1][name].chunks[0], (16, 16, 8))
+            tiled = composites[1][name].compute()
+            self.assertEqual(tiled.dtype, composites[0][name].dtype)
+            np.testing.assert_array_equal(tiled, composites[0][name])
+
+
+def suite():
+    """Perform the unit testing for the CTTH composite generation."""
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestctthComposite))
+
+    return mysuite
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2026 Adam.Dybbroe
+
+# Author(s):
+
+#   Adam.Dybbroe <adam.dybbroe@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the shared store of reprojected MSG slots."""
+
+import os
+import sys
+import tempfile
+import shutil
+import unittest
+from datetime import datetime
+
+import numpy as np
+import xarray as xr
+import dask.array as da
+from pyresample.geometry import AreaDefinition
+
+from mesan_compositer.composite_tools import MsgMetaData
+from mesan_compositer.make_ct_composite import ctype_msg
+from mesan_compositer.make_ctth_composite import ctth_msg
+from mesan_compositer.msg_store import get_msg_slot_files, MSG_DATASETS
+
+if sys.version_info < (3,):
+    from mock import patch
+else:
+    from unittest.mock import patch
+
+TARGET = AreaDefinition('mesanEx', 'mesanEx', 'mesanEx',
+                        {'proj': 'stere', 'lat_0': 90, 'lon_0': 14,
+                         'lat_ts': 60, 'ellps': 'WGS84'},
+                        50, 40, (-800000, -4200000, 800000, -3000000))
+
+
+class FakeScene(object):
+    """Fake Scene, resampling to the test area."""
+
+    instances = []
+
+    def __init__(self, filenames=None, reader=None):
+        """Initialize the fake scene."""
+        self.filenames = filenames
+        self.loaded = []
+        FakeScene.instances.append(self)
+
+    def load(self, names):
+        """Load the datasets."""
+        self.loaded += names
+
+    def resample(self, areaid, **kwargs):
+        """Resample the datasets."""
+        return dict((name, xr.DataArray(da.full(TARGET.shape, idx, dtype=np.uint16), dims=('y', 'x'),
+                                        attrs={'area': TARGET, 'name': name}))
+                    for idx, name in enumerate(self.loaded))
+
+
+class TestMsgStore(unittest.TestCase):
+    """Test that an MSG slot is loaded and reprojected once for the CT and CTTH."""
+
+    def setUp(self):
+        """Set up the CT and CTTH files of an MSG slot."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.store_dir = os.path.join(self.tmpdir, 'store')
+        self.files = {}
+        for product in MSG_DATASETS:
+            self.files[product] = os.path.join(
+                self.tmpdir, 'SAFNWC_MSG4_%s201911051900_MSG-N.PLAX.CTTH.0.h5' % product)
+            open(self.files[product], 'w').close()
+        self.msg = MsgMetaData(self.files['CT___'], platform_name='Meteosat-11',
+                               areaid='MSG-N', timeslot=datetime(2019, 11, 5, 19, 0))
+        FakeScene.instances = []
+
+    def test_get_msg_slot_files(self):
+        """Test finding the CT and CTTH files of a slot."""
+        self.assertEqual(get_msg_slot_files(self.files['CTTH_']), self.files)
+        os.remove(self.files['CTTH_'])
+        self.assertEqual(get_msg_slot_files(self.files['CT___']), {'CT___': self.files['CT___']})
+
+    @patch('satpy.scene.Scene', new=FakeScene)
+    def test_load_once(self):
+        """Test that the CT and CTTH of a slot come from one Scene."""
+        ctype = ctype_msg(self.msg, 'mesanEx', store_dir=self.store_dir)
+        ctth = ctth_msg(self.msg, 'mesanEx', store_dir=self.store_dir)
+
+        self.assertEqual(len(FakeScene.instances), 1)
+        self.assertEqual(sorted(FakeScene.instances[0].filenames), sorted(self.files.values()))
+        self.assertEqual(len(os.listdir(self.store_dir)), 1)
+
+        self.assertEqual(sorted(ctype), ['ct', 'ct_quality'])
+        self.assertEqual(sorted(ctth), ['ctth_alti', 'ctth_pres', 'ctth_quality', 'ctth_tempe'])
+        self.assertEqual(ctth['ctth_alti'].area, TARGET)
+        expected = FakeScene.instances[0].loaded.index('ctth_pres')
+        np.testing.assert_array_equal(ctth['ctth_pres'].values, expected)
+
+    @patch('satpy.scene.Scene', new=FakeScene)
+    def test_prune_store(self):
+        """Test that the slots much older than the one stored are removed."""
+        os.makedirs(self.store_dir)
+        old = ['Meteosat-11_201911051200_MSG-N_mesanEx.npz', 'Meteosat-11_201911051259_MSG-N_mesanEx.npz']
+        kept = ['Meteosat-11_201911051300_MSG-N_mesanEx.npz', 'Meteosat-11_201911052000_MSG-N_mesanEx.npz',
+                'README']
+        for bname in old + kept:
+            open(os.path.join(self.store_dir, bname), 'w').close()
+
+        ctype_msg(self.msg, 'mesanEx', store_dir=self.store_dir)
+        self.assertEqual(sorted(os.listdir(self.store_dir)),
+                         sorted(kept + ['Meteosat-11_201911051900_MSG-N_mesanEx.npz']))
+
+    def tearDown(self):
+        """Clean up."""
+        shutil.rmtree(self.tmpdir)
+
+
+def suite():
+    """Run all the tests for the MSG store."""
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestMsgStore))
+
+    return mysuite
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2026 Adam.Dybbroe
+
+# Author(s):
+
+#   Adam.Dybbroe <adam.dybbroe@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test writing and reading the netCDF composite files."""
+
+import os
+import tempfile
+import shutil
+import unittest
+
+import dask.array as da
+import numpy as np
+from mock import patch
+from netCDF4 import Dataset
+from pyresample.geometry import AreaDefinition
+
+from mesan_compositer.netcdf_io import ncCTTHComposite
+from mesan_compositer.utils import link_or_copy
+
+
+class FakeArea(object):
+    """Area definition with the proj4 parameters as strings, like older pyresample."""
+
+    def __init__(self, shape):
+        """Initialize the fake area."""
+        self._area = AreaDefinition('mesanEx', 'mesanEx', 'mesanEx',
+                                    {'proj': 'stere', 'lat_0': 90, 'lon_0': 14,
+                                     'lat_ts': 60, 'ellps': 'WGS84'},
+                                    shape[1], shape[0], (-800000, -4200000, 800000, -3000000))
+        self.shape = shape
+        self.proj_dict = dict((key, str(val)) for key, val in self._area.proj_dict.items())
+
+    def get_proj_vectors(self):
+        """Get the projection coordinate vectors."""
+        return self._area.get_proj_vectors()
+
+
+def make_ctth_composite(shape):
+    """Make a CTTH composite with random data."""
+    rng = np.random.default_rng(0)
+    comp = {'temperature': rng.uniform(200.0, 300.0, shape),
+            'height': rng.uniform(0.0, 12000.0, shape),
+            'pressure': rng.uniform(100.0, 1000.0, shape),
+            'weight': rng.random(shape),
+            'flag': rng.integers(0, 2**16, shape).astype(np.int32),
+            'id': rng.integers(0, 2, shape).astype(np.uint8),
+            'time': 1.5e9 + rng.integers(0, 3600, shape).astype(np.float64)}
+    comp['height'][:10] = np.nan
+    return comp
+
+
+class TestWriteComposite(unittest.TestCase):
+    """Test writing and reading the composites."""
+
+    def setUp(self):
+        """Set up a temporary directory."""
+        self.tmpdir = tempfile.mkdtemp()
+
+    def test_write_ctth(self):
+        """Test that the CTTH composite is written in one go with all variables."""
+        shape = (40, 50)
+        comp = make_ctth_composite(shape)
+        ctth = ncCTTHComposite()
+        ctth.store(comp, FakeArea(shape))
+        filename = os.path.join(self.tmpdir, 'ctth.nc')
+        ctth.write(filename)
+
+        with Dataset(filename) as rootgrp:
+            self.assertEqual(rootgrp.Conventions, 'Undefined')
+            self.assertTrue(rootgrp.history.startswith('Created by mesan_compositor'))
+            for name, key in [('temperature', 'temperature'), ('height', 'height'),
+                              ('pressure', 'pressure'), ('weight', 'weight'),
+                              ('flags', 'flag'), ('id', 'id'), ('time', 'time')]:
+                var = rootgrp.variables[name]
+                self.assertEqual(var.filters()['complevel'], 4)
+                self.assertEqual(var.chunking(), list(shape))
+                np.testing.assert_array_equal(np.ma.filled(var[:], np.nan), comp[key])
+                self.assertEqual(var.grid_mapping, 'area')
+
+    def test_write_ctth_compact(self):
+        """Test that the compact time and id are decoded on load, and the weight is left as it is."""
+        shape = (40, 50)
+        comp = make_ctth_composite(shape)
+        filename = os.path.join(self.tmpdir, 'ctth.nc')
+        ctth = ncCTTHComposite(compact=True)
+        ctth.store(comp, FakeArea(shape))
+        ctth.write(filename)
+
+        with Dataset(filename) as rootgrp:
+            self.assertEqual(rootgrp.variables['time'].dtype, np.int16)
+            self.assertEqual(rootgrp.variables['weight'].dtype, comp['weight'].dtype)
+            self.assertEqual(rootgrp.variables['id'].dtype, np.uint8)
+
+        ctth = ncCTTHComposite()
+        ctth.load(filename)
+        np.testing.assert_array_equal(ctth.time.data, comp['time'])
+        np.testing.assert_array_equal(ctth.id.data, comp['id'])
+        np.testing.assert_array_equal(ctth.weight.data, comp['weight'])
+        self.assertEqual(np.ma.count_masked(ctth.weight.data), 0)
+        np.testing.assert_allclose(ctth.time.info['valid_range'],
+                                   [comp['time'].min(), comp['time'].max()])
+        np.testing.assert_array_equal(ctth.height.data.mask, np.isnan(comp['height']))
+
+    def test_write_ctth_tiled(self):
+        """Test that a tiled composite is written block by block, as the whole one."""
+        shape = (40, 50)
+        comp = make_ctth_composite(shape)
+        for compact in [False, True]:
+            filenames = []
+            for tiled in [False, True]:
+                ctth = ncCTTHComposite(compact=compact)
+                if tiled:
+                    ctth.store(dict((name, da.from_array(data, chunks=(16, 50)))
+                                    for name, data in comp.items()), FakeArea(shape))
+                else:
+                    ctth.store(dict((name, data.copy()) for name, data in comp.items()), FakeArea(shape))
+                filenames.append(os.path.join(self.tmpdir, 'ctth_%s_%s.nc' % (compact, tiled)))
+                ctth.write(filenames[-1])
+
+            with Dataset(filenames[0]) as whole, Dataset(filenames[1]) as tiled:
+                for name in ['temperature', 'height', 'pressure', 'weight', 'flags', 'id', 'time']:
+                    self.assertEqual(tiled.variables[name].chunking(), [16, 50])
+                    self.assertEqual(tiled.variables[name].dtype, whole.variables[name].dtype)
+                    np.testing.assert_array_equal(tiled.variables[name][:], whole.variables[name][:])
+                    self.assertEqual(sorted(tiled.variables[name].ncattrs()),
+                                     sorted(whole.variables[name].ncattrs()))
+                    for attr in whole.variables[name].ncattrs():
+                        np.testing.assert_array_equal(tiled.variables[name].getncattr(attr),
+                                                      whole.variables[name].getncattr(attr))
+
+    def test_load_variables(self):
+        """Test loading only some of the variables of a composite."""
+        shape = (40, 50)
+        comp = make_ctth_composite(shape)
+        filename = os.path.join(self.tmpdir, 'ctth.nc')
+        ctth = ncCTTHComposite()
+        ctth.store(comp, FakeArea(shape))
+        ctth.write(filename)
+
+        ctth = ncCTTHComposite()
+        with patch('pyresample.geometry.AreaDefinition', wraps=AreaDefinition) as area_def:
+            ctth.load(filename, var_names=['flags', 'weight'])
+        self.assertEqual(area_def.call_count, 1)
+        self.assertEqual(ctth.area_def.shape, shape)
+        np.testing.assert_array_equal(ctth.flags.data, comp['flag'])
+        np.testing.assert_array_equal(ctth.weight.data, comp['weight'])
+        self.assertIsNone(ctth.height.data)
+        self.assertIsNone(ctth.time.data)
+
+    def test_link_or_copy(self):
+        """Test that the timestamped twin shares the content of the composite file."""
+        src = os.path.join(self.tmpdir, 'composite.nc')
+        dst = os.path.join(self.tmpdir, 'composite_20191105190000.nc')
+        with open(src, 'w') as fpt:
+            fpt.write('composite')
+        link_or_copy(src, dst)
+        self.assertTrue(os.path.samefile(src, dst))
+        os.remove(src)
+        with open(dst) as fpt:
+            self.assertEqual(fpt.read(), 'composite')
+
+    def tearDown(self):
+        """Clean up."""
+        shutil.rmtree(self.tmpdir)
+
+
+def suite():
+    """Run all the tests for the netCDF composite files."""
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestWriteComposite))
+
+    return mysuite
@@ -24,8 +24,11 @@
 """
 
 from nwcsaf_formats.pps_conversions import (map_cloudtypes,
+                                            map_cloudtypes_classwise,
                                             ctype_convert_flags,
                                             ctth_convert_flags,
+                                            ctype_convert_flags_bitwise,
+                                            ctth_convert_flags_bitwise,
                                             old_processing_flag_palette
                                             )
 from mesan_compositer.pps_msg_conversions import (get_bit_from_flags,
@@ -33,6 +36,8 @@ from mesan_compositer.pps_msg_conversions import (get_bit_from_flags,
                                                   value2bits)
 import unittest
 import numpy as np
+import dask.array as da
+import xarray as xr
 
 
 CTYPES_2012 = np.array(
@@ -41,6 +46,29 @@ CTYPES_2014 = np.array(
     [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 11, 12, 13, 14, 10, 255], np.uint8)
 
 
+def assert_same_as_bitwise(testcase, convert_flags, convert_flags_bitwise):
+    """Check that the flag conversion gives the same as the bitwise one, for
+    numpy, dask and xarray flags"""
+    rng = np.random.default_rng(0)
+    for dtype in ['int32', 'int16', 'uint16']:
+        flags = [rng.integers(0, 2 ** 15, size=(60, 70)).astype(dtype) for i in range(3)]
+        expected = convert_flags_bitwise(*flags)
+
+        res = convert_flags(*flags)
+        testcase.assertEqual(res.dtype, expected.dtype)
+        np.testing.assert_array_equal(res, expected)
+
+        res = convert_flags(*[da.from_array(flag, chunks=25) for flag in flags])
+        testcase.assertIsInstance(res, da.Array)
+        np.testing.assert_array_equal(res.compute(), expected)
+
+        res = convert_flags(*[xr.DataArray(da.from_array(flag, chunks=25), dims=('y', 'x'))
+                              for flag in flags])
+        testcase.assertIsInstance(res, xr.DataArray)
+        testcase.assertIsInstance(res.data, da.Array)
+        np.testing.assert_array_equal(res.values, expected)
+
+
 class TestCtypeConversions(unittest.TestCase):
 
     """Unit testing the functions to convert from new pps format content to
@@ -56,6 +84,25 @@ class TestCtypeConversions(unittest.TestCase):
         res = map_cloudtypes(CTYPES_2014)
         self.assertEqual(res.tolist(), CTYPES_2012.tolist())
 
+    def test_map_cloudtypes_table(self):
+        """Test the table mapping of all uint8 cloudtypes against the class wise one"""
+
+        newctype = np.arange(256, dtype=np.uint8).reshape((16, 16))
+        expected = map_cloudtypes_classwise(newctype)
+
+        res = map_cloudtypes(newctype)
+        self.assertEqual(res.dtype, np.uint8)
+        np.testing.assert_array_equal(res, expected)
+        np.testing.assert_array_equal(newctype.ravel(), np.arange(256))
+
+        res = map_cloudtypes(da.from_array(newctype, chunks=5))
+        self.assertIsInstance(res, da.Array)
+        np.testing.assert_array_equal(res.compute(), expected)
+
+        res = map_cloudtypes(newctype, inplace=True)
+        self.assertIs(res, newctype)
+        np.testing.assert_array_equal(newctype, expected)
+
     def test_map_cloudtype_flags(self):
         """Test mapping the flags from new to old cloudtype"""
 
@@ -92,6 +139,10 @@ class TestCtypeConversions(unittest.TestCase):
         bits = get_bit_from_flags(res[0], range(3))
         np.testing.assert_allclose(bits, np.array([0, 0, 1], dtype=np.int8))
 
+    def test_map_cloudtype_flags_table(self):
+        """Test the table conversion of the cloudtype flags against the bitwise one"""
+        assert_same_as_bitwise(self, ctype_convert_flags, ctype_convert_flags_bitwise)
+
     def tearDown(self):
         """Clean up"""
         return
@@ -181,6 +232,10 @@ class TestCtthConversions(unittest.TestCase):
                              1, 0, 0, 0, 0, 0, 1, 1], dtype=np.int8)
         np.testing.assert_allclose(bits, expected)
 
+    def test_map_ctth_flags_table(self):
+        """Test the table conversion of the ctth flags against the bitwise one"""
+        assert_same_as_bitwise(self, ctth_convert_flags, ctth_convert_flags_bitwise)
+
     def tearDown(self):
         """Clean up"""
         return
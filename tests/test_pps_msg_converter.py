@@ -25,6 +25,8 @@
 
 from mesan_compositer.pps_msg_conversions import (ctype_procflags2pps,
                                                   ctth_procflags2pps,
+                                                  ctype_procflags2pps_bitwise,
+                                                  ctth_procflags2pps_bitwise,
                                                   get_bit_from_flags)
 
 import unittest
@@ -348,6 +350,20 @@ class TestFlagConversions(unittest.TestCase):
                    0, 0, 0, 0, 0, 0, 1, 1]
         np.testing.assert_allclose(bits, ppsbits)
 
+    def test_procflags2pps_tables(self):
+        """Test that the table conversions are the same as the bitwise ones
+        for all 16 bit flag values"""
+        data = np.arange(65536, dtype='int32').reshape((256, 256))
+        for func, func_bitwise in [(ctype_procflags2pps, ctype_procflags2pps_bitwise),
+                                   (ctth_procflags2pps, ctth_procflags2pps_bitwise)]:
+            res = func(data)
+            expected = func_bitwise(data)
+            self.assertEqual(res.dtype, expected.dtype)
+            np.testing.assert_array_equal(res, expected)
+
+            data_h = (data - 32768).astype('h')
+            np.testing.assert_array_equal(func(data_h), func_bitwise(data_h))
+
     def tearDown(self):
         """Clean up"""
         return
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2026 Adam.Dybbroe
+
+# Author(s):
+
+#   Adam.Dybbroe <adam.dybbroe@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the message handling of the runner."""
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from glob import glob
+
+from posttroll.message import Message
+
+from mesan_compositer import mesan_composite_runner as runner
+from mesan_compositer.catalogue import SceneCatalogue, get_catalogue_scenes
+from mesan_compositer.composite_tools import get_ppslist, get_msglist
+from mesan_compositer.mesan_composite_runner import async_live_runner, check_message, get_composite_job
+from mesan_compositer.mesan_composite_runner import fill_scene_catalogue
+from mesan_compositer.scheduler import get_job_key
+from mesan_compositer.utils import clear_host_cache
+from tests.test_catalogue import make_files, touch
+
+if sys.version_info < (3,):
+    from mock import patch, MagicMock
+else:
+    from unittest.mock import patch, MagicMock
+
+POLAR_SATELLITES = ['NOAA-20', 'Metop-B', 'NOAA-19', 'Suomi-NPP']
+
+
+def get_pps_message(product='CT', orbit=37011):
+    """Get a message announcing a PPS product file of a Metop-B scene."""
+    bname = 'S_NWC_%s_metopb_%05d_20191105T1923325Z_20191105T1937123Z.nc' % (product, orbit)
+    return Message('/CF/2', 'file', {'uri': 'ssh://localhost/data/pps/' + bname, 'uid': bname,
+                                     'platform_name': 'Metop-B', 'orbit_number': orbit,
+                                     'sensor': 'avhrr/3',
+                                     'start_time': datetime(2019, 11, 5, 19, 23, 32, 500000),
+                                     'end_time': datetime(2019, 11, 5, 19, 37, 12, 300000)})
+
+
+def get_msg_message(product='CTTH_'):
+    """Get a message announcing an NWCSAF/Geo product file."""
+    bname = 'SAFNWC_MSG4_%s201911051900_MSG-N.PLAX.CTTH.0.h5' % product
+    return Message('/2/nwcsaf-msg/0deg/ctth-plax-corrected', 'file',
+                   {'uri': 'ssh://localhost/data/msg/' + bname, 'uid': bname,
+                    'platform_name': 'Meteosat-11', 'sensor': 'seviri', 'pge': product.strip('_'),
+                    'nominal_time': datetime(2019, 11, 5, 19, 0),
+                    'end_time': datetime(2019, 11, 5, 19, 15)})
+
+
+def fake_ctype_composite_worker(scene, job_id, publish_q, config_options, scene_catalogue=None):
+    """Fake cloud type composite job."""
+    return 'composite of ' + scene['filename']
+
+
+class FakeExecutorPool(object):
+    """Fake executor pool, running the jobs on the event loop."""
+
+    def __init__(self, event_loop, processes, config_options, max_jobs=None, max_memory=None):
+        """Initialize the fake pool."""
+        self.event_loop = event_loop
+        self.jobs = []
+
+    def apply_async(self, func, args, callback=None, error_callback=None):
+        """Run the job."""
+        self.jobs.append(args)
+        self.event_loop.call_soon(callback, func(*args))
+
+    def shutdown(self, wait=True):
+        """Shut down."""
+
+
+class TestRunner(unittest.TestCase):
+    """Test turning the messages into composite jobs."""
+
+    def setUp(self):
+        """Set up the runner globals."""
+        clear_host_cache()
+        self.patcher = patch.object(runner, 'POLAR_SATELLITES', POLAR_SATELLITES, create=True)
+        self.patcher.start()
+
+    def test_check_message(self):
+        """Test checking the platform and the host of the file."""
+        self.assertTrue(check_message(get_pps_message()))
+        self.assertTrue(check_message(get_msg_message()))
+        msg = get_pps_message()
+        msg.data['platform_name'] = 'NOAA-18'
+        self.assertFalse(check_message(msg))
+        self.assertFalse(check_message(get_pps_message(), url_ip='10.255.255.1'))
+
+    def test_get_composite_job(self):
+        """Test getting the jobs of the CT and CTTH scenes, and of a scene seen already."""
+        composite_files = {}
+        jobs_dict = {}
+        keyname, job = get_composite_job(get_pps_message(), composite_files, jobs_dict, 'mesanEx')
+        self.assertEqual(keyname, 'CT_Metop-B_37011_201911051923')
+        self.assertIn(keyname, jobs_dict)
+        job_key, worker, scene = job
+        self.assertEqual(job_key, get_job_key('CT', datetime(2019, 11, 5, 20), 'mesanEx'))
+        self.assertIs(worker, runner.ctype_composite_worker)
+        self.assertEqual(scene['filename'], '/data/pps/' + get_pps_message().data['uid'])
+        self.assertEqual((scene['platform_name'], scene['orbit_number'], scene['product']),
+                         ('Metop-B', 37011, 'CT'))
+
+        # The same scene again:
+        self.assertEqual(get_composite_job(get_pps_message(), composite_files, jobs_dict, 'mesanEx'),
+                         (None, None))
+
+        keyname, job = get_composite_job(get_msg_message(), composite_files, jobs_dict, 'mesanEx')
+        self.assertEqual(keyname, 'CTTH_Meteosat-11_00000_201911051900')
+        job_key, worker, scene = job
+        self.assertEqual(job_key, get_job_key('CTTH', datetime(2019, 11, 5, 19), 'mesanEx'))
+        self.assertIs(worker, runner.ctth_composite_worker)
+        self.assertEqual(scene['orbit_number'], '00000')
+
+    def test_unsupported_product(self):
+        """Test that a scene of an unsupported product is registered, but gives no job."""
+        jobs_dict = {}
+        keyname, job = get_composite_job(get_pps_message('CMA'), {}, jobs_dict, 'mesanEx')
+        self.assertEqual(keyname, 'CMA_Metop-B_37011_201911051923')
+        self.assertIsNone(job)
+        self.assertIn(keyname, jobs_dict)
+
+    @patch.object(runner, 'ctype_composite_worker', fake_ctype_composite_worker)
+    @patch('mesan_compositer.mesan_composite_runner.refresh_local_ips')
+    @patch('mesan_compositer.mesan_composite_runner.Publish')
+    @patch('posttroll.subscriber.Subscribe')
+    def test_async_live_runner(self, subscribe, publish, refresh_local_ips):
+        """Test that the asyncio runner makes one composite job of the scenes, and publishes the result."""
+        stopped = []
+
+        def recv(timeout=None):
+            for msg in [get_pps_message(orbit=37011), get_pps_message('CMA'), None,
+                        get_pps_message(orbit=37012)]:
+                yield msg
+            while not stopped:
+                time.sleep(0.01)
+                yield None
+
+        subscribe.return_value.__enter__.return_value.recv = recv
+        publisher = MagicMock()
+        publish.return_value.__enter__.return_value = publisher
+        pools = []
+
+        def get_pool(*args, **kwargs):
+            pools.append(FakeExecutorPool(*args, **kwargs))
+            return pools[-1]
+
+        async def run_runner():
+            task = asyncio.ensure_future(async_live_runner({'job_settle_seconds': 0.5, 'job_horizon_hours': 0,
+                                                           'runner_workers': 2, 'network_check_seconds': 0.1}))
+            for _ in range(500):
+                if publisher.send.called:
+                    break
+                await asyncio.sleep(0.01)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+        try:
+            with patch.object(runner, 'ExecutorPool', side_effect=get_pool):
+                asyncio.run(run_runner())
+        finally:
+            stopped.append(True)
+
+        self.assertEqual(len(pools[0].jobs), 1)
+        scene, job_id, publish_q, config_options, scene_catalogue = pools[0].jobs[0]
+        self.assertEqual(scene['orbit_number'], 37012)
+        self.assertIsNone(publish_q)
+        publisher.send.assert_called_once_with('composite of ' + scene['filename'])
+        self.assertTrue(refresh_local_ips.called)
+
+    def test_fill_scene_catalogue(self):
+        """Test that the scene catalogue of a restarted runner has the scenes on disk."""
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        datadir = os.path.join(tmpdir, 'data')
+        gds_dir = os.path.join(tmpdir, 'gds')
+        os.mkdir(datadir)
+        os.mkdir(gds_dir)
+        now = datetime.utcnow().replace(second=0, microsecond=0)
+        make_files(datadir, now - timedelta(hours=7), 48)
+        gds_start = now - timedelta(hours=2)
+        gds_file = touch(gds_dir, 'S_NWC_CT_metopb_37011_%sZ_%sZ.nc' % (
+            gds_start.strftime('%Y%m%dT%H%M%S0'), (gds_start + timedelta(minutes=3)).strftime('%Y%m%dT%H%M%S0')))
+
+        scene_catalogue = SceneCatalogue(gds_dir)
+        fill_scene_catalogue(scene_catalogue, {'pps_direct_readout_dir': datadir, 'pps_metop_gds_dir': gds_dir,
+                                               'msg_dir': datadir, 'msg_ctth_file_ext': 'PLAX.CTTH.0.h5'})
+
+        # Only the scenes of the last six hours:
+        self.assertEqual(len(scene_catalogue.get_pps_scenes('CT', (now - timedelta(hours=8), now))), 36)
+        time_window = (now - timedelta(hours=3), now - timedelta(hours=1))
+        pps_scenes, msg_scenes = get_catalogue_scenes(scene_catalogue, 'CT', time_window,
+                                                      POLAR_SATELLITES, 'MSG-N')
+        expected = get_ppslist(glob(os.path.join(datadir, 'S_NWC_CT_*nc')), time_window,
+                               satellites=POLAR_SATELLITES)
+        self.assertTrue(len(expected) > 0)
+        self.assertEqual(sorted(scene.uri for scene in pps_scenes), sorted(scene.uri for scene in expected))
+        expected = get_msglist(glob(os.path.join(datadir, '*_CT___*.PLAX.CTTH.0.h5')), time_window, 'MSG-N')
+        self.assertTrue(len(expected) > 0)
+        self.assertEqual(sorted(scene.uri for scene in msg_scenes), sorted(scene.uri for scene in expected))
+        gds_scenes = scene_catalogue.get_pps_scenes('CT', time_window, variant='global')
+        self.assertEqual([scene.uri for scene in gds_scenes], [gds_file])
+
+    def tearDown(self):
+        """Clean up."""
+        self.patcher.stop()
+        clear_host_cache()
+
+
+def suite():
+    """Run all the tests for the runner."""
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestRunner))
+
+    return mysuite
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2026 Adam.Dybbroe
+
+# Author(s):
+
+#   Adam.Dybbroe <adam.dybbroe@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the scheduling of the composite jobs."""
+
+import asyncio
+import sys
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from mesan_compositer.scheduler import AsyncJobScheduler, JobScheduler, get_job_key
+
+if sys.version_info < (3,):
+    from mock import patch
+else:
+    from unittest.mock import patch
+
+
+class FakePool(object):
+    """Fake process pool, keeping the jobs submitted."""
+
+    def __init__(self):
+        """Initialize the fake pool."""
+        self.jobs = []
+
+    def apply_async(self, func, args, callback=None, error_callback=None):
+        """Submit a job."""
+        self.jobs.append((func, args, callback))
+
+    def finish(self, idx, result=None):
+        """Finish the job number *idx*."""
+        self.jobs[idx][2](result)
+
+
+def ctype_job(*args):
+    """Fake CT job."""
+
+
+def ctth_job(*args):
+    """Fake CTTH job."""
+
+
+class TestJobScheduler(unittest.TestCase):
+    """Test the job scheduler."""
+
+    def setUp(self):
+        """Set up the scheduler."""
+        self.pool = FakePool()
+        self.scheduler = JobScheduler(self.pool, settle_delay=60)
+        self.ct_key = get_job_key('CT', datetime(2019, 11, 5, 19), 'mesanEx')
+        self.ctth_key = get_job_key('CTTH', datetime(2019, 11, 5, 19), 'mesanEx')
+
+    @patch('mesan_compositer.scheduler.monotonic')
+    def test_coalesce(self, monotonic):
+        """Test that the jobs asked for during the settle delay make one job."""
+        monotonic.return_value = 0
+        self.scheduler.schedule(self.ct_key, ctype_job, ('scene1',))
+        monotonic.return_value = 30
+        self.scheduler.schedule(self.ct_key, ctype_job, ('scene2',))
+        self.scheduler.schedule(self.ctth_key, ctth_job, ('scene2',))
+        self.assertEqual(self.scheduler.start_due_jobs(), 60)
+        self.assertEqual(self.pool.jobs, [])
+
+        monotonic.return_value = 89
+        self.assertEqual(self.scheduler.start_due_jobs(), 1)
+        self.assertEqual(self.pool.jobs, [])
+
+        monotonic.return_value = 90
+        self.assertIsNone(self.scheduler.start_due_jobs())
+        self.assertEqual(sorted((func.__name__, args) for func, args, callback in self.pool.jobs),
+                         [('ctth_job', ('scene2',)), ('ctype_job', ('scene2',))])
+
+    @patch('mesan_compositer.scheduler.monotonic')
+    def test_one_job_per_key(self, monotonic):
+        """Test that a job is not started while the previous one of the same key is running."""
+        monotonic.return_value = 0
+        self.scheduler.schedule(self.ct_key, ctype_job, ('scene1',))
+        monotonic.return_value = 60
+        self.scheduler.start_due_jobs()
+        self.assertEqual(len(self.pool.jobs), 1)
+
+        self.scheduler.schedule(self.ct_key, ctype_job, ('scene2',))
+        self.scheduler.schedule(self.ct_key, ctype_job, ('scene3',))
+        monotonic.return_value = 200
+        self.assertIsNone(self.scheduler.start_due_jobs())
+        self.assertEqual(len(self.pool.jobs), 1)
+
+        self.pool.finish(0)
+        self.scheduler.start_due_jobs()
+        self.assertEqual(len(self.pool.jobs), 2)
+        self.assertEqual(self.pool.jobs[1][1], ('scene3',))
+
+    @patch('mesan_compositer.scheduler.monotonic')
+    def test_latest_first(self, monotonic):
+        """Test that no more jobs than workers are run, and the latest analysis time first."""
+        monotonic.return_value = 0
+        self.scheduler.max_running = 2
+        for hour in [15, 16, 19, 17, 18]:
+            self.scheduler.schedule(get_job_key('CT', datetime(2019, 11, 5, hour), 'mesanEx'),
+                                    ctype_job, (hour, ))
+        monotonic.return_value = 60
+        self.scheduler.start_due_jobs()
+        self.assertEqual([args for func, args, callback in self.pool.jobs], [(19, ), (18, )])
+        self.assertEqual(self.scheduler.get_queue_depth(), (3, 2))
+
+        # The current analysis time goes before the older ones waiting:
+        self.scheduler.schedule(get_job_key('CTTH', datetime(2019, 11, 5, 19), 'mesanEx'),
+                                ctth_job, (19, ))
+        monotonic.return_value = 120
+        self.pool.finish(1)
+        self.scheduler.start_due_jobs()
+        self.pool.finish(0)
+        self.scheduler.start_due_jobs()
+        self.assertEqual([args for func, args, callback in self.pool.jobs[2:]], [(19, ), (17, )])
+        self.assertEqual(self.scheduler.get_queue_depth(), (2, 2))
+
+    def test_horizon(self):
+        """Test that jobs older than the horizon are dropped."""
+        now = datetime.utcnow()
+        self.scheduler.settle_delay = 0
+        self.scheduler.horizon = timedelta(hours=3)
+        self.scheduler.schedule(get_job_key('CT', now - timedelta(hours=4), 'mesanEx'), ctype_job, ('old', ))
+        self.scheduler.schedule(get_job_key('CT', now, 'mesanEx'), ctype_job, ('new', ))
+        self.scheduler.start_due_jobs()
+        self.assertEqual([args for func, args, callback in self.pool.jobs], [('new', )])
+        self.assertEqual(self.scheduler.get_queue_depth(), (0, 1))
+
+    def test_failed_job(self):
+        """Test that the next job of a key is started after a failed one."""
+        self.scheduler.settle_delay = 0
+        self.scheduler.schedule(self.ct_key, ctype_job, ('scene1',))
+        self.scheduler.start_due_jobs()
+        self.scheduler.schedule(self.ct_key, ctype_job, ('scene2',))
+        self.scheduler._job_failed(self.ct_key, IOError('No such file'))
+        self.scheduler.start_due_jobs()
+        self.assertEqual(len(self.pool.jobs), 2)
+
+    def test_run(self):
+        """Test that the scheduler thread starts the jobs."""
+        self.scheduler.settle_delay = 0
+        self.scheduler.start()
+        self.scheduler.schedule(self.ct_key, ctype_job, ('scene1',))
+        for _ in range(500):
+            if self.pool.jobs:
+                break
+            time.sleep(0.01)
+        self.scheduler.stop()
+        self.scheduler.join(5)
+        self.assertFalse(self.scheduler.is_alive())
+        self.assertEqual(len(self.pool.jobs), 1)
+
+
+class TestAsyncJobScheduler(unittest.TestCase):
+    """Test the job scheduler driven by an event loop."""
+
+    def test_event_loop(self):
+        """Test that the jobs are started and their results handed over on the event loop."""
+        pool = FakePool()
+        results = []
+        ct_key = get_job_key('CT', datetime(2019, 11, 5, 19), 'mesanEx')
+
+        async def run_jobs():
+            scheduler = AsyncJobScheduler(asyncio.get_running_loop(), pool, settle_delay=0.05,
+                                          result_callback=results.append)
+            scheduler.schedule(ct_key, ctype_job, ('scene1',))
+            scheduler.schedule(ct_key, ctype_job, ('scene2',))
+            await asyncio.sleep(0.01)
+            self.assertEqual(pool.jobs, [])
+            await asyncio.sleep(0.2)
+            self.assertEqual([args for func, args, callback in pool.jobs], [('scene2',)])
+
+            scheduler.schedule(ct_key, ctype_job, ('scene3',))
+            pool.finish(0, 'message')
+            await asyncio.sleep(0.2)
+            scheduler.stop()
+            return scheduler.get_queue_depth()
+
+        self.assertEqual(asyncio.run(run_jobs()), (0, 1))
+        self.assertEqual(len(pool.jobs), 2)
+        self.assertEqual(results, ['message'])
+
+
+def suite():
+    """Run all the tests for the job scheduler."""
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestJobScheduler))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestAsyncJobScheduler))
+
+    return mysuite
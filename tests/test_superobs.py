@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2026 Adam.Dybbroe
+
+# Author(s):
+
+#   Adam.Dybbroe <adam.dybbroe@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the derivation of super observations from the composites."""
+
+import os
+import tempfile
+import shutil
+import unittest
+import numpy as np
+
+from pyresample.geometry import AreaDefinition
+from mesan_compositer.composite_tools import (get_superobs_blocks,
+                                              get_superobs_geometry,
+                                              get_superobs_midpoints)
+from mesan_compositer.netcdf_io import InfoObject
+from mesan_compositer import prt_nwcsaf_cloudamount
+from mesan_compositer import prt_nwcsaf_cloudheight
+
+
+class FakeArea(object):
+    """Fake area definition with a regular lon,lat grid."""
+
+    def __init__(self, shape):
+        """Initialize the fake area."""
+        self.shape = shape
+
+    def get_lonlats(self, data_slice=None):
+        """Get the longitudes and latitudes."""
+        lat, lon = np.meshgrid(np.linspace(70.0, 50.0, self.shape[0]),
+                               np.linspace(0.0, 30.0, self.shape[1]), indexing='ij')
+        if data_slice is not None:
+            return lon[data_slice], lat[data_slice]
+        return lon, lat
+
+
+class FakeComposite(object):
+    """Fake composite object."""
+
+    def __init__(self, area_def, **kwargs):
+        """Initialize the fake composite."""
+        self.area_def = area_def
+        for name, data in kwargs.items():
+            item = InfoObject()
+            item.data = data
+            setattr(self, name, item)
+
+
+def make_weights(shape, seed):
+    """Make a random field of realistic weights."""
+    rng = np.random.default_rng(seed)
+    values = np.array([0.0, 1.0, 0.95, 0.475, 0.9 * 0.95, 0.5, 0.65217391, 0.30978261])
+    return rng.choice(values, size=shape)
+
+
+class TestSuperObsBlocks(unittest.TestCase):
+    """Test the strided view of the super observation cells."""
+
+    def test_blocks(self):
+        """Test that the cells are the ones around each midpoint."""
+        arr = np.arange(50 * 43).reshape((50, 43))
+        for dlen, dx in [(12, 24), (3, 8)]:
+            lx, ly = get_superobs_midpoints(arr.shape, dlen, dx, dx)
+            blocks = get_superobs_blocks(arr, dlen, dx, dx)
+            self.assertEqual(blocks.shape, (len(ly), len(lx), 2 * dlen, 2 * dlen))
+            for iy, y in enumerate(ly):
+                for ix, x in enumerate(lx):
+                    np.testing.assert_array_equal(blocks[iy, ix],
+                                                  arr[y - dlen:y + dlen, x - dlen:x + dlen])
+
+
+class TestSuperObsGeometry(unittest.TestCase):
+    """Test the geometry of the super observations."""
+
+    def test_geometry(self):
+        """Test that the midpoints are the ones of the full grid."""
+        areas = [FakeArea((121, 98)),
+                 AreaDefinition('mesanEx', 'mesanEx', 'mesanEx',
+                                {'proj': 'stere', 'lat_0': 90, 'lon_0': 14, 'lat_ts': 60, 'ellps': 'WGS84'},
+                                98, 121, (-800000, -4200000, 800000, -3000000))]
+        for area in areas:
+            lon, lat = area.get_lonlats()
+            for npix, dlen, dx in [(24, 12, 24), (16, 8, 16), (5, 3, 8), (200, 100, 200)]:
+                geometry = get_superobs_geometry(area, npix, 4)
+                self.assertEqual((geometry['dlen'], geometry['dx'], geometry['dy']), (dlen, dx, dx))
+                lx, ly = get_superobs_midpoints(area.shape, dlen, dx, dx)
+                np.testing.assert_array_equal(geometry['lx'], lx)
+                np.testing.assert_array_equal(geometry['ly'], ly)
+                np.testing.assert_array_equal(geometry['lon'], lon[np.ix_(ly, lx)])
+                np.testing.assert_array_equal(geometry['lat'], lat[np.ix_(ly, lx)])
+                self.assertIs(get_superobs_geometry(area, npix, 4), geometry)
+
+
+class TestCloudAmount(unittest.TestCase):
+    """Test the cloud amount super observations."""
+
+    def setUp(self):
+        """Set up a fake cloud type composite."""
+        self.tmpdir = tempfile.mkdtemp()
+        shape = (121, 98)
+        rng = np.random.default_rng(1)
+        ctype = rng.integers(0, 21, size=shape).astype(np.uint8)
+        ctype[:30, :] = 255
+        ctype[60:, 50:] = 6
+        weight = make_weights(shape, 2)
+        weight[60:, 50:] = 0.95
+        self.comp = FakeComposite(FakeArea(shape), cloudtype=ctype, weight=weight)
+
+    def test_blockwise_is_same_as_cellwise(self):
+        """Test that the block wise super observations are identical to the cell wise ones."""
+        for ipar in ['71', '73', '74', '75']:
+            for npix in [24, 16, 5]:
+                result = []
+                for blockwise in [True, False]:
+                    filename = os.path.join(self.tmpdir, 'clamount_%s_%s.dat' % (blockwise, npix))
+                    prt_nwcsaf_cloudamount.derive_sobs(self.comp, ipar, npix, filename, blockwise=blockwise)
+                    with open(filename) as fpt:
+                        result.append(fpt.read())
+                self.assertTrue(len(result[0]) > 0)
+                self.assertEqual(result[0], result[1])
+
+    def tearDown(self):
+        """Clean up."""
+        shutil.rmtree(self.tmpdir)
+
+
+class TestCloudHeight(unittest.TestCase):
+    """Test the cloud height super observations."""
+
+    def setUp(self):
+        """Set up a fake cloud top height composite."""
+        self.tmpdir = tempfile.mkdtemp()
+        shape = (121, 98)
+        rng = np.random.default_rng(3)
+        height = rng.uniform(0.0, 12000.0, size=shape)
+        height[rng.random(shape) < 0.3] = np.nan
+        height[:30, :] = np.nan
+        height[60:90, 50:] = 0.0
+        flags = rng.integers(0, 2**16, size=shape).astype(np.int32)
+        flags[90:, :40] |= 1
+        weight = make_weights(shape, 4)
+        weight[40:60, 60:] = 0.0
+        self.comp = FakeComposite(FakeArea(shape), height=height, flags=flags, weight=weight)
+
+    def test_blockwise_is_same_as_cellwise(self):
+        """Test that the block wise super observations are identical to the cell wise ones."""
+        for npix in [24, 16, 5]:
+            result = []
+            for blockwise in [True, False]:
+                filename = os.path.join(self.tmpdir, 'cloudheight_%s_%s.dat' % (blockwise, npix))
+                prt_nwcsaf_cloudheight.derive_sobs(self.comp, npix, filename, blockwise=blockwise)
+                with open(filename) as fpt:
+                    result.append(fpt.read())
+            self.assertTrue(len(result[0]) > 0)
+            self.assertEqual(result[0], result[1])
+
+    def tearDown(self):
+        """Clean up."""
+        shutil.rmtree(self.tmpdir)
+
+
+def suite():
+    """Run all the tests for the super observations."""
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestSuperObsBlocks))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestSuperObsGeometry))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestCloudAmount))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestCloudHeight))
+
+    return mysuite
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2026 Adam.Dybbroe
+
+# Author(s):
+
+#   Adam.Dybbroe <adam.dybbroe@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the host address lookups of the utilities."""
+
+import sys
+import socket
+import unittest
+
+from mesan_compositer.utils import check_uri, clear_host_cache, get_host_ip, get_local_ips, refresh_local_ips
+
+if sys.version_info < (3,):
+    from mock import patch
+else:
+    from unittest.mock import patch
+
+
+class TestHostCache(unittest.TestCase):
+    """Test the caching of the host addresses."""
+
+    def setUp(self):
+        """Start with an empty cache."""
+        clear_host_cache()
+
+    @patch('mesan_compositer.utils.monotonic')
+    @patch('mesan_compositer.utils.socket.gethostbyname')
+    def test_get_host_ip(self, gethostbyname, monotonic):
+        """Test that the host addresses are looked up once until they expire."""
+        gethostbyname.return_value = '10.0.0.1'
+        monotonic.return_value = 0
+        self.assertIsNone(get_host_ip('satproc', cached_only=True))
+        self.assertEqual(get_host_ip('satproc'), '10.0.0.1')
+        monotonic.return_value = 299
+        self.assertEqual(get_host_ip('satproc', cached_only=True), '10.0.0.1')
+        self.assertEqual(get_host_ip('satproc'), '10.0.0.1')
+        self.assertEqual(gethostbyname.call_count, 1)
+
+        monotonic.return_value = 300
+        gethostbyname.return_value = '10.0.0.2'
+        self.assertEqual(get_host_ip('satproc'), '10.0.0.2')
+        self.assertEqual(gethostbyname.call_count, 2)
+
+    @patch('mesan_compositer.utils.socket.gethostbyname')
+    def test_failed_lookup(self, gethostbyname):
+        """Test that failed lookups are not cached."""
+        gethostbyname.side_effect = socket.gaierror
+        self.assertEqual(check_uri('ssh://unknown/data/S_NWC_CT.nc'), '/data/S_NWC_CT.nc')
+        self.assertEqual(check_uri('ssh://unknown/data/S_NWC_CT.nc'), '/data/S_NWC_CT.nc')
+        self.assertEqual(gethostbyname.call_count, 2)
+
+    @patch('mesan_compositer.utils.netifaces')
+    def test_get_local_ips(self, netifaces):
+        """Test that the local addresses are listed once until the cache is cleared."""
+        netifaces.AF_INET = 2
+        netifaces.interfaces.return_value = ['lo', 'eth0']
+        netifaces.ifaddresses.side_effect = [{2: [{'addr': '127.0.0.1'}]},
+                                             {2: [{'addr': '10.0.0.1'}]},
+                                             {2: [{'addr': '127.0.0.1'}]},
+                                             {}]
+        self.assertEqual(get_local_ips(), ['127.0.0.1', '10.0.0.1'])
+        self.assertEqual(get_local_ips(), ['127.0.0.1', '10.0.0.1'])
+        self.assertEqual(netifaces.interfaces.call_count, 1)
+
+        clear_host_cache()
+        self.assertEqual(get_local_ips(), ['127.0.0.1'])
+
+    @patch('mesan_compositer.utils.socket.gethostbyname')
+    @patch('mesan_compositer.utils.netifaces')
+    def test_refresh_local_ips(self, netifaces, gethostbyname):
+        """Test that the host cache is cleared when the local addresses change, and only then."""
+        netifaces.AF_INET = 2
+        netifaces.interfaces.return_value = ['eth0']
+        netifaces.ifaddresses.return_value = {2: [{'addr': '10.0.0.1'}]}
+        gethostbyname.return_value = '10.0.0.1'
+        self.assertEqual(get_host_ip('satproc'), '10.0.0.1')
+        self.assertFalse(refresh_local_ips())
+        self.assertFalse(refresh_local_ips())
+        self.assertEqual(get_host_ip('satproc', cached_only=True), '10.0.0.1')
+
+        netifaces.ifaddresses.return_value = {2: [{'addr': '10.0.0.2'}]}
+        self.assertTrue(refresh_local_ips())
+        self.assertIsNone(get_host_ip('satproc', cached_only=True))
+        self.assertEqual(get_local_ips(), ['10.0.0.2'])
+        self.assertEqual(netifaces.interfaces.call_count, 3)
+
+    def tearDown(self):
+        """Clean up."""
+        clear_host_cache()
+
+
+def suite():
+    """Run all the tests for the utilities."""
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestHostCache))
+
+    return mysuite
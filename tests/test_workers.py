@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2026 Adam.Dybbroe
+
+# Author(s):
+
+#   Adam.Dybbroe <adam.dybbroe@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the worker processes of the runner."""
+
+import asyncio
+import os
+import sys
+import unittest
+from multiprocessing.pool import Pool
+
+from mesan_compositer.workers import ExecutorPool, WorkerPool, get_worker_pool
+
+if sys.version_info < (3,):
+    from mock import patch
+else:
+    from unittest.mock import patch
+
+
+def get_pid(value):
+    """Get the process id of the worker, and the *value*."""
+    return os.getpid(), value
+
+
+def run_jobs(pool, njobs):
+    """Run *njobs* jobs one after the other in *pool*, and get the results."""
+    results = []
+    for i in range(njobs):
+        pool.apply_async(get_pid, (i, ), callback=results.append).wait(30)
+    return results
+
+
+class TestWorkerPool(unittest.TestCase):
+    """Test the pool of warm workers."""
+
+    def setUp(self):
+        """Don't load the readers in the workers."""
+        self.patcher = patch('mesan_compositer.workers.READERS', [])
+        self.patcher.start()
+
+    def test_warm_workers(self):
+        """Test that the workers are kept between the jobs."""
+        pool = WorkerPool(1, {})
+        results = run_jobs(pool, 3)
+        pool.close()
+        pool.join()
+        self.assertEqual([value for pid, value in results], [0, 1, 2])
+        self.assertEqual(len(set(pid for pid, value in results)), 1)
+
+    def test_recycle_on_job_count(self):
+        """Test that the workers are recycled after a number of jobs."""
+        pool = WorkerPool(1, {}, max_jobs=2)
+        results = run_jobs(pool, 4)
+        pool.close()
+        pool.join()
+        pids = [pid for pid, value in results]
+        self.assertEqual(pids[0], pids[1])
+        self.assertEqual(pids[2], pids[3])
+        self.assertNotEqual(pids[1], pids[2])
+
+    def test_recycle_on_memory(self):
+        """Test that the workers are recycled when taking too much memory."""
+        pool = WorkerPool(1, {}, max_memory=1)
+        results = run_jobs(pool, 3)
+        pool.close()
+        pool.join()
+        self.assertEqual(len(set(pid for pid, value in results)), 3)
+
+    def test_get_worker_pool(self):
+        """Test getting the pool as configured."""
+        pool = get_worker_pool({'runner_workers': 2})
+        self.assertIsInstance(pool, Pool)
+        pool.close()
+        pool.join()
+        pool = get_worker_pool({'runner_workers': 2, 'warm_workers': True, 'worker_max_jobs': 10})
+        self.assertIsInstance(pool, WorkerPool)
+        self.assertEqual((pool.processes, pool.max_jobs, pool.max_memory), (2, 10, None))
+        pool.close()
+        pool.join()
+
+    def tearDown(self):
+        """Clean up."""
+        self.patcher.stop()
+
+
+def fail_job(value):
+    """Fail with *value*."""
+    raise ValueError(value)
+
+
+class TestExecutorPool(unittest.TestCase):
+    """Test the executor of warm workers driven by an event loop."""
+
+    def setUp(self):
+        """Don't load the readers in the workers."""
+        self.patcher = patch('mesan_compositer.workers.READERS', [])
+        self.patcher.start()
+
+    def run_jobs(self, njobs, **kwargs):
+        """Run *njobs* jobs one after the other, and get the results and errors."""
+        results = []
+        errors = []
+
+        async def run_jobs():
+            pool = ExecutorPool(asyncio.get_running_loop(), 1, {}, **kwargs)
+            for i in range(njobs):
+                await pool.apply_async(get_pid, (i, ), callback=results.append)
+            await asyncio.wait([pool.apply_async(fail_job, ('bad', ), error_callback=errors.append)])
+            await asyncio.sleep(0)
+            pool.shutdown()
+
+        asyncio.run(run_jobs())
+        return results, errors
+
+    def test_warm_workers(self):
+        """Test that the workers are kept between the jobs, and the errors handed over."""
+        results, errors = self.run_jobs(3)
+        self.assertEqual([value for pid, value in results], [0, 1, 2])
+        self.assertEqual(len(set(pid for pid, value in results)), 1)
+        self.assertEqual([str(err) for err in errors], ['bad'])
+
+    def test_recycle_on_job_count(self):
+        """Test that the workers are recycled after a number of jobs."""
+        results, errors = self.run_jobs(4, max_jobs=2)
+        pids = [pid for pid, value in results]
+        self.assertEqual(pids[0], pids[1])
+        self.assertEqual(pids[2], pids[3])
+        self.assertNotEqual(pids[1], pids[2])
+
+    def tearDown(self):
+        """Clean up."""
+        self.patcher.stop()
+
+
+def suite():
+    """Run all the tests for the worker processes."""
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestWorkerPool))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestExecutorPool))
+
+    return mysuite